@@ -0,0 +1,168 @@
+"""
+Micro-benchmark of the AXL list response conversions on synthetic listPhone / listUser responses, every schema tag of
+LPhone / LUser returned for each item:
+
+    - zeep parse: the zeep objects of the response (CUCMAxlToolkit.list_phone / list_user)
+    - serialize_object: the zeep objects converted to native python data, by the recursive serialize_object it
+      replaced and by the current one (OrderedDict and dict targets, skip_empty)
+    - raw: the raw response converted straight to dicts with lxml (raw_response.iter_list_response), which replaces
+      both the zeep parse and serialize_object
+
+Checks that the raw conversion matches serialize_object on every returned tag, then prints the time of each step.
+The requests are answered locally, no CUCM is needed.
+
+    python benchmarks/axl_list_response.py [items]
+"""
+import json
+import os
+import sys
+import timeit
+import types
+from collections import OrderedDict
+import requests
+from lxml import etree
+from requests.adapters import BaseAdapter
+from zeep.xsd.types.complex import ComplexType
+from zeep.xsd.valueobjects import CompoundValue
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The flaskr package module starts the whole application: it is replaced by an empty package, only the AXL modules
+# are imported
+sys.path.insert(0, ROOT)
+flaskr = types.ModuleType('flaskr')
+flaskr.__path__ = [os.path.join(ROOT, 'flaskr')]
+sys.modules['flaskr'] = flaskr
+
+from flaskr.cucm.v1.axltoolkit import CUCMAxlToolkit  # noqa: E402
+from flaskr.cucm.v1.axltoolkit.raw_response import iter_list_response, text_converters  # noqa: E402
+from flaskr.cucm.v1.cucm import serialize_object  # noqa: E402
+
+AXL_VERSION = '15.0'
+SCHEMA_FOLDER = os.path.join(ROOT, 'flaskr', 'cucm', 'v1', 'axltoolkit') + os.sep
+
+
+def recursive_serialize_object(obj, target_cls=OrderedDict):
+    """
+    The serialize_object implementation replaced by the non-recursive one, kept as the baseline
+    """
+    if isinstance(obj, list):
+        return [recursive_serialize_object(sub, target_cls) for sub in obj]
+
+    if isinstance(obj, etree._Element):
+        def recursive_dict(element):
+            return element.tag[element.tag.find('}') + 1:], dict(map(recursive_dict, element)) or element.text
+        return recursive_dict(obj)
+
+    if isinstance(obj, (dict, CompoundValue)):
+        result = target_cls()
+        for key in obj:
+            result[key] = recursive_serialize_object(obj[key], target_cls)
+        return result
+
+    return obj
+
+
+def list_response(axl, type_name, item_name, items):
+    """
+    Returns a list response body holding items items, with a value for every simple tag of the type: numbers for the
+    converted (non-string) tags, uuid attributes for the foreign keys, and empty tags for a third of the d* tags
+    """
+    xsd_type = axl.get_axl_type(type_name)
+    converters = text_converters(xsd_type)
+    # Simple tags and foreign keys (XFkType: name with a uuid attribute), the other complex tags are left out
+    tags = [(name, type(element.type).__name__) for name, element in xsd_type.elements
+            if not isinstance(element.type, ComplexType) or type(element.type).__name__ == 'XFkType']
+
+    def item(index):
+        parts = []
+        for name, element_type in tags:
+            if name in converters:
+                parts.append(f'<{name}>{index % 7}</{name}>')
+            elif element_type == 'XFkType':
+                parts.append(f'<{name} uuid="{{{index:08X}-0000-0000-0000-000000000000}}">{name}-{index}</{name}>')
+            elif index % 3 == 0 and name.startswith('d'):
+                parts.append(f'<{name}/>')
+            else:
+                parts.append(f'<{name}>{name}-{index}</{name}>')
+        return f'<{item_name} uuid="{{{index:08X}-1111-1111-1111-111111111111}}">' + ''.join(parts) + \
+            f'</{item_name}>'
+
+    return ('<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+            f'<ns:list{type_name[1:]}Response xmlns:ns="http://www.cisco.com/AXL/API/{AXL_VERSION}"><return>' +
+            ''.join(item(index) for index in range(items)) +
+            f'</return></ns:list{type_name[1:]}Response></soapenv:Body></soapenv:Envelope>').encode('utf-8'), \
+        converters, len(tags)
+
+
+class ResponseAdapter(BaseAdapter):
+    """
+    requests adapter answering every request with the same SOAP response body
+    """
+
+    def __init__(self, body):
+        super().__init__()
+        self.body = body
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.request = request
+        response.url = request.url
+        response.headers['Content-Type'] = 'text/xml; charset=utf-8'
+        response._content = self.body
+        return response
+
+    def close(self):
+        pass
+
+
+def measure(function, number=1):
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def main(items=2000):
+    axl = CUCMAxlToolkit('user', 'password', 'cucm', AXL_VERSION, tls_verify=False, timeout=5,
+                         schema_folder_path=SCHEMA_FOLDER)
+    for type_name, item_name, list_method in (('LPhone', 'phone', axl.list_phone), ('LUser', 'user', axl.list_user)):
+        body, converters, tags = list_response(axl, type_name, item_name, items)
+        axl.session.mount('https://', ResponseAdapter(body))
+
+        search_criteria = {'name' if item_name == 'phone' else 'userid': '%'}
+        zeep_result = list_method(search_criteria)
+        raw_body = list_method(search_criteria, raw=True)
+
+        def raw_convert():
+            return list(iter_list_response(raw_body, item_name, converters=converters))
+
+        serialized = serialize_object(zeep_result)
+        if serialized != recursive_serialize_object(zeep_result):
+            raise Exception(f'serialize_object results differ on {type_name}')
+        raw_items = raw_convert()
+        # zeep returns the unrequested schema tags as None and empty union elements as 'None': only the tags of the
+        # response are compared
+        for zeep_item, raw_item in zip(serialized['return'][item_name], raw_items):
+            for tag, value in raw_item.items():
+                if value != (None if zeep_item[tag] == 'None' else zeep_item[tag]):
+                    raise Exception(f'Raw conversion of {type_name} {tag} differs: {value!r} != {zeep_item[tag]!r}')
+
+        print(f'list{type_name[1:]}: {items} items x {tags} tags ({len(body) / 1e6:.1f} MB)')
+        steps = [
+            ('zeep request and parse', lambda: list_method(search_criteria)),
+            ('serialize_object, recursive', lambda: recursive_serialize_object(zeep_result)),
+            ('serialize_object', lambda: serialize_object(zeep_result)),
+            ('serialize_object, dict', lambda: serialize_object(zeep_result, dict)),
+            ('serialize_object, skip_empty', lambda: serialize_object(zeep_result, dict, skip_empty=True)),
+            ('raw request', lambda: list_method(search_criteria, raw=True)),
+            ('raw lxml to dicts', raw_convert),
+            ('json.dumps, serialize_object', lambda: json.dumps(serialized)),
+            ('json.dumps, raw', lambda: json.dumps(raw_items)),
+        ]
+        for label, function in steps:
+            print(f'    {label:30} {measure(function) * 1000:10.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of the CUPI, UDS and CMS response parsing (CUPI._cupi_parse_response, UDS._uds_parse_response and
+CMS._cms_parse_response) against the parsing they replaced:
+
+    - CUPI: the body decoded to a string, then json.loads
+    - UDS / CMS: the body decoded to a string, xmltodict.parse to OrderedDicts, and a json.dumps / json.loads round
+      trip to plain dicts
+
+Checks that both give the same result, then prints the parse time and peak memory of each on a 50,000-item CUPI user
+listing (JSON), UDS user listing and CMS coSpace listing (XML). The peak memory is the Python heap (tracemalloc). See
+benchmarks/xml_to_dict.py for the XML conversion alone.
+
+    python benchmarks/rest_responses.py [items]
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+import types
+import xmltodict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The flaskr package module starts the whole application: it is replaced by an empty package, only the CUPI, UDS and
+# CMS modules are imported
+sys.path.insert(0, ROOT)
+flaskr = types.ModuleType('flaskr')
+flaskr.__path__ = [os.path.join(ROOT, 'flaskr')]
+sys.modules['flaskr'] = flaskr
+
+from flaskr.cms.v1.cms import CMS  # noqa: E402
+from flaskr.cuc.v1.cupi import CUPI  # noqa: E402
+from flaskr.uds.v1.uds import UDS  # noqa: E402
+
+
+def cupi_users(items):
+    return json.dumps({'@total': str(items), 'User': [
+        {'URI': f'/vmrest/users/{i:032x}', 'ObjectId': f'{i:032x}', 'Alias': f'user{i}', 'FirstName': f'F{i}',
+         'LastName': 'L', 'DisplayName': f'F{i} L', 'DtmfAccessId': str(10000 + i), 'IsTemplate': 'false'}
+        for i in range(items)]}).encode('utf-8')
+
+
+def uds_users(items):
+    return ('<users totalCount="%d">' % items + ''.join(
+        '<user uri="https://cucm:8443/cucm-uds/user/%d"><id>%d</id><userName>user%d</userName><firstName>F%d'
+        '</firstName><lastName>L</lastName><phoneNumber>%d</phoneNumber></user>' % (i, i, i, i, i)
+        for i in range(items)) + '</users>').encode('utf-8')
+
+
+def cms_cospaces(items):
+    return ('<coSpaces total="%d">' % items + ''.join(
+        '<coSpace id="%032x"><name>Space %d</name><uri>space%d</uri><callId>%d</callId></coSpace>' % (i, i, i, i)
+        for i in range(items)) + '</coSpaces>').encode('utf-8')
+
+
+def raw_response(body):
+    response = types.SimpleNamespace(content=body, headers={},
+                                     request=types.SimpleNamespace(url='https://server/api'))
+    return {'success': True, 'message': 'OK', 'response': response}
+
+
+def cupi_decoded(raw_resp):
+    # The replaced CUPI parsing of a successful listing
+    parsed_response = json.loads(raw_resp['response'].content.decode('utf-8'))
+    if str(parsed_response['@total']) == '1':
+        rootobj = [key for key in parsed_response.keys() if key not in '@total'][0]
+        parsed_response[rootobj] = [parsed_response[rootobj]]
+    return {'success': raw_resp['success'], 'message': raw_resp['message'], 'response': parsed_response}
+
+
+def xmltodict_round_trip(raw_resp):
+    # The replaced UDS / CMS parsing of a listing holding several items
+    parsed_response = xmltodict.parse(raw_resp['response'].content.decode('utf-8'))
+    return {'success': raw_resp['success'], 'message': raw_resp['message'],
+            'response': json.loads(json.dumps(parsed_response))}
+
+
+def measure(parse, raw_resp, number=1):
+    seconds = min(timeit.repeat(lambda: parse(raw_resp), number=number, repeat=5)) / number
+    tracemalloc.start()
+    parse(raw_resp)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main(items=50000):
+    cms = types.SimpleNamespace(error_codes=CMS.error_codes)
+    payloads = [
+        (f'CUPI JSON {items} users', cupi_users(items), cupi_decoded,
+         lambda raw_resp: CUPI._cupi_parse_response(None, raw_resp)),
+        (f'UDS XML {items} users', uds_users(items), xmltodict_round_trip,
+         lambda raw_resp: UDS._uds_parse_response(None, raw_resp)),
+        (f'CMS XML {items} coSpaces', cms_cospaces(items), xmltodict_round_trip,
+         lambda raw_resp: CMS._cms_parse_response(cms, raw_resp)),
+    ]
+    for label, body, replaced, current in payloads:
+        raw_resp = raw_response(body)
+        if replaced(raw_resp) != current(raw_resp):
+            raise Exception(f'The replaced and current parsing results differ on {label}')
+        print(f'{label} ({len(body) / 1e6:.1f} MB)')
+        for name, parse in (('replaced', replaced), ('current', current)):
+            seconds, peak = measure(parse, raw_resp)
+            print(f'    {name:10} {seconds * 1000:10.1f} ms  peak {peak / 1e6:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
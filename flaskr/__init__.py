@@ -1,5 +1,6 @@
 import logging
 from dotenv import load_dotenv
+from os import getenv
 from os.path import abspath, join, dirname
 from sys import exit
 
@@ -24,6 +25,12 @@ app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.register_blueprint(core, url_prefix='/')
 app.register_blueprint(v1_blueprint, url_prefix='/api/v1')
 
+# Opt-in: sample the PerfMon counter history from the first request served, not from the first /perfmon/history
+# request. Every process serving requests keeps its own history, so enable it with a single worker process.
+if getenv('PERFMON_HISTORY_AUTOSTART', '').strip().lower() in ('1', 'true', 'yes'):
+    from flaskr.api.v1.cucm import perfmon_history_autostart
+    app.before_request(perfmon_history_autostart)
+
 
 # This is required to avoid net::ERR_INVALID_HTTP_RESPONSE (304) when client
 # requests the static/js resources from the flask app
@@ -26,6 +26,16 @@ class cms_version_api(Resource):
         return cms_status
 
 
+@api.route("/rest_stats")
+class cms_rest_stats_api(Resource):
+    def get(self):
+        """
+        Returns the connection pool usage and request counters of the CMS and CUCM UDS clients.
+        """
+        return {'success': True, 'message': "REST Statistics Retrieved Successfully",
+                'cms_stats': myCMS.rest_stats(), 'uds_stats': myCUCMuds.rest_stats()}
+
+
 def match_space_uri(space_list, uri):
     """
     Searches a list of coSpaces and returns the id of the first coSpace that matches 
@@ -1,4 +1,5 @@
-from flask import request
+import json
+from flask import request, Response
 from flask_restx import Namespace, Resource
 from flaskr.cuc.v1.cupi import CUPI
 from flaskr.api.v1.parsers import cuc_importldap_user_post_args
@@ -19,6 +20,15 @@ class cuc_version_api(Resource):
         """
         return myCUPI._cupi_request("version/product/")
 
+
+@api.route("/rest_stats")
+class cuc_rest_stats_api(Resource):
+    def get(self):
+        """
+        Returns the CUPI connection pool usage and request counters.
+        """
+        return {'success': True, 'message': "CUPI Statistics Retrieved Successfully", 'rest_stats': myCUPI.rest_stats()}
+
 def get_search_params(args):
     """
     Returns CUC search parameters from request arguments as a dictionary. 
@@ -34,20 +44,81 @@ def get_search_params(args):
     return params
 
 
+def list_all(api_method, args):
+    """
+    Returns a streamed response with all the objects of a CUPI list method, in the same document as a single page:
+    {"response": {"@total": ..., "<item name>": [...]}, "success": ..., "message": ...}. The pages are requested
+    rowsPerPage objects at a time, workers pages in parallel. An error after streaming started is reported as
+    success false.
+    """
+    params = get_search_params(args)
+    del params['rowsPerPage'], params['pageNumber']
+    try:
+        # Retrieve the first page before responding so request errors are still a regular response
+        items = myCUPI.list_iter(api_method, parameters=params, rows_per_page=args['rowsPerPage'],
+                                 workers=args['workers'])
+    except Exception as e:
+        return {'success': False, 'message': str(e), 'response': ''}
+    return Response(stream_list(items), mimetype='application/json')
+
+
+def stream_list(items):
+    yield '{"response": {"@total": ' + json.dumps(str(items.total))
+    if items.item_name is not None:
+        yield ', ' + json.dumps(items.item_name) + ': ['
+    count = 0
+    try:
+        for item in items:
+            yield (',' if count else '') + json.dumps(item)
+            count += 1
+        success, message = True, 'Retrieved {} objects'.format(count)
+    except Exception as e:
+        success, message = False, str(e)
+    finally:
+        # Stop the page requests if the client went away
+        items.close()
+    yield (']' if items.item_name is not None else '') + '}, "success": ' + json.dumps(success) + \
+        ', "message": ' + json.dumps(message) + '}\n'
+
+
 @api.route("/ldap_users")
 class cuc_import_ldapuser_api(Resource):
     @api.expect(cuc_users_get_args, validate=True)
     def get(self):
         """
         Retrieves LDAP users synched to Unity Connection.
+
+        With all set, every page is retrieved (rowsPerPage users at a time, workers pages in parallel) and the users
+        are streamed as they are received.
         """
-        # Read arguments: column, match_type, search, sortorder, rowsPerPage, pageNumber
+        # Read arguments: column, match_type, search, sortorder, rowsPerPage, pageNumber, all, workers
         args = cuc_users_get_args.parse_args(request)
+        if args['all']:
+            return list_all("import/users/ldap", args)
         params = get_search_params(args)
 
         return myCUPI._cupi_request("import/users/ldap", parameters=params)
 
 
+@api.route("/users")
+class cuc_users_api(Resource):
+    @api.expect(cuc_users_get_args, validate=True)
+    def get(self):
+        """
+        Retrieves Unity Connection users.
+
+        With all set, every page is retrieved (rowsPerPage users at a time, workers pages in parallel) and the users
+        are streamed as they are received.
+        """
+        # Read arguments: column, match_type, search, sortorder, rowsPerPage, pageNumber, all, workers
+        args = cuc_users_get_args.parse_args(request)
+        if args['all']:
+            return list_all("users", args)
+        params = get_search_params(args)
+
+        return myCUPI._cupi_request("users", parameters=params)
+
+
 def get_user_by_id(userid):
     '''
     Get a voicemail user from the Unity Connection system by user alias.
@@ -1,20 +1,33 @@
 import re
-from time import sleep
+import json
+import math
+import time
+import logging
 from flask import jsonify
+from flask import Response
 from flask import request
 from flask import Blueprint
 from flask_restx import Namespace, Resource, fields, reqparse
-from flaskr.cucm.v1.cucm import AXL, PAWS, SXML
+from flaskr.cucm.v1.cucm import AXL, PAWS, SXML, SXMLCluster
+from flaskr.cucm.v1.axltoolkit.ris import ris_select_cm_device_result
 from flaskr.api.v1.parsers import cucm_add_phone_query_args
 from flaskr.api.v1.parsers import cucm_update_phone_query_args
 from flaskr.api.v1.parsers import cucm_list_phones_returned_tags_query_args
 from flaskr.api.v1.parsers import cucm_list_phones_search_criteria_query_args
+from flaskr.api.v1.parsers import cucm_list_phones_paging_query_args
 from flaskr.api.v1.parsers import cucm_device_search_criteria_query_args
 from flaskr.api.v1.parsers import cucm_service_status_query_args
+from flaskr.api.v1.parsers import cucm_perfmon_history_query_args
+from flaskr.api.v1.parsers import cucm_log_files_query_args
+from flaskr.api.v1.parsers import cucm_log_file_query_args
+from flaskr.api.v1.parsers import cucm_cdr_ingest_query_args
+from flaskr.api.v1.parsers import cucm_cdr_summary_query_args
 from flaskr.api.v1.parsers import cucm_update_line_query_args
 from flaskr.api.v1.parsers import cucm_update_user_query_args
 from os import getenv
 
+log = logging.getLogger(__name__)
+
 api = Namespace('cucm', description='Cisco Unified Communications Manager APIs')
 
 # Read environment variables
@@ -28,6 +41,35 @@ myPAWSVersionService = PAWS(cucm_host, cucm_user, cucm_pass, 'VersionService')
 mySXMLRisPort70Service = SXML(cucm_host, cucm_user, cucm_pass, 'realtimeservice2')
 mySXMLControlCenterServicesService = SXML(cucm_host, cucm_user, cucm_pass, 'controlcenterservice2')
 mySXMLPerfMonService = SXML(cucm_host, cucm_user, cucm_pass, 'perfmonservice2')
+mySXMLCluster = SXMLCluster(myAXL, cucm_user, cucm_pass)
+mySXMLCDRService = SXML(cucm_host, cucm_user, cucm_pass, 'CDRonDemandService2')
+mySXMLCDRService.cdr_sftp_host = getenv('CDR_SFTP_HOSTNAME')
+mySXMLCDRService.cdr_sftp_username = getenv('CDR_SFTP_USERNAME')
+mySXMLCDRService.cdr_sftp_password = getenv('CDR_SFTP_PASSWORD')
+mySXMLCDRService.cdr_sftp_folder = getenv('CDR_SFTP_FOLDER')
+mySXMLCDRService.cdr_spool_folder = getenv('CDR_SPOOL_FOLDER')
+if getenv('PERFMON_HISTORY_COUNTERS'):
+    mySXMLPerfMonService.perfmon_history_counters = [counter.strip() for counter in
+                                                     getenv('PERFMON_HISTORY_COUNTERS').split(',') if counter.strip()]
+if getenv('PERFMON_HISTORY_INTERVAL'):
+    try:
+        perfmon_history_interval = float(getenv('PERFMON_HISTORY_INTERVAL'))
+        if not (math.isfinite(perfmon_history_interval) and perfmon_history_interval > 0):
+            raise ValueError(perfmon_history_interval)
+        mySXMLPerfMonService.perfmon_history_interval = perfmon_history_interval
+    except ValueError:
+        log.warning(f"Ignoring PERFMON_HISTORY_INTERVAL={getenv('PERFMON_HISTORY_INTERVAL')!r}: not a number of "
+                    f"seconds greater than 0, sampling every {mySXMLPerfMonService.perfmon_history_interval} seconds")
+
+
+def perfmon_history_autostart():
+    """
+    Starts the PerfMon counter history collector (see SXML.perfmon_history_start) unless it is running. Registered
+    by the application as a before_request hook when PERFMON_HISTORY_AUTOSTART is set, so only the processes serving
+    requests sample the counters (not the debug reloader's watcher process, which loads the application too).
+    """
+    if mySXMLPerfMonService.perfmon_collector is None:
+        mySXMLPerfMonService.perfmon_history_start()
 
 ###########################################
 
@@ -51,6 +93,19 @@ class cucm_get_version_api(Resource):
         return jsonify(apiresult)
 
 
+@api.route("/axl_stats")
+class cucm_axl_stats_api(Resource):
+    def get(self):
+        """
+        Returns the AXL request throttle and client pool state
+
+        The throttle adapts its request rate and concurrency to CUCM AXL throttling (HTTP 503) and latency,
+        queue_depth is the number of AXL requests currently waiting to be sent.
+        """
+        apiresult = {'success': True, 'message': "AXL Statistics Retrieved Successfully", 'axl_stats': myAXL.axl_stats()}
+        return jsonify(apiresult)
+
+
 @api.route("/phone/<string:device_name>")
 @api.param('device_name', description='The Name of the Phone Device')
 class cucm_phone_api(Resource):
@@ -86,7 +141,9 @@ class cucm_phone_api(Resource):
         """
         try:
             cucm_add_phone_query_parsed_args = cucm_add_phone_query_args.parse_args(request)
-            axl_get_user_result = myAXL.get_user(userid=cucm_add_phone_query_parsed_args['ownerUserName'])
+            # The associatedDevices are written back with updateUser: read them from CUCM rather than from the cache
+            axl_get_user_result = myAXL.get_user(userid=cucm_add_phone_query_parsed_args['ownerUserName'],
+                                                 cached=False)
             user_telephoneNumber = None
             if axl_get_user_result['return']['user'].get('telephoneNumber'):
                 user_telephoneNumber = re.sub(r"^\+", "\\+", axl_get_user_result['return']['user']['telephoneNumber'])
@@ -242,7 +299,8 @@ class cucm_device_search_api(Resource):
         """
         Perform a Device Search via RisPort70 (Real-Time Information Port) service on CUCM given the search criteria
 
-        This API method executes a SelectCMDevice Request and sets results with returned Response data
+        This API method executes as many SelectCMDevice Requests as needed (1000 devices per request) and sets results
+        with the merged Response data, one record per device
 
         https://developer.cisco.com/docs/sxml/risport70-api/#selectcmdevice
 
@@ -255,16 +313,27 @@ class cucm_device_search_api(Resource):
                 SearchItems = list(map(str.strip, SearchItems_str.split(',')))
             else:
                 SearchItems.append(cucm_device_search_criteria_query_parsed_args['SearchItems'])
-            ris_search_criteria = {
-                'SelectBy': cucm_device_search_criteria_query_parsed_args['SearchBy'],
-                'MaxReturnedDevices': 1000,
-                'Status': cucm_device_search_criteria_query_parsed_args['Status'],
-                'SelectItems': []
-            }
-            for SearchItem in SearchItems:
-                SelectItem_dict = {'item': SearchItem}
-                ris_search_criteria['SelectItems'].append(SelectItem_dict)
-            risresult = mySXMLRisPort70Service.ris_query(search_criteria=ris_search_criteria)
+            SearchBy = cucm_device_search_criteria_query_parsed_args['SearchBy']
+            Status = cucm_device_search_criteria_query_parsed_args['Status']
+            Model = cucm_device_search_criteria_query_parsed_args['Model']
+            MaxAge = cucm_device_search_criteria_query_parsed_args['MaxAge']
+            if MaxAge is not None and SearchBy in ['Name', 'IPV4Address', 'IPV6Address']:
+                # Search the registration snapshot instead of querying CUCM
+                snapshot = mySXMLRisPort70Service.ris_snapshot(max_age=MaxAge)
+                if SearchBy == 'Name':
+                    devices = snapshot.search(names=SearchItems, status=Status, model=Model)
+                else:
+                    devices = snapshot.search(ip_addresses=SearchItems, status=Status, model=Model)
+                risresult = ris_select_cm_device_result(devices)
+            else:
+                ris_search_criteria = {
+                    'SelectBy': SearchBy,
+                    'Status': Status,
+                    'SelectItems': SearchItems
+                }
+                if Model is not None:
+                    ris_search_criteria['Model'] = Model
+                risresult = mySXMLRisPort70Service.ris_device_search(search_criteria=ris_search_criteria)
         except Exception as e:
             apiresult = {'success': False, 'message': str(e)}
             return jsonify(apiresult)
@@ -274,6 +343,21 @@ class cucm_device_search_api(Resource):
         return jsonify(apiresult)
 
 
+@api.route("/ris_stats")
+class cucm_ris_stats_api(Resource):
+    def get(self):
+        """
+        Returns the registration snapshot state (age, devices per node and per status, last refresh error) and the
+        RisPort70 request quota usage
+
+        device_search requests with MaxAge are served from the registration snapshot, which is refreshed in the
+        background and with StateInfo deltas when possible.
+        """
+        apiresult = {'success': True, 'message': "RisPort70 Statistics Retrieved Successfully",
+                     'ris_stats': mySXMLRisPort70Service.ris_snapshot_stats()}
+        return jsonify(apiresult)
+
+
 @api.route("/service")
 class cucm_service_api(Resource):
     @api.expect(cucm_service_status_query_args, validate=True)
@@ -318,7 +402,8 @@ class cucm_perfmon_api(Resource):
         This API Method needs to be a POST method even though we are not creating any new items/resources because Swagger UI does
         not allow a payload body for GET requests.
 
-        This API method executes multiple PerfMon API requests to get the Performance Counters values and sets results with returned Response data
+        This API method executes multiple PerfMon API requests to get the Performance Counters values and sets results with returned Response data.
+        PerfMon sessions are kept open per counter set and reused across requests.
 
         https://developer.cisco.com/docs/sxml/perfmon-api/
 
@@ -341,18 +426,7 @@ class cucm_perfmon_api(Resource):
             if not perfmon_counters and api.payload.get('perfmon_counters'):
                 perfmon_counters = api.payload.get('perfmon_counters')
             if perfmon_counters:
-                perfmon_session_handle = mySXMLPerfMonService.perfmon_open_session()
-                perfmon_counter_list = []
-                for counter in perfmon_counters:
-                    perfmon_counter_list.append(f"\\\\{cucm_host}\\" + counter)
-                if not mySXMLPerfMonService.perfmon_add_counter(session_handle=perfmon_session_handle, counters=perfmon_counter_list):
-                    mySXMLPerfMonService.perfmon_close_session(session_handle=perfmon_session_handle)
-                    raise Exception(f"Failed to Query Counters: {api.payload['perfmon_counters']}")
-                perfmon_counters_result = mySXMLPerfMonService.perfmon_collect_session_data(session_handle=perfmon_session_handle)
-                if any(("%" in counter) or ("Percentage" in counter) for counter in perfmon_counters):
-                    sleep(5)
-                    perfmon_counters_result = mySXMLPerfMonService.perfmon_collect_session_data(session_handle=perfmon_session_handle)
-                mySXMLPerfMonService.perfmon_close_session(session_handle=perfmon_session_handle)
+                perfmon_counters_result = mySXMLPerfMonService.perfmon_query_counters(counters=perfmon_counters)
             # If perfmon_class is still not defined then set result to None
             else:
                 perfmon_counters_result = None
@@ -367,6 +441,273 @@ class cucm_perfmon_api(Resource):
         return jsonify(apiresult)
 
 
+@api.route("/perfmon/history")
+class cucm_perfmon_history_api(Resource):
+    @api.expect(cucm_perfmon_history_query_args, validate=True)
+    def get(self):
+        """
+        Retrieves the history of Performance Counters sampled in the background via PerfMon service on CUCM
+
+        The counters are sampled at fixed intervals into fixed-size buffers, series longer than points are
+        downsampled. Results are Chart.js datasets: [{'label': counter, 'data': [{'x': epoch ms, 'y': value}]}]
+        """
+        try:
+            cucm_perfmon_history_query_parsed_args = cucm_perfmon_history_query_args.parse_args(request)
+            counters = None
+            if cucm_perfmon_history_query_parsed_args['counters']:
+                counters = list(map(str.strip, cucm_perfmon_history_query_parsed_args['counters'].split(',')))
+            since = time.time() - cucm_perfmon_history_query_parsed_args['minutes'] * 60
+            datasets = mySXMLPerfMonService.perfmon_history(counters=counters, since=since,
+                                                            points=cucm_perfmon_history_query_parsed_args['points'])
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "PerfMon History Retrieved Successfully",
+                     'interval': mySXMLPerfMonService.perfmon_history_interval,
+                     'datasets': datasets}
+        return jsonify(apiresult)
+
+
+@api.route("/perfmon/stats")
+class cucm_perfmon_stats_api(Resource):
+    def get(self):
+        """
+        Returns the PerfMon session pool and background counter collector state
+        """
+        apiresult = {'success': True, 'message': "PerfMon Statistics Retrieved Successfully",
+                     'perfmon_stats': mySXMLPerfMonService.perfmon_stats()}
+        return jsonify(apiresult)
+
+
+@api.route("/cluster/nodes")
+class cucm_cluster_nodes_api(Resource):
+    def get(self):
+        """
+        Retrieves the CUCM cluster nodes (Thin AXL query of the processnode table)
+        """
+        try:
+            cluster_nodes = mySXMLCluster.cluster_nodes()
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "Cluster Nodes Retrieved Successfully", 'cluster_nodes': cluster_nodes}
+        return jsonify(apiresult)
+
+
+@api.route("/cluster/service")
+class cucm_cluster_service_api(Resource):
+    @api.expect(cucm_service_status_query_args, validate=True)
+    def get(self):
+        """
+        Perform a Service Status Query via ControlCenterServicesPort service on every CUCM cluster node concurrently
+
+        Each node result holds its success, message, latency (seconds) and service_info
+        """
+        try:
+            cucm_service_status_query_parsed_args = cucm_service_status_query_args.parse_args(request)
+            service_list = None
+            if cucm_service_status_query_parsed_args['Services'] is not None:
+                services_str = cucm_service_status_query_parsed_args['Services']
+                service_list = list(map(str.strip, services_str.split(',')))
+            node_results = mySXMLCluster.ccs_get_service_status(service_list=service_list)
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "Cluster Service(s) Status Info Retrieved Successfully",
+                     'nodes': [{'node': node_result['node'], 'success': node_result['success'],
+                                'message': node_result['message'], 'latency': node_result['latency'],
+                                'service_info': node_result['result']} for node_result in node_results]}
+        return jsonify(apiresult)
+
+
+@api.route("/cluster/perfmon")
+class cucm_cluster_perfmon_api(Resource):
+    @api.expect(cucm_perfmon_api.cucm_perfmon_post_data, validate=True)
+    def post(self):
+        """
+        Query Performance Counters via PerfMon service on every CUCM cluster node concurrently
+
+        Each node result holds its success, message, latency (seconds) and perfmon_counters_result
+        """
+        try:
+            perfmon_counters = api.payload.get('perfmon_counters')
+            if not perfmon_counters:
+                raise Exception("perfmon_counters is required in the payload")
+            node_results = mySXMLCluster.perfmon_query_counters(counters=perfmon_counters)
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "Cluster PerfMon Data Retrieved Successfully",
+                     'nodes': [{'node': node_result['node'], 'success': node_result['success'],
+                                'message': node_result['message'], 'latency': node_result['latency'],
+                                'perfmon_counters_result': node_result['result']} for node_result in node_results]}
+        return jsonify(apiresult)
+
+
+@api.route("/cdr/ingest")
+class cucm_cdr_ingest_api(Resource):
+    @api.expect(cucm_cdr_ingest_query_args, validate=True)
+    def post(self):
+        """
+        Starts ingesting the CUCM CDR / CMR files since the last ingested one in the background
+
+        The background ingestion executes CDR on Demand get_file_list Requests one hour at a time, and a get_file
+        Request (sent to the CDR_SFTP_HOSTNAME SFTP server) for each new file, right away and then periodically.
+        Its progress is returned by /cdr/stats
+        <br>
+        https://developer.cisco.com/docs/sxml/#!cdr-on-demand-api
+        """
+        try:
+            cdr_ingest_query_parsed_args = cucm_cdr_ingest_query_args.parse_args(request)
+            cdr_stats = mySXMLCDRService.cdr_ingest(max_windows=cdr_ingest_query_parsed_args['MaxWindows'])
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "CDR Ingestion Started", 'stats': cdr_stats}
+        return jsonify(apiresult)
+
+
+@api.route("/cdr/summary")
+class cucm_cdr_summary_api(Resource):
+    @api.expect(cucm_cdr_summary_query_args, validate=True)
+    def get(self):
+        """
+        Returns call statistics of the ingested CDR / CMR records
+
+        Call counts and durations, calls per hour, top calling / called numbers, termination causes and voice quality
+        """
+        try:
+            cdr_summary_query_parsed_args = cucm_cdr_summary_query_args.parse_args(request)
+            since = int(time.time()) - cdr_summary_query_parsed_args['Hours'] * 3600
+            cdr_summary = mySXMLCDRService.cdr_summary(since=since, top=cdr_summary_query_parsed_args['Top'])
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "CDR Summary Retrieved Successfully", 'cdr_summary': cdr_summary}
+        return jsonify(apiresult)
+
+
+@api.route("/cdr/stats")
+class cucm_cdr_stats_api(Resource):
+    def get(self):
+        """
+        Returns the CDR ingestion statistics: checkpoint, files and records ingested, errors and request quota
+        """
+        try:
+            cdr_stats = mySXMLCDRService.cdr_stats()
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "CDR Statistics Retrieved Successfully", 'cdr_stats': cdr_stats}
+        return jsonify(apiresult)
+
+
+def _log_files_query(parsed_args):
+    # Comma seperated query arguments as lists, None when not supplied
+    def split(name):
+        return list(map(str.strip, parsed_args[name].split(','))) if parsed_args[name] else None
+    return {'service_logs': split('ServiceLogs'), 'system_logs': split('SystemLogs'), 'minutes': parsed_args['Minutes'],
+            'search_str': parsed_args['SearchStr'] or '', 'nodes': split('Nodes')}
+
+
+@api.route("/logs")
+class cucm_logs_api(Resource):
+    @api.expect(cucm_log_files_query_args, validate=True)
+    def get(self):
+        """
+        Lists the log files of every CUCM cluster node via LogCollectionPortTypeService service
+
+        This API method executes a selectLogFiles Request on every cluster node concurrently
+        <br>
+        https://developer.cisco.com/docs/sxml/#!log-collection-api
+        """
+        try:
+            log_files_query = _log_files_query(cucm_log_files_query_args.parse_args(request))
+            node_results = mySXMLCluster.log_list_files(**log_files_query)
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "Log Files Listed Successfully",
+                     'nodes': [{'node': node_result['node'], 'success': node_result['success'],
+                                'message': node_result['message'], 'latency': node_result['latency'],
+                                'files': node_result['result']} for node_result in node_results]}
+        return jsonify(apiresult)
+
+    @api.expect(cucm_log_files_query_args, validate=True)
+    def post(self):
+        """
+        Starts downloading the log files of every CUCM cluster node to the portal server
+
+        Files are downloaded in the background, in parallel via DimeGetFileService GetOneFile Requests and written
+        to disk as they are received. Files already downloaded are skipped and interrupted downloads are resumed.
+        The returned job id gives the download progress at /logs/download/{job_id}.
+        """
+        try:
+            log_files_query = _log_files_query(cucm_log_files_query_args.parse_args(request))
+            job = mySXMLCluster.log_download_start(**log_files_query)
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        apiresult = {'success': True, 'message': "Log Files Download Started", 'job': job}
+        return jsonify(apiresult)
+
+
+@api.route("/logs/download")
+class cucm_log_download_jobs_api(Resource):
+    def get(self):
+        """
+        Lists the log file download jobs and their progress
+        """
+        apiresult = {'success': True, 'message': "Log Download Jobs Retrieved Successfully",
+                     'jobs': mySXMLCluster.log_download_job()}
+        return jsonify(apiresult)
+
+
+@api.route("/logs/download/<string:job_id>")
+@api.param('job_id', description='The log download job id returned when starting the download')
+class cucm_log_download_job_api(Resource):
+    def get(self, job_id):
+        """
+        Returns the progress of a log file download job, with the result of each file downloaded so far
+        """
+        job = mySXMLCluster.log_download_job(job_id)
+        if job is None:
+            apiresult = {'success': False, 'message': f"Log download job not found: {job_id}"}
+            return jsonify(apiresult)
+        apiresult = {'success': job['state'] != 'failed' and not job['files_failed'], 'message': job['message'],
+                     'job': job}
+        return jsonify(apiresult)
+
+
+@api.route("/logs/file")
+class cucm_log_file_api(Resource):
+    @api.expect(cucm_log_file_query_args, validate=True)
+    def get(self):
+        """
+        Downloads a log file of a CUCM cluster node
+
+        The file is streamed to the client as it is received via a DimeGetFileService GetOneFile Request
+        """
+        try:
+            log_file_query_parsed_args = cucm_log_file_query_args.parse_args(request)
+            file_name = log_file_query_parsed_args['File']
+            chunks = mySXMLCluster.log_get_file(log_file_query_parsed_args['Node'], file_name,
+                                                offset=log_file_query_parsed_args['Offset'])
+            # Retrieve the first chunk before responding so errors are still a regular response
+            first_chunk = next(chunks, b'')
+        except Exception as e:
+            apiresult = {'success': False, 'message': str(e)}
+            return jsonify(apiresult)
+        file_base_name = file_name.rstrip('/').rsplit('/', 1)[-1]
+        return Response(self._stream_file(first_chunk, chunks), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="{file_base_name}"'})
+
+    @staticmethod
+    def _stream_file(first_chunk, chunks):
+        yield first_chunk
+        yield from chunks
+
+
 @api.route("/apply_phone/<string:device_name>")
 @api.param('device_name', description='The Name of the Phone Device')
 class cucm_apply_phone_api(Resource):
@@ -385,33 +726,88 @@ class cucm_apply_phone_api(Resource):
 
 @api.route("/phones")
 class cucm_list_phone_api(Resource):
-    @api.expect(cucm_list_phones_search_criteria_query_args, cucm_list_phones_returned_tags_query_args, validate=True)
+    @api.expect(cucm_list_phones_search_criteria_query_args, cucm_list_phones_returned_tags_query_args,
+                cucm_list_phones_paging_query_args, validate=True)
     def get(self):
         """
         Lists all provisioned phone details from CUCM
 
-        This API method executes listPhone AXL Request with the supplied search criteria
+        This API method executes paged listPhone AXL Requests (skip/first) with the supplied search criteria
         <br>
         https://pubhub.devnetcloud.com/media/axl-schema-reference/docs/Files/AXLSoap_listPhone.html#Link986
+        <br>
+        Unless returnedTags are supplied, the returnedTagsProfile selects the tags: <b>minimal</b> (name, description,
+        model, product, protocol), <b>standard</b> (minimal plus device pool, CSS, location, profiles and templates) or
+        <b>full</b> (every tag)
+        <br>
+        With stream set, phones are sent to the client as each page is retrieved instead of once the whole list has
+        been collected: <b>json</b> returns the same document (phone_list_count and success come last), <b>ndjson</b>
+        returns one phone per line. An error after streaming started is reported as success false (json) or as a
+        last {"success": false, "message": ...} line (ndjson).
 
         """
         try:
             list_phones_search_criteria_query_parsed_args = cucm_list_phones_search_criteria_query_args.parse_args(request)
             list_phones_returned_tags_query_parsed_args = cucm_list_phones_returned_tags_query_args.parse_args(request)
+            list_phones_paging_query_parsed_args = cucm_list_phones_paging_query_args.parse_args(request)
             returned_tags = None
             if list_phones_returned_tags_query_parsed_args['returnedTags'] is not None:
                 returned_tags_str = list_phones_returned_tags_query_parsed_args['returnedTags']
                 returned_tags = list(map(str.strip, returned_tags_str.split(',')))
-            axlresult = myAXL.list_phone(search_criteria_data=list_phones_search_criteria_query_parsed_args,
-                                         returned_tags=returned_tags)
+            phones = myAXL.list_phone_iter(search_criteria_data=list_phones_search_criteria_query_parsed_args,
+                                           returned_tags=returned_tags,
+                                           returned_tags_profile=list_phones_returned_tags_query_parsed_args['returnedTagsProfile'],
+                                           page_size=list_phones_paging_query_parsed_args['pageSize'],
+                                           prefetch=list_phones_paging_query_parsed_args['prefetch'],
+                                           skip_empty=list_phones_paging_query_parsed_args['skipEmpty'])
+            stream = list_phones_paging_query_parsed_args['stream']
+            if stream:
+                # Retrieve the first page before responding so setup and search errors are still a regular response
+                first_phone = next(phones, None)
+            else:
+                phone_list = list(phones)
+                if not phone_list:
+                    raise Exception("List Phone did not return any Results given the search criteria")
         except Exception as e:
             apiresult = {'success': False, 'message': str(e)}
             return jsonify(apiresult)
+        if stream == 'ndjson':
+            return Response(self._stream_ndjson(first_phone, phones), mimetype='application/x-ndjson')
+        if stream == 'json':
+            return Response(self._stream_json(first_phone, phones), mimetype='application/json')
         apiresult = {'success': True, 'message': "Phone List Retrieved Successfully",
-                     'phone_list_count': len(axlresult['return']['phone']),
-                     'phone_list_data': axlresult['return']['phone']}
+                     'phone_list_count': len(phone_list),
+                     'phone_list_data': phone_list}
         return jsonify(apiresult)
 
+    @staticmethod
+    def _stream_json(first_phone, phones):
+        yield '{"phone_list_data": ['
+        count = 0
+        try:
+            if first_phone is not None:
+                yield json.dumps(first_phone, default=str)
+                count = 1
+                for phone in phones:
+                    yield ',' + json.dumps(phone, default=str)
+                    count += 1
+            success, message = True, "Phone List Retrieved Successfully"
+        except Exception as e:
+            success, message = False, str(e)
+        yield '], "phone_list_count": ' + json.dumps(count) + ', "success": ' + json.dumps(success) + \
+            ', "message": ' + json.dumps(message) + '}\n'
+
+    @staticmethod
+    def _stream_ndjson(first_phone, phones):
+        if first_phone is None:
+            return
+        try:
+            yield json.dumps(first_phone, default=str) + '\n'
+            for phone in phones:
+                yield json.dumps(phone, default=str) + '\n'
+        except Exception as e:
+            yield json.dumps({'success': False, 'message': str(e)}) + '\n'
+
 
 @api.route("/line/<string:directory_num>")
 @api.param('directory_num', description='The Line Directory Number')
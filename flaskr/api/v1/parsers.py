@@ -58,6 +58,21 @@ cucm_list_phones_search_criteria_query_args.add_argument('securityProfileName',
 cucm_list_phones_returned_tags_query_args = reqparse.RequestParser()
 cucm_list_phones_returned_tags_query_args.add_argument('returnedTags', type=str, required=False,
                                                        help='Tags/Fields to Return (Supply a list seperated by comma) ie: name, description, product', location='args')
+cucm_list_phones_returned_tags_query_args.add_argument('returnedTagsProfile', type=str, required=False, default='minimal',
+                                                       choices=['minimal', 'standard', 'full', 'custom'],
+                                                       help='Set of Tags/Fields to Return when returnedTags is not supplied (returnedTags means custom)',
+                                                       location='args')
+
+cucm_list_phones_paging_query_args = reqparse.RequestParser()
+cucm_list_phones_paging_query_args.add_argument('pageSize', type=inputs.int_range(1, 10000), required=False,
+                                                help='Number of phones requested from CUCM per listPhone page', location='args')
+cucm_list_phones_paging_query_args.add_argument('prefetch', type=inputs.int_range(0, 8), required=False, default=0,
+                                                help='Number of pages requested ahead in parallel', location='args')
+cucm_list_phones_paging_query_args.add_argument('skipEmpty', type=inputs.boolean, required=False, default=False,
+                                                help='Leave out empty tags', location='args')
+cucm_list_phones_paging_query_args.add_argument('stream', type=str, required=False, choices=['json', 'ndjson'],
+                                                help='Stream the phone list as it is retrieved (json: same document, ndjson: one phone per line)',
+                                                location='args')
 
 # CUCM Device Search Query arguments
 cucm_device_search_criteria_query_args = reqparse.RequestParser()
@@ -69,6 +84,51 @@ cucm_device_search_criteria_query_args.add_argument('SearchItems', type=str, req
 cucm_device_search_criteria_query_args.add_argument('Status', type=str, required=False,
                                                     choices=['Any', 'Registered', 'UnRegistered', 'Rejected', 'PartiallyRegistered', 'Unknown'],
                                                     help='Device Status to Search', default='Any', location='args')
+cucm_device_search_criteria_query_args.add_argument('Model', type=int, required=False,
+                                                    help='Device Model number to Search (ie: 36670 for Cisco 8865)', location='args')
+cucm_device_search_criteria_query_args.add_argument('MaxAge', type=inputs.int_range(0, 3600), required=False,
+                                                    help='Search the cached registration snapshot, refreshed in the background if older than MaxAge seconds (Name, IPV4Address and IPV6Address searches)', location='args')
+
+# CUCM PerfMon History Query arguments
+cucm_perfmon_history_query_args = reqparse.RequestParser()
+cucm_perfmon_history_query_args.add_argument('counters', type=str, required=False,
+                                             help='Counters, comma seperated (default: all sampled counters)', location='args')
+cucm_perfmon_history_query_args.add_argument('minutes', type=inputs.int_range(1, 10080), required=False, default=60,
+                                             help='History duration in minutes', location='args')
+cucm_perfmon_history_query_args.add_argument('points', type=inputs.int_range(1, 2000), required=False, default=120,
+                                             help='Maximum points per counter, longer series are downsampled', location='args')
+
+# CUCM Log Collection Query arguments
+cucm_log_files_query_args = reqparse.RequestParser()
+cucm_log_files_query_args.add_argument('ServiceLogs', type=str, required=False,
+                                       help='List of Service Logs seperated by commas (ie: Cisco CallManager, Cisco CTIManager)', location='args')
+cucm_log_files_query_args.add_argument('SystemLogs', type=str, required=False,
+                                       help='List of System Logs seperated by commas (ie: Event Viewer-Application Log)', location='args')
+cucm_log_files_query_args.add_argument('Minutes', type=inputs.int_range(1, 43200), required=False, default=60,
+                                       help='Only files modified within the last Minutes', location='args')
+cucm_log_files_query_args.add_argument('SearchStr', type=str, required=False, default='',
+                                       help='Only files whose name contains SearchStr', location='args')
+cucm_log_files_query_args.add_argument('Nodes', type=str, required=False,
+                                       help='List of cluster nodes seperated by commas (default: every cluster node)', location='args')
+
+cucm_log_file_query_args = reqparse.RequestParser()
+cucm_log_file_query_args.add_argument('Node', type=str, required=True,
+                                      help='Cluster node holding the file', location='args')
+cucm_log_file_query_args.add_argument('File', type=str, required=True,
+                                      help='Absolute path of the file on the node (absolutepath of the file list)', location='args')
+cucm_log_file_query_args.add_argument('Offset', type=inputs.natural, required=False, default=0,
+                                      help='Number of bytes to skip, to resume an interrupted download', location='args')
+
+# CUCM CDR Query arguments
+cucm_cdr_ingest_query_args = reqparse.RequestParser()
+cucm_cdr_ingest_query_args.add_argument('MaxWindows', type=inputs.int_range(1, 168), required=False, default=24,
+                                        help='Maximum number of one hour windows ingested by each poll', location='args')
+
+cucm_cdr_summary_query_args = reqparse.RequestParser()
+cucm_cdr_summary_query_args.add_argument('Hours', type=inputs.int_range(1, 8760), required=False, default=24,
+                                         help='Calls originated within the last Hours', location='args')
+cucm_cdr_summary_query_args.add_argument('Top', type=inputs.int_range(1, 100), required=False, default=10,
+                                         help='Number of top calling / called numbers', location='args')
 
 # CUCM Service Status Query arguments
 cucm_service_status_query_args = reqparse.RequestParser()
@@ -118,10 +178,14 @@ cuc_users_get_args.add_argument('match_type', type=str, choices=['startswith', '
 cuc_users_get_args.add_argument('search', type=str, help='The string to search for', location='args')
 cuc_users_get_args.add_argument('sortorder', type=str, choices=['asc', 'desc'],
                                 help='Order of return values (ascending or descending)', default='asc', location='args')
-cuc_users_get_args.add_argument('rowsPerPage', type=int,
+cuc_users_get_args.add_argument('rowsPerPage', type=inputs.int_range(1, 10000),
                                 help='Maximum number of rows to return', default=100, location='args')
 cuc_users_get_args.add_argument('pageNumber', type=int,
                                 help='Page number to return', default=1, location='args')
+cuc_users_get_args.add_argument('all', type=inputs.boolean, default=False,
+                                help='Return all the users (every page), streamed as they are retrieved', location='args')
+cuc_users_get_args.add_argument('workers', type=inputs.int_range(1, 8), default=4,
+                                help='Number of pages requested in parallel when all is set', location='args')
 
 cuc_users_put_args = reqparse.RequestParser()
 cuc_users_put_args.add_argument('ListInDirectory', type=inputs.boolean, store_missing=False,
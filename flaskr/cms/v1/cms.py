@@ -1,7 +1,6 @@
-import json
-import xmltodict
-import xml.parsers.expat
-from flaskr.rest.v1.rest import REST
+from lxml import etree
+from flaskr.rest.v1.rest import REST, REST_POOL_MAXSIZE, REST_TIMEOUT, AsyncREST, ASYNC_REST_CONCURRENCY
+from flaskr.rest.v1.rest import xml_root, xml_to_dict
 from base64 import b64encode
 
 
@@ -15,15 +14,70 @@ class CMS(REST):
     :param username: The username of an account with access to the API.
     :param password: The password for your user account
     :param port: (optional) The server port for API access (default: 443)
+    :param pool_maxsize: (optional) Maximum number of keep-alive connections to the server (default: 16)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
     :type host: String
     :type username: String
     :type password: String
     :type port: Integer
+    :type pool_maxsize: Integer
+    :type timeout: Tuple
     :returns: return an CMS object
     :rtype: CMS
     '''
 
-    def __init__(self, host, username, password, port=443, tls_verify=False):
+    # CMS documents its error codes in its API documentation. We have simply converted it to a dict
+    error_codes = {
+        "accessMethodDoesNotExist": "You tried to modify or remove an accessMethod using an ID that did not correspond to a valid access method",
+        "callBrandingProfileDoesNotExist": "You tried to modify or remove a call branding profile using an ID that did not correspond to a valid call branding profile",
+        "callBridgeDoesNotExist": "You tried to modify or remove a configured clustered Call Bridge using an ID that did not correspond to a valid clustered Call Bridge",
+        "callDoesNotExist": "You tried to perform a method on a call object using an ID that did not correspond to a currently active call",
+        "callRecordingCannotBeModified": "You tried to start/stop recording a call that cannot be modified. Present from R1.9",
+        "callLegCannotBeDeleted": "You tried to delete a call leg that can't be deleted. Present from R1.8",
+        "callLegDoesNotExist": "You tried to perform a method on a call leg object using an ID that did not correspond to a currently active call leg",
+        "callLegProfileDoesNotExist": "You tried to modify or remove a callLegProfile using an ID that did not correspond to a valid call leg profile",
+        "callProfileDoesNotExist": "You tried to modify or remove a callProfile using an ID that is not valid",
+        "cdrReceiverDoesNotExist": "You tried to modify or remove a CDR receiver using an ID that did not correspond to a valid CDR receiver. Present from R1.8",
+        "coSpaceDoesNotExist": "You tried to modify or remove a coSpace using an ID that did not correspond to a valid coSpace on the system",
+        "coSpaceUserDoesNotExist": "You tried to modify or remove a coSpace user using an ID that did not correspond to a valid coSpace user",
+        "databaseNotReady": "You tried a method (e.g. initiation of an LDAP sync method) before the database was ready",
+        "directorySearchLocationDoesNotExist": " You tried to reference, modify or remove a directory search location using an ID that did not correspond to a valid directory search location. Present from R1.8",
+        "dtmfProfileDoesNotExist": " You tried to reference, modify or remove a DTMF profile using an ID that did not correspond to a valid DTMF profile",
+        "duplicateCallBridgeName": "You tried to create or modify a clustered Call Bridge to use a name that would clash with an existing configured clustered Call Bridge",
+        "duplicateCoSpaceId": "You tried to create or modify a coSpace call ID to use a call ID that clashed with one used by another coSpace",
+        "duplicateCoSpaceUri": " You tried to create or modify a coSpace to use a URI that clashed with one that corresponds to another coSpace. (Two coSpaces can't share the same URI, because the Meeting Server must be able to uniquely resolve an incoming call to a coSpace URI)",
+        "duplicateCoSpaceSecret": " You tried to modify a coSpace, or create or modify a coSpace access method, using a secret that clashed with one that is already used by that coSpace or one of its access methods",
+        "forwardingDialPlanRuleDoesNotExist": "You tried to modify or remove an forwarding dial plan rule using an ID that did not correspond to a valid forwarding dial plan rule",
+        "inboundDialPlanRuleDoesNotExist": "You tried to modify or remove an inbound dial plan rule using an ID that did not correspond to a valid inbound dial plan rule",
+        "inboundDialPlanRuleUriConflict": " You tried to make modifications to an inbound dial plan rule which would have caused a URI conflict. For example, this can happen if you try to add a rule which matches multiple tenants and more than one tenant has a coSpace with the same URI",
+        "invalidOperation": " You tried an operation which isn't supported; for example, you attempted to POST to /api/v1/system/profiles or issue a DELETE for a configured user generated from an LDAP sync",
+        "invalidVersion": "You attempted an operation with an invalid API version. Present from R1.8",
+        "ivrBrandingProfileDoesNotExist": "You tried to modify or remove an IVR branding profile object using an ID that did not correspond to a valid IVR branding profile on the system",
+        "ivrDoesNotExist": "You tried to modify or remove an IVR object using an ID that did not correspond to a valid IVR on the system",
+        "ivrUriConflict": "You tried to make modifications to an IVR object which would have caused a URI conflict",
+        "ldapMappingDoesNotExist": "You tried to modify or remove an LDAP mapping using an ID that did not correspond to a valid LDAP mapping",
+        "ldapServerDoesNotExist": "You tried to modify or remove an LDAP server using an ID that did not correspond to a valid LDAP server",
+        "ldapSourceDoesNotExist": "You tried to modify or remove an LDAP source using an ID that did not correspond to a valid LDAP source",
+        "ldapSyncCannotBeCancelled": "You tried to cancel an LDAP synchronization that has either started or completed – only LDAP synchronization methods that have not started yet can be cancelled",
+        "ldapSyncDoesNotExist": "You tried to query or cancel an LDAP synchronization with an ID that did not correspond to a valid LDAP synchronization",
+        "messageDoesNotExist": "You tried to remove a coSpace message using an ID that did not correspond to a valid coSpace message",
+        "outboundDialPlanRuleDoesNotExist": "You tried to modify or remove an outbound dial plan rule using an ID that did not correspond to a valid outbound dial plan rule",
+        "parameterError": "One or more parameters in a request were found to be invalid. Supporting parameter and error values give more detail about the failure",
+        "participantLimitReached": "You tried to add a new participant beyond the maximum number allowed for the call",
+        "recorderDoesNotExist": "You tried to modify or remove a recorder using an ID that did not correspond to a valid recorder. Present from R1.9",
+        "tenantDoesNotExist": "You tried to modify or remove a tenant using an ID that did not correspond to a valid tenant",
+        "tenantGroupCoSpaceIdConflict": "Your request to remove or use a tenant group would have resulted in a coSpace ID conflict. Present from R1.8",
+        "tenantGroupDoesNotExist": " You tried to modify, remove or use a tenant group that does not exist. Present from R1.8",
+        "tenantParticipantLimitReached": "You tried to add a new participant beyond the maximum number allowed for the owning tenant",
+        "tooManyCdrReceivers": "You tried to add a new CDR receiver when the maximum number were already present. R1.8 supports up to 2 CDR receivers",
+        "tooManyLdapSyncs": "A method to create a new LDAP synchronization method failed. Try again later",
+        "66unrecognisedObject": " There are elements in the URI you are accessing that are not recognized; e.g, you specified the wrong object ID in the URI",
+        "userDoesNotExist": "You tried to modify or remove a user using an ID that did not correspond to a valid user",
+        "userProfileDoesNotExist": "You tried to modify a user profile using an ID that did not correspond to a valid user profile"
+    }
+
+    def __init__(self, host, username, password, port=443, tls_verify=False, pool_maxsize=REST_POOL_MAXSIZE,
+                 timeout=REST_TIMEOUT):
         '''
         Initialize the CMS class as a child of the REST class. Define the CMS-specific headers, and API base_url
         '''
@@ -36,57 +90,7 @@ class CMS(REST):
 
         # Create a super class, where the CMS class inherits from the REST class.
         super().__init__(host, username, password, base_url='/api/v1',
-                         headers=headers, port=port, tls_verify=tls_verify)
-
-        # CMS documents its error codes in its API documentation. We have simply converted it to a dict
-        self.error_codes = {
-            "accessMethodDoesNotExist": "You tried to modify or remove an accessMethod using an ID that did not correspond to a valid access method",
-            "callBrandingProfileDoesNotExist": "You tried to modify or remove a call branding profile using an ID that did not correspond to a valid call branding profile",
-            "callBridgeDoesNotExist": "You tried to modify or remove a configured clustered Call Bridge using an ID that did not correspond to a valid clustered Call Bridge",
-            "callDoesNotExist": "You tried to perform a method on a call object using an ID that did not correspond to a currently active call",
-            "callRecordingCannotBeModified": "You tried to start/stop recording a call that cannot be modified. Present from R1.9",
-            "callLegCannotBeDeleted": "You tried to delete a call leg that can't be deleted. Present from R1.8",
-            "callLegDoesNotExist": "You tried to perform a method on a call leg object using an ID that did not correspond to a currently active call leg",
-            "callLegProfileDoesNotExist": "You tried to modify or remove a callLegProfile using an ID that did not correspond to a valid call leg profile",
-            "callProfileDoesNotExist": "You tried to modify or remove a callProfile using an ID that is not valid",
-            "cdrReceiverDoesNotExist": "You tried to modify or remove a CDR receiver using an ID that did not correspond to a valid CDR receiver. Present from R1.8",
-            "coSpaceDoesNotExist": "You tried to modify or remove a coSpace using an ID that did not correspond to a valid coSpace on the system",
-            "coSpaceUserDoesNotExist": "You tried to modify or remove a coSpace user using an ID that did not correspond to a valid coSpace user",
-            "databaseNotReady": "You tried a method (e.g. initiation of an LDAP sync method) before the database was ready",
-            "directorySearchLocationDoesNotExist": " You tried to reference, modify or remove a directory search location using an ID that did not correspond to a valid directory search location. Present from R1.8",
-            "dtmfProfileDoesNotExist": " You tried to reference, modify or remove a DTMF profile using an ID that did not correspond to a valid DTMF profile",
-            "duplicateCallBridgeName": "You tried to create or modify a clustered Call Bridge to use a name that would clash with an existing configured clustered Call Bridge",
-            "duplicateCoSpaceId": "You tried to create or modify a coSpace call ID to use a call ID that clashed with one used by another coSpace",
-            "duplicateCoSpaceUri": " You tried to create or modify a coSpace to use a URI that clashed with one that corresponds to another coSpace. (Two coSpaces can't share the same URI, because the Meeting Server must be able to uniquely resolve an incoming call to a coSpace URI)",
-            "duplicateCoSpaceSecret": " You tried to modify a coSpace, or create or modify a coSpace access method, using a secret that clashed with one that is already used by that coSpace or one of its access methods",
-            "forwardingDialPlanRuleDoesNotExist": "You tried to modify or remove an forwarding dial plan rule using an ID that did not correspond to a valid forwarding dial plan rule",
-            "inboundDialPlanRuleDoesNotExist": "You tried to modify or remove an inbound dial plan rule using an ID that did not correspond to a valid inbound dial plan rule",
-            "inboundDialPlanRuleUriConflict": " You tried to make modifications to an inbound dial plan rule which would have caused a URI conflict. For example, this can happen if you try to add a rule which matches multiple tenants and more than one tenant has a coSpace with the same URI",
-            "invalidOperation": " You tried an operation which isn't supported; for example, you attempted to POST to /api/v1/system/profiles or issue a DELETE for a configured user generated from an LDAP sync",
-            "invalidVersion": "You attempted an operation with an invalid API version. Present from R1.8",
-            "ivrBrandingProfileDoesNotExist": "You tried to modify or remove an IVR branding profile object using an ID that did not correspond to a valid IVR branding profile on the system",
-            "ivrDoesNotExist": "You tried to modify or remove an IVR object using an ID that did not correspond to a valid IVR on the system",
-            "ivrUriConflict": "You tried to make modifications to an IVR object which would have caused a URI conflict",
-            "ldapMappingDoesNotExist": "You tried to modify or remove an LDAP mapping using an ID that did not correspond to a valid LDAP mapping",
-            "ldapServerDoesNotExist": "You tried to modify or remove an LDAP server using an ID that did not correspond to a valid LDAP server",
-            "ldapSourceDoesNotExist": "You tried to modify or remove an LDAP source using an ID that did not correspond to a valid LDAP source",
-            "ldapSyncCannotBeCancelled": "You tried to cancel an LDAP synchronization that has either started or completed – only LDAP synchronization methods that have not started yet can be cancelled",
-            "ldapSyncDoesNotExist": "You tried to query or cancel an LDAP synchronization with an ID that did not correspond to a valid LDAP synchronization",
-            "messageDoesNotExist": "You tried to remove a coSpace message using an ID that did not correspond to a valid coSpace message",
-            "outboundDialPlanRuleDoesNotExist": "You tried to modify or remove an outbound dial plan rule using an ID that did not correspond to a valid outbound dial plan rule",
-            "parameterError": "One or more parameters in a request were found to be invalid. Supporting parameter and error values give more detail about the failure",
-            "participantLimitReached": "You tried to add a new participant beyond the maximum number allowed for the call",
-            "recorderDoesNotExist": "You tried to modify or remove a recorder using an ID that did not correspond to a valid recorder. Present from R1.9",
-            "tenantDoesNotExist": "You tried to modify or remove a tenant using an ID that did not correspond to a valid tenant",
-            "tenantGroupCoSpaceIdConflict": "Your request to remove or use a tenant group would have resulted in a coSpace ID conflict. Present from R1.8",
-            "tenantGroupDoesNotExist": " You tried to modify, remove or use a tenant group that does not exist. Present from R1.8",
-            "tenantParticipantLimitReached": "You tried to add a new participant beyond the maximum number allowed for the owning tenant",
-            "tooManyCdrReceivers": "You tried to add a new CDR receiver when the maximum number were already present. R1.8 supports up to 2 CDR receivers",
-            "tooManyLdapSyncs": "A method to create a new LDAP synchronization method failed. Try again later",
-            "66unrecognisedObject": " There are elements in the URI you are accessing that are not recognized; e.g, you specified the wrong object ID in the URI",
-            "userDoesNotExist": "You tried to modify or remove a user using an ID that did not correspond to a valid user",
-            "userProfileDoesNotExist": "You tried to modify a user profile using an ID that did not correspond to a valid user profile"
-        }
+                         headers=headers, port=port, tls_verify=tls_verify, pool_maxsize=pool_maxsize, timeout=timeout)
 
     def _cms_request(self, api_method, parameters={}, payload=None, http_method='GET'):
         '''
@@ -137,25 +141,22 @@ class CMS(REST):
         result = {'success': raw_resp['success'], 'message': raw_resp['message'], 'response': ''}
         
         try:
-            # Convert the binary encoded XML to a OrderedDict using xmltodict.parse
-            parsed_response = xmltodict.parse(raw_resp['response'].content.decode("utf-8"))
-            
+            # Parse the binary encoded XML and convert it to a dict (in the layout of xmltodict.parse)
+            parsed_response = xml_to_dict(xml_root(raw_resp['response'].content))
+
             # Get the root key from the dictionary (e.g. 'coSpaces')
-            rootobj = list(parsed_response.keys())[0]
+            rootobj = next(iter(parsed_response))
 
             # Check if we had returned a 200-299 response code
             if result['success']:
                 # In cases where there is exactly one user/object/etc, the child object
                 # will contain a dict, instead of having a list of dicts for each child
-                try:
-                    childobj = list(parsed_response[rootobj].keys())[1]
+                keys = list(parsed_response[rootobj]) if isinstance(parsed_response[rootobj], dict) else []
+                if len(keys) > 1 and isinstance(parsed_response[rootobj][keys[1]], dict):
+                    parsed_response[rootobj][keys[1]] = [parsed_response[rootobj][keys[1]]]
 
-                    if isinstance(parsed_response[rootobj][childobj], dict):
-                        parsed_response = xmltodict.parse(raw_resp['response'].content, force_list={childobj: True})
-                except IndexError:
-                    pass
-                # Replace the response value with our parsed_response, converting the OrderedDict to dict
-                result['response'] = json.loads(json.dumps(parsed_response))
+                # Replace the response value with our parsed_response
+                result['response'] = parsed_response
 
             else:
                 # Error codes for CMS. These are returned with a 400 response code with a rootobj=failureDetails
@@ -172,10 +173,10 @@ class CMS(REST):
                 else:
                     # Unknown root object
                     result['message'] = 'Unknown root object: {}'.format(rootobj)
-                    result['response'] = json.loads(json.dumps(parsed_response))
+                    result['response'] = parsed_response
 
         # No XML found in the response. check the Location header and return it, if present
-        except xml.parsers.expat.ExpatError:
+        except etree.XMLSyntaxError:
             try:
                 # Return the string from the location header, if present
                 location = raw_resp['response'].headers['location'].split("/")[len(
@@ -188,3 +189,50 @@ class CMS(REST):
                                 {}.  URL={}'.format(e, raw_resp['response'].request.url)
 
         return result
+
+
+class AsyncCMS(AsyncREST):
+    '''
+    The AsyncCMS Server class
+
+    The asyncio variant of the CMS class (see AsyncREST): _cms_request is a coroutine, its results are the same.
+
+    :param host: The Hostname / IP Address of the server
+    :param username: The username of an account with access to the API.
+    :param password: The password for your user account
+    :param port: (optional) The server port for API access (default: 443)
+    :param concurrency: (optional) Maximum number of requests sent at the same time (default: 64)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
+    :type host: String
+    :type username: String
+    :type password: String
+    :type port: Integer
+    :type concurrency: Integer
+    :type timeout: Tuple
+    :returns: return an AsyncCMS object
+    :rtype: AsyncCMS
+    '''
+
+    error_codes = CMS.error_codes
+
+    def __init__(self, host, username, password, port=443, tls_verify=False, concurrency=ASYNC_REST_CONCURRENCY,
+                 timeout=REST_TIMEOUT):
+        headers = {
+            'Accept': 'text/xml',
+            'Content-Type': 'x-www-form-urlencoded'
+        }
+        super().__init__(host, username, password, base_url='/api/v1', headers=headers, port=port,
+                         tls_verify=tls_verify, concurrency=concurrency, timeout=timeout)
+
+    async def _cms_request(self, api_method, parameters={}, payload=None, http_method='GET'):
+        '''
+        Send a request to a CMS server, see CMS._cms_request
+        '''
+        resp = await self._send_request(api_method, parameters=parameters,
+                                        payload=payload, http_method=http_method)
+        if resp['success']:
+            resp = self._check_response(resp)
+            resp = self._cms_parse_response(resp)
+        return resp
+
+    _cms_parse_response = CMS._cms_parse_response
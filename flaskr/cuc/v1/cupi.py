@@ -1,7 +1,13 @@
 import json
+import math
 import re
 from base64 import b64encode
-from flaskr.rest.v1.rest import REST
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flaskr.rest.v1.rest import REST, REST_POOL_MAXSIZE, REST_TIMEOUT, AsyncREST, ASYNC_REST_CONCURRENCY
+
+# Pages requested at the same time by CUPI.list_iter, each one uses a connection of the REST connection pool
+CUPI_PAGE_WORKERS = 4
 
 
 class CUPI(REST):
@@ -14,15 +20,20 @@ class CUPI(REST):
     :param username: The username of an account with access to the API.
     :param password: The password for your user account
     :param port: (optional) The server port for API access (default: 443)
+    :param pool_maxsize: (optional) Maximum number of keep-alive connections to the server (default: 16)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
     :type host: String
     :type username: String
     :type password: String
     :type port: Integer
+    :type pool_maxsize: Integer
+    :type timeout: Tuple
     :returns: return an CUPI object
     :rtype: CUPI
     '''
 
-    def __init__(self, host, username, password, port=443, tls_verify=False):
+    def __init__(self, host, username, password, port=443, tls_verify=False, pool_maxsize=REST_POOL_MAXSIZE,
+                 timeout=REST_TIMEOUT):
         '''
         Initialize the CUPI class as a child of the REST class. Define the CUPI-specific headers, and API base_url
         '''
@@ -35,7 +46,7 @@ class CUPI(REST):
         # Create a super class, where the CUPI class inherits from the REST class.  This will allow us to
         # add CUPI-specific items.  Reference:  https://realpython.com/python-super/
         super().__init__(host, username, password, base_url='/vmrest',
-                         headers=headers, port=port, tls_verify=tls_verify)
+                         headers=headers, port=port, tls_verify=tls_verify, pool_maxsize=pool_maxsize, timeout=timeout)
 
     def _cupi_request(self, api_method, parameters={}, payload=None, http_method='GET'):
         '''
@@ -86,17 +97,13 @@ class CUPI(REST):
         '''
         result = {'success': raw_resp['success'],
                   'message': raw_resp['message'], 'response': ''}
+        content = raw_resp['response'].content
         # Check if the payload had any data to decode
-        if len(raw_resp['response'].content) > 0:
+        if len(content) > 0:
             try:
-                # Could not decode as JSON; convert the binary response to a string type
-                response_string = raw_resp['response'].content.decode('utf-8')
-
-                # Attempt to convert the response string into a dict using json.loads
-                parsed_response = json.loads(response_string)
+                # Convert the response payload ("content") to a dict, json.loads reads the bytes directly
+                parsed_response = json.loads(content)
 
-                # Convert Response payload ("content") from byte type into string-, the to dict using json.loads
-                # parsed_response = json.loads(raw_resp['response'].content.decode("utf-8"))
                 try:
                     # From most responses, @total key will indicate how many items were found. If @total=1,
                     # the data included under child key will be a dict; if @total>1, then a list of dicts.
@@ -118,9 +125,10 @@ class CUPI(REST):
                 result['response'] = parsed_response
 
             # Could not decode response string into a dict using json.loads
-            except json.decoder.JSONDecodeError:
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError):
                 # This may be a normal response, as for a valid POST/PUT. Or it could be an error web
                 # page from Unity. If it's the latter, look for an Exception tag to give us more information.
+                response_string = content.decode('utf-8', 'replace')
                 regex = r"<b>\s*Exception:\s*</b>\s*<pre>\s*(.*?)\s+</pre>"
                 exception_match = re.search(regex, response_string)
                 if exception_match:
@@ -129,3 +137,146 @@ class CUPI(REST):
                     result['message'] = response_string
 
         return result
+
+
+    def list_iter(self, api_method, parameters=None, rows_per_page=100, workers=CUPI_PAGE_WORKERS):
+        '''
+        Lists all the objects of a CUPI list method (ie: "users", "import/users/ldap") page by page
+        (rowsPerPage / pageNumber), returning an iterator of the objects.
+
+        The first page is requested right away and gives the total number of objects (@total), so request errors
+        are raised by list_iter itself. The remaining pages are requested on a thread pool with up to workers pages
+        in flight while the caller consumes the current page. Objects are always yielded in order and at most
+        workers + 1 pages are held in memory.
+
+        :param api_method: The API method, such as "users"
+        :param parameters: (optional) The request parameters, such as {'query': '(alias startswith a)'}, the
+                           rowsPerPage and pageNumber parameters are set by list_iter
+        :param rows_per_page: (optional) Number of objects requested per page (default: 100)
+        :param workers: (optional) Maximum number of pages requested at the same time (default: 4)
+        :type api_method: String
+        :type parameters: Dict
+        :type rows_per_page: Integer
+        :type workers: Integer
+        :returns: return an iterator of the objects, with the total (@total) and item_name (ie: 'User') attributes.
+                  Raises a ValueError if rows_per_page is lower than 1, an Exception if a page request fails.
+        :rtype: CUPIList
+        '''
+        if rows_per_page < 1:
+            raise ValueError(f'rows_per_page must be at least 1, not {rows_per_page}')
+        first_page = self.list_page(api_method, parameters, rows_per_page, 1)
+        total = first_page['total']
+        pages = max(1, math.ceil(total / rows_per_page))
+        return CUPIList(first_page['item_name'], total,
+                        self._list_items(first_page, api_method, parameters, rows_per_page, pages, workers))
+
+    def _list_items(self, first_page, api_method, parameters, rows_per_page, pages, workers):
+        yield from first_page['items']
+        if pages <= 1:
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cupi-page') as executor:
+            pending = deque()
+            next_page = 2
+            try:
+                while pending or next_page <= pages:
+                    while len(pending) < workers and next_page <= pages:
+                        pending.append(executor.submit(self.list_page, api_method, parameters, rows_per_page,
+                                                       next_page))
+                        next_page += 1
+                    page = pending.popleft().result()
+                    yield from page['items']
+                    if len(page['items']) < rows_per_page:
+                        # Objects deleted since the first page: no more pages
+                        return
+            finally:
+                # Don't wait for pages past the end (or past the point where the consumer stopped)
+                for future in pending:
+                    future.cancel()
+
+    def list_page(self, api_method, parameters, rows_per_page, page_number):
+        '''
+        Returns one page of a CUPI list method as a dictionary with the keys total (@total), item_name (ie: 'User')
+        and items (list of objects). Raises an Exception if the request fails.
+        '''
+        params = dict(parameters or {})
+        params.update({'rowsPerPage': rows_per_page, 'pageNumber': page_number})
+        resp = self._cupi_request(api_method, parameters=params)
+        if not resp['success']:
+            raise Exception(resp['message'] or 'CUPI {} page {} request failed'.format(api_method, page_number))
+        response = resp['response'] if isinstance(resp['response'], dict) else {}
+        try:
+            total = int(response['@total'])
+        except (KeyError, TypeError, ValueError):
+            raise Exception('CUPI {} response without @total'.format(api_method))
+        item_name = next((key for key in response.keys() if key != '@total'), None)
+        items = response.get(item_name, []) if item_name else []
+        # A page holding a single object returns it as a dict, unless @total is 1 (see _cupi_parse_response)
+        if isinstance(items, dict):
+            items = [items]
+        return {'total': total, 'item_name': item_name, 'items': items}
+
+
+class CUPIList:
+    '''
+    The objects of a CUPI list method (see CUPI.list_iter): an iterator, with the total number of objects (total)
+    and the name of the objects (item_name, ie: 'User') as returned by the first page
+    '''
+
+    def __init__(self, item_name, total, items):
+        self.item_name = item_name
+        self.total = total
+        self._items = items
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self):
+        self._items.close()
+
+
+class AsyncCUPI(AsyncREST):
+    '''
+    The AsyncCUPI Server class
+
+    The asyncio variant of the CUPI class (see AsyncREST): _cupi_request is a coroutine, its results are the same.
+
+    :param host: The Hostname / IP Address of the server
+    :param username: The username of an account with access to the API.
+    :param password: The password for your user account
+    :param port: (optional) The server port for API access (default: 443)
+    :param concurrency: (optional) Maximum number of requests sent at the same time (default: 64)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
+    :type host: String
+    :type username: String
+    :type password: String
+    :type port: Integer
+    :type concurrency: Integer
+    :type timeout: Tuple
+    :returns: return an AsyncCUPI object
+    :rtype: AsyncCUPI
+    '''
+
+    def __init__(self, host, username, password, port=443, tls_verify=False, concurrency=ASYNC_REST_CONCURRENCY,
+                 timeout=REST_TIMEOUT):
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+        super().__init__(host, username, password, base_url='/vmrest', headers=headers, port=port,
+                         tls_verify=tls_verify, concurrency=concurrency, timeout=timeout)
+
+    async def _cupi_request(self, api_method, parameters={}, payload=None, http_method='GET'):
+        '''
+        Send a request to a CUC server, see CUPI._cupi_request
+        '''
+        resp = await self._send_request(api_method, parameters=parameters,
+                                        payload=json.dumps(payload), http_method=http_method)
+        if resp['success']:
+            resp = self._check_response(resp)
+            resp = self._cupi_parse_response(resp)
+        return resp
+
+    _cupi_parse_response = CUPI._cupi_parse_response
@@ -3,13 +3,16 @@ from zeep import Client
 from zeep.cache import SqliteCache
 from zeep.transports import Transport
 from zeep.plugins import HistoryPlugin
-from requests import Session
-from requests.auth import HTTPBasicAuth
+from zeep.exceptions import Fault, TransportError
 import urllib3
 import logging.config
 import logging
 import os
-import re
+from flaskr.cucm.v1.axltoolkit.wsdl_cache import wsdl_document_cache, versioned_wsdl
+from flaskr.cucm.v1.axltoolkit.http_session import get_http_session
+from flaskr.cucm.v1.axltoolkit.throttle import ThrottledService, get_axl_throttle
+from flaskr.cucm.v1.axltoolkit.sql import sql_cdata
+from flaskr.cucm.v1.axltoolkit.dime import ATTACHMENT_CHUNK_SIZE, attachment_chunks
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -69,9 +72,7 @@ class AxlToolkit:
 
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
         self.wsdl = None
         self.last_exception = None
@@ -103,13 +104,18 @@ class AxlToolkit:
         else:
             self.wsdl = os.path.join(filedir, 'schema/12.5/AXLAPI.wsdl')
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history],
-                             transport=Transport(timeout=timeout, operation_timeout=timeout,
-                             cache=self.cache, session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL/XSD Document is shared process-wide (and persisted to disk), so only the first client
+        # built for a given schema version pays for parsing it
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport), plugins=[self.history],
+                             transport=transport)
         # Update the Default SOAP API Binding Address Location with server_ip for all API Service Endpoints
         # Default: (https://CCMSERVERNAME:8443/axl/)
-        self.service = self.client.create_service("{http://www.cisco.com/AXLAPIService/}AXLAPIBinding",
-                                                  "https://{0}:8443/axl/".format(server_ip))
+        # All AXL and Thin AXL (SQL) requests to the server go through its shared adaptive rate limiter
+        self.throttle = get_axl_throttle(server_ip)
+        self.service = ThrottledService(self.client.create_service("{http://www.cisco.com/AXLAPIService/}AXLAPIBinding",
+                                                                   "https://{0}:8443/axl/".format(server_ip)),
+                                        self.throttle)
 
         if logging_enabled:
             self._enable_logging()
@@ -180,9 +186,7 @@ class AxlToolkit:
                   'query': query}
 
         try:
-            if any(re.findall(r'<|>|&lt;|&gt;', query)):
-                if not re.search(r'^<!\[CDATA\[', query):
-                    query = f"<![CDATA[{query}]]>"
+            query = sql_cdata(query)
             sql_result = self.service.executeSQLQuery(sql=query)
         except Exception as fault:
             sql_result = None
@@ -206,6 +210,49 @@ class AxlToolkit:
 
         return result
 
+    def run_sql_query_raw(self, query):
+        """
+        Runs a Thin AXL executeSQLQuery and returns the raw SOAP response body (bytes) instead of zeep objects,
+        to be parsed with sql.parse_sql_query_response. Returns None and sets last_exception on failure.
+        """
+        try:
+            with self.client.settings(raw_response=True):
+                response = self.service.executeSQLQuery(sql=sql_cdata(query))
+        except Exception as fault:
+            self.last_exception = fault
+            return None
+
+        return self.raw_response_content(response)
+
+    def get_axl_type(self, name):
+        """
+        Returns the zeep type of an AXL schema type (ie: LPhone) of this client's AXL version
+        """
+        namespace = next(namespace for namespace in self.client.wsdl.types.prefix_map.values()
+                         if namespace.startswith('http://www.cisco.com/AXL/API/'))
+        return self.client.get_type('{%s}%s' % (namespace, name))
+
+    def raw_response_content(self, response):
+        """
+        Returns the body of a raw (client.settings(raw_response=True)) SOAP response. Error responses are turned
+        into a Fault (or a TransportError for non SOAP errors, ie: HTTP 503) set as last_exception, and None is
+        returned.
+        """
+        if response.status_code != 200:
+            fault_string = None
+            try:
+                fault_string = etree.fromstring(response.content).findtext('.//faultstring')
+            except etree.XMLSyntaxError:
+                pass
+            if fault_string:
+                self.last_exception = Fault(fault_string)
+            else:
+                self.last_exception = TransportError(f"HTTP Status {response.status_code} - {response.reason}",
+                                                     status_code=response.status_code, content=response.content)
+            return None
+
+        return response.content
+
     def run_sql_update(self, query):
         """
 
@@ -217,9 +264,7 @@ class AxlToolkit:
                   'query': query}
 
         try:
-            if any(re.findall(r'<|>|&lt;|&gt;', query)):
-                if not re.search(r'^<!\[CDATA\[', query):
-                    query = f"<![CDATA[{query}]]>"
+            query = sql_cdata(query)
             sql_result = self.service.executeSQLUpdate(sql=query)
         except Exception as fault:
             sql_result = None
@@ -338,7 +383,11 @@ class CUCMAxlToolkit(AxlToolkit):
 
         return result
 
-    def list_user(self, search_Criteria_data, returned_tags=None):
+    def list_user(self, search_Criteria_data, returned_tags=None, skip=None, first=None, raw=False):
+        """
+        With raw, the raw SOAP response body (bytes) is returned instead of zeep objects, to be parsed with
+        raw_response.iter_list_response
+        """
 
         if returned_tags is None:
             returned_tags = {
@@ -377,10 +426,17 @@ class CUCMAxlToolkit(AxlToolkit):
                 "userIdentity": ""
             }
 
+        elif isinstance(returned_tags, list):
+            returned_tags = dict.fromkeys(returned_tags, '')
+
         try:
-            result = self.service.listUser(searchCriteria=search_Criteria_data, returnedTags=returned_tags)
+            with self.client.settings(raw_response=raw):
+                result = self.service.listUser(searchCriteria=search_Criteria_data, returnedTags=returned_tags,
+                                               skip=skip, first=first)
+            if raw:
+                result = self.raw_response_content(result)
         except Exception as fault:
-            # users = None
+            result = None
             self.last_exception = fault
         return result
 
@@ -714,7 +770,11 @@ class CUCMAxlToolkit(AxlToolkit):
 
         return result
 
-    def list_phone(self, search_Criteria_data, returned_tags=None):
+    def list_phone(self, search_Criteria_data, returned_tags=None, skip=None, first=None, raw=False):
+        """
+        With raw, the raw SOAP response body (bytes) is returned instead of zeep objects, to be parsed with
+        raw_response.iter_list_response
+        """
         if returned_tags is None:
             returned_tags = {
                 'AllowPresentationSharingUsingBfcp': '',
@@ -841,7 +901,11 @@ class CUCMAxlToolkit(AxlToolkit):
             returned_tags = dict.fromkeys(returned_tags, '')
 
         try:
-            result = self.service.listPhone(searchCriteria=search_Criteria_data, returnedTags=returned_tags)
+            with self.client.settings(raw_response=raw):
+                result = self.service.listPhone(searchCriteria=search_Criteria_data, returnedTags=returned_tags,
+                                                skip=skip, first=first)
+            if raw:
+                result = self.raw_response_content(result)
         except Exception as fault:
             result = None
             self.last_exception = fault
@@ -1885,19 +1949,19 @@ class UcmServiceabilityToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
-        self.wsdl = 'https://{0}:8443/controlcenterservice2/services/ControlCenterServices?wsdl'.format(server_ip)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'ControlCenterServices', 'https://{0}:8443/controlcenterservice2/services/ControlCenterServices?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
         self.last_exception = None
 
         self.cache = SqliteCache(path='/tmp/sqlite_serviceability_{0}.db'.format(server_ip), timeout=60)
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
 
         # Update the Default SOAP API Binding Address Location with server_ip for all API Service Endpoints
         # Default: (https://localhost:8443/controlcenterservice2/services/ControlCenterServices)
@@ -1938,19 +2002,19 @@ class UcmRisPortToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
-        self.wsdl = 'https://{0}:8443/realtimeservice2/services/RISService70?wsdl'.format(server_ip)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'RISService70', 'https://{0}:8443/realtimeservice2/services/RISService70?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
         self.last_exception = None
 
         self.cache = SqliteCache(path='/tmp/sqlite_risport_{0}.db'.format(server_ip), timeout=60)
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
 
         # Update the Default SOAP API Binding Address Location with server_ip for all API Service Endpoints
         # Default: (https://localhost:8443/realtimeservice2/services/RISService70)
@@ -1990,19 +2054,19 @@ class UcmPerfMonToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
-        self.wsdl = 'https://{0}:8443/perfmonservice2/services/PerfmonService?wsdl'.format(server_ip)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'PerfmonService', 'https://{0}:8443/perfmonservice2/services/PerfmonService?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
         self.last_exception = None
 
         self.cache = SqliteCache(path='/tmp/sqlite_perfmon_{0}.db'.format(server_ip), timeout=60)
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
 
         # Update the Default SOAP API Binding Address Location with server_ip for all API Service Endpoints
         # Default: (https://localhost:8443/perfmonservice2/services/PerfmonService)
@@ -2094,19 +2158,19 @@ class UcmLogCollectionToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
-        self.wsdl = 'https://{0}:8443/logcollectionservice2/services/LogCollectionPortTypeService?wsdl'.format(server_ip)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'LogCollectionPortTypeService', 'https://{0}:8443/logcollectionservice2/services/LogCollectionPortTypeService?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
         self.last_exception = None
 
         self.cache = SqliteCache(path='/tmp/sqlite_logcollection.db', timeout=60)
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
 
         # Update the Default SOAP API Binding Address Location with server_ip for all API Service Endpoints
         # Default: (https://localhost:8443/logcollectionservice2/services/LogCollectionPortTypeService)
@@ -2119,6 +2183,42 @@ class UcmLogCollectionToolkit:
     def get_service(self):
         return self.service
 
+    def select_log_files(self, service_logs=None, system_logs=None, rel_text='Hours', rel_time=1, search_str=''):
+        """
+        Lists the log files of the selected services / system logs modified within the relative time range
+
+        :param service_logs: (optional) Service log names (ie: Cisco CallManager)
+        :param system_logs: (optional) System log names (ie: Event Viewer-Application Log)
+        :param rel_text: (optional) Time range unit: Minutes, Hours, Days, Weeks, Months, Years (default: Hours)
+        :param rel_time: (optional) Relative time range, in rel_text units (default: 1)
+        :param search_str: (optional) Only files whose name contains search_str
+        :type service_logs: list
+        :type system_logs: list
+        :type rel_text: str
+        :type rel_time: int
+        :type search_str: str
+        :return: selectLogFiles response
+        """
+        file_selection_criteria = {
+            'ServiceLogs': {'item': service_logs or []},
+            'SystemLogs': {'item': system_logs or []},
+            'SearchStr': search_str,
+            'Frequency': 'OnDemand',
+            'JobType': 'DownloadtoClient',
+            'ToDate': '',
+            'FromDate': '',
+            'TimeZone': '',
+            'RelText': rel_text,
+            'RelTime': rel_time,
+            'Port': '',
+            'IPAddress': '',
+            'UserName': '',
+            'Password': '',
+            'ZipInfo': False,
+            'RemoteFolder': ''
+        }
+        return self.service.selectLogFiles(FileSelectionCriteria=file_selection_criteria)
+
 
 class UcmDimeGetFileToolkit:
     """
@@ -2146,21 +2246,100 @@ class UcmDimeGetFileToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
-        self.wsdl = 'https://{0}:8443/logcollectionservice/services/DimeGetFileService?wsdl'.format(server_ip)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'DimeGetFileService', 'https://{0}:8443/logcollectionservice/services/DimeGetFileService?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
         self.last_exception = None
+        self.timeout = timeout
 
         self.cache = SqliteCache(path='/tmp/sqlite_logcollectiondime.db', timeout=60)
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
+
+        # The WSDL address is the one of the server the (possibly shared) WSDL Document was downloaded from
+        binding = next(iter(self.client.wsdl.bindings))
+        self.service = self.client.create_service(
+            binding, 'https://{0}:8443/logcollectionservice/services/DimeGetFileService'.format(server_ip))
+
+        if logging_enabled:
+            AxlToolkit._enable_logging()
+
+    def get_service(self):
+        return self.service
+
+    def get_one_file(self, file_name, offset=0, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """
+        Generator yielding the content of a file in chunks, as it is received from the server. The GetOneFile
+        response is streamed rather than parsed by zeep, which would hold the whole file attachment in memory.
+
+        :param file_name: The absolute path of the file on the server (selectLogFiles absolutepath)
+        :param offset: (optional) Number of bytes at the start of the file to skip, ie: already downloaded
+        :param chunk_size: (optional) Maximum chunk size in bytes (default: ATTACHMENT_CHUNK_SIZE)
+        :type file_name: str
+        :type offset: int
+        :type chunk_size: int
+        :return: generator of byte chunks
+        """
+        envelope = self.client.create_message(self.service, 'GetOneFile', FileName=file_name)
+        headers = {'Content-Type': 'text/xml; charset=utf-8',
+                   'SOAPAction': '"{0}"'.format(self.service._binding.get('GetOneFile').soapaction or '')}
+        response = self.session.post(self.service._binding_options['address'], data=etree.tostring(envelope),
+                                     headers=headers, stream=True, timeout=self.timeout)
+        try:
+            yield from attachment_chunks(response, offset=offset, chunk_size=chunk_size)
+        finally:
+            response.close()
+
 
-        self.service = self.client.service
+class UcmCDRonDemandToolkit:
+    """
+    The UcmCDRonDemandToolkit SOAP API class
+    This class enables us to connect and make CDRonDemandService2 API calls utilizing Zeep Python Package as the SOAP Client
+
+    :param username: The username used for Basic HTTP Authentication
+    :param password: The password used for Basic HTTP Authentication
+    :param server_ip: The Hostname / IP Address of the server
+    :param tls_verify: (optional) Certificate validation check for HTTPs connection (default: True)
+    :param timeout: (optional) Zeep Client Transport Response Timeout in seconds (default: 10)
+    :param logging_enabled: (optional) Zeep SOAP message Logging (default: False)
+    :type username: str
+    :type password: str
+    :type server_ip: str
+    :type tls_verify: bool
+    :type timeout: int
+    :type logging_enabled: bool
+    :returns: return an UcmCDRonDemandToolkit object
+    :rtype: UcmCDRonDemandToolkit
+    """
+
+    def __init__(self, username, password, server_ip, tls_verify=True, timeout=30, logging_enabled=False):
+        """
+        Constructor - Create new instance
+        """
+
+        self.session = get_http_session(server_ip, username, password, tls_verify)
+        self.history = AXLHistoryPlugin(maxlen=1)
+        self.wsdl, wsdl_cache_name = versioned_wsdl(
+            'CDRonDemandService2', 'https://{0}:8443/realtimeservice2/services/CDRonDemandService2?wsdl'.format(server_ip),
+            server_ip, self.session, timeout)
+        self.last_exception = None
+
+        self.cache = SqliteCache(path='/tmp/sqlite_cdrondemand_{0}.db'.format(server_ip), timeout=60)
+
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
+
+        # The WSDL address is the one of the server the (possibly shared) WSDL Document was downloaded from
+        binding = next(iter(self.client.wsdl.bindings))
+        self.service = self.client.create_service(
+            binding, 'https://{0}:8443/realtimeservice2/services/CDRonDemandService2'.format(server_ip))
 
         if logging_enabled:
             AxlToolkit._enable_logging()
@@ -2168,6 +2347,32 @@ class UcmDimeGetFileToolkit:
     def get_service(self):
         return self.service
 
+    def get_file_list(self, from_time, to_time):
+        """
+        :param from_time: Start of the time window, UTC (YYYYMMDDhhmm)
+        :param to_time: End of the time window, UTC (YYYYMMDDhhmm), at most one hour after from_time
+        :return: The CDR and CMR file names of the time window
+        """
+        # Third argument: list every file of the window, including files already sent to the billing servers
+        return self.service.get_file_list(from_time, to_time, True)
+
+    def get_file(self, sftp_host, sftp_username, sftp_password, from_time, to_time, sftp_folder, file_name):
+        """
+        Has CUCM send a CDR or CMR file to an SFTP server
+
+        :param sftp_host: The SFTP server Hostname / IP Address
+        :param sftp_username: The SFTP server username
+        :param sftp_password: The SFTP server password
+        :param from_time: Start of the time window the file was listed in, UTC (YYYYMMDDhhmm)
+        :param to_time: End of the time window the file was listed in, UTC (YYYYMMDDhhmm)
+        :param sftp_folder: The folder on the SFTP server the file is stored in
+        :param file_name: The file name (get_file_list)
+        :return: get_file response
+        """
+        # Last argument: secure transfer (SFTP rather than FTP)
+        return self.service.get_file(sftp_host, sftp_username, sftp_password, from_time, to_time, sftp_folder,
+                                     file_name, True)
+
 
 class PawsToolkit:
     """
@@ -2197,9 +2402,7 @@ class PawsToolkit:
         Constructor - Create new instance
         """
 
-        self.session = Session()
-        self.session.auth = HTTPBasicAuth(username, password)
-        self.session.verify = tls_verify
+        self.session = get_http_session(server_ip, username, password, tls_verify)
         self.history = AXLHistoryPlugin(maxlen=1)
         self.wsdl = None
         self.binding = None
@@ -2212,29 +2415,38 @@ class PawsToolkit:
 
         if service == 'HardwareInformation':
             self.wsdl = os.path.join(dir, 'paws/hardware_information_service.wsdl')
+            wsdl_cache_name = None
             self.binding = "{http://services.api.platform.vos.cisco.com}HardwareInformationServiceSoap11Binding"
             self.endpoint = "https://{0}:8443/platform-services/services/HardwareInformationService.HardwareInformationServiceHttpsSoap11Endpoint/".format(server_ip)  # nopep8
         elif service == 'OptionsService':
-            self.wsdl = 'https://{0}:8443/platform-services/services/OptionsService?wsdl'.format(server_ip)
+            self.wsdl, wsdl_cache_name = versioned_wsdl(
+                'OptionsService', 'https://{0}:8443/platform-services/services/OptionsService?wsdl'.format(server_ip),
+                server_ip, self.session, timeout)
             self.binding = "{http://services.api.platform.vos.cisco.com}OptionsServiceSoap12Binding"
             self.endpoint = "https://{0}:8443/platform-services/services/OptionsService.OptionsServiceHttpsSoap12Endpoint/".format(server_ip)  # nopep8
         elif service == 'ProductService':
-            self.wsdl = 'https://{0}:8443/platform-services/services/ProductService?wsdl'.format(server_ip)
+            self.wsdl, wsdl_cache_name = versioned_wsdl(
+                'ProductService', 'https://{0}:8443/platform-services/services/ProductService?wsdl'.format(server_ip),
+                server_ip, self.session, timeout)
             self.binding = "{http://services.api.platform.vos.cisco.com}ProductServiceSoap12Binding"
             self.endpoint = "https://{0}:8443/platform-services/services/ProductService.ProductServiceHttpsSoap12Endpoint/".format(server_ip)  # nopep8
         elif service == 'VersionService':
-            self.wsdl = 'https://{0}:8443/platform-services/services/VersionService?wsdl'.format(server_ip)
+            self.wsdl, wsdl_cache_name = versioned_wsdl(
+                'VersionService', 'https://{0}:8443/platform-services/services/VersionService?wsdl'.format(server_ip),
+                server_ip, self.session, timeout)
             self.binding = "{http://services.api.platform.vos.cisco.com}VersionServiceSoap12Binding"
             self.endpoint = "https://{0}:8443/platform-services/services/VersionService.VersionServiceHttpsSoap12Endpoint/".format(server_ip)  # nopep8
         elif service == 'ClusterNodesService':
-            self.wsdl = 'https://{0}:8443/platform-services/services/ClusterNodesService?wsdl'.format(server_ip)
+            self.wsdl, wsdl_cache_name = versioned_wsdl(
+                'ClusterNodesService', 'https://{0}:8443/platform-services/services/ClusterNodesService?wsdl'.format(server_ip),
+                server_ip, self.session, timeout)
             self.binding = "{http://services.api.platform.vos.cisco.com}ClusterNodesServiceSoap12Binding"
             self.endpoint = "https://{0}:8443/platform-services/services/ClusterNodesService.ClusterNodesServiceHttpsSoap12Endpoint/".format(server_ip)  # nopep8
 
-        self.client = Client(wsdl=self.wsdl, plugins=[self.history], transport=Transport(timeout=timeout,
-                                                                                         operation_timeout=timeout,
-                                                                                         cache=self.cache,
-                                                                                         session=self.session))
+        transport = Transport(timeout=timeout, operation_timeout=timeout, cache=self.cache, session=self.session)
+        # The parsed WSDL Document is shared by every client of the same WSDL in this process
+        self.client = Client(wsdl=wsdl_document_cache.get_document(self.wsdl, transport, cache_name=wsdl_cache_name),
+                             plugins=[self.history], transport=transport)
 
         self.service = self.client.create_service(self.binding, self.endpoint)
 
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from lxml import etree
+from zeep.exceptions import XMLParseError
+from flaskr.cucm.v1.axltoolkit.http_session import http_setup_error
+
+log = logging.getLogger(__name__)
+
+# Minimal AXL 1.0 getCCMVersion request. The 1.0 namespace is accepted by every CUCM version.
+GET_CCM_VERSION_ENVELOPE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:ns="http://www.cisco.com/AXL/API/1.0">'
+    '<soapenv:Header/>'
+    '<soapenv:Body><ns:getCCMVersion/></soapenv:Body>'
+    '</soapenv:Envelope>'
+)
+
+
+def get_ccm_version(session, server_ip, timeout=10):
+    """
+    Retrieve the full CUCM version (ie: 15.0.1.11900-23) with a raw getCCMVersion AXL request
+
+    This avoids building a zeep Client (and parsing an AXL schema) just to find out which AXL schema version we need.
+
+    :param session: The requests Session (with authentication and TLS verification set up) used to send the request
+    :param server_ip: The Hostname / IP Address of the CUCM server
+    :param timeout: (optional) Request timeout in seconds (default: 10)
+    :type session: requests.Session
+    :type server_ip: str
+    :type timeout: int
+    :returns: return the CUCM version string
+    :rtype: str
+    """
+    response = session.post("https://{0}:8443/axl/".format(server_ip),
+                            data=GET_CCM_VERSION_ENVELOPE.encode('utf-8'),
+                            headers={'Content-Type': 'text/xml; charset=utf-8',
+                                     'SOAPAction': 'CUCM:DB ver=1.0 getCCMVersion'},
+                            timeout=timeout)
+    if response.status_code in (401, 404):
+        raise Exception(http_setup_error("AXL", response))
+    try:
+        root = etree.fromstring(response.content)
+    except etree.XMLSyntaxError:
+        raise Exception("getCCMVersion failed: " + str(response.status_code) + " - " + response.reason)
+
+    fault = root.find('.//{http://schemas.xmlsoap.org/soap/envelope/}Fault')
+    if fault is not None:
+        raise Exception("getCCMVersion failed: " + (fault.findtext('faultstring') or str(response.status_code)))
+
+    version = root.findtext('.//componentVersion/version')
+    if not version:
+        raise Exception("getCCMVersion failed: version not found in response (HTTP " +
+                        str(response.status_code) + ")")
+    return version
+
+# AXL faults (ie: HTTP 599 unsupported AXL version) and response parsing errors (ie: elements unknown to the loaded
+# schema) meaning the AXL schema in use does not match the server's CUCM version
+SCHEMA_MISMATCH_PATTERN = re.compile(r'HTTP Status 599|version\b.{0,40}\bnot supported|unsupported version|'
+                                     r'unexpected element', re.IGNORECASE)
+
+
+def is_schema_mismatch(exception):
+    """
+    Returns True if a SOAP/transport exception means the AXL schema in use does not match the server's CUCM version
+    """
+    if isinstance(exception, XMLParseError):
+        return True
+    return bool(SCHEMA_MISMATCH_PATTERN.search(str(getattr(exception, 'detail', None) or exception)))
+
+
+def axl_schema_version(ccm_version):
+    """
+    Returns the major AXL schema version (ie: 15.0) from a full CUCM version string (ie: 15.0.1.11900-23)
+    """
+    return re.findall(r'^\d+\.\d+', ccm_version)[0]
+
+
+class CCMVersionRegistry:
+    """
+    The CCMVersionRegistry class
+    Small on-disk registry remembering the CUCM version of each host, so that restarted workers can build their AXL
+    client with the right schema right away instead of asking CUCM first.
+
+    The nodes of a cluster run the version of their publisher: once the nodes of a publisher are known (see
+    set_publisher), a node without a version of its own gets the publisher's one. Failed version requests are
+    remembered for failure_ttl seconds so that a host without AXL is not asked again on every client build.
+
+    :param path: (optional) JSON file holding the registry (default: /tmp/axltoolkit_ccm_versions.json)
+    :param ttl: (optional) Number of seconds a known version is trusted for (default: 86400)
+    :param failure_ttl: (optional) Number of seconds a failed version request is remembered for (default: 300)
+    :type path: str
+    :type ttl: int
+    :type failure_ttl: int
+    :returns: return a CCMVersionRegistry object
+    :rtype: CCMVersionRegistry
+    """
+
+    def __init__(self, path='/tmp/axltoolkit_ccm_versions.json', ttl=86400, failure_ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._publishers = {}   # node -> publisher
+        self._failures = {}     # host -> (time.monotonic() of the failure, error message)
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f'Ignoring unreadable CUCM version registry {self.path}: {e}')
+            return {}
+
+    def get(self, host):
+        """
+        Returns the known CUCM version of a host (or of its publisher), or None if unknown or older than the TTL
+        """
+        registry = self._read()
+        for known_host in (host, self._publishers.get(host)):
+            entry = registry.get(known_host) if known_host else None
+            if entry and time.time() - entry.get('updated', 0) < self.ttl:
+                return entry.get('version')
+        return None
+
+    def set_publisher(self, nodes, publisher):
+        """
+        Records the publisher of cluster nodes, whose version is returned for nodes without a version of their own
+        """
+        for node in nodes:
+            if node != publisher:
+                self._publishers[node] = publisher
+
+    def publisher(self, host):
+        """
+        Returns the publisher of a host if it is a known cluster node, None otherwise
+        """
+        return self._publishers.get(host)
+
+    def failed(self, host, error=None):
+        """
+        Records a failed version request of a host (with error), or returns the error of a failed version request
+        made less than failure_ttl seconds ago (None if there is none)
+        """
+        if error is not None:
+            self._failures[host] = (time.monotonic(), str(error))
+            return str(error)
+        failure = self._failures.get(host)
+        if failure is not None and time.monotonic() - failure[0] < self.failure_ttl:
+            return failure[1]
+        return None
+
+    def _write(self, registry):
+        try:
+            # Write to a temporary file and rename it, so other workers never read a partially written file
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(registry, f)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            log.warning(f'Cannot update CUCM version registry {self.path}: {e}')
+
+    def set(self, host, version):
+        """
+        Records the CUCM version of a host
+        """
+        with self._lock:
+            self._failures.pop(host, None)
+            registry = self._read()
+            registry[host] = {'version': version, 'updated': time.time()}
+            self._write(registry)
+
+    def invalidate(self, host):
+        """
+        Forgets the CUCM version of a host (ie: after an upgrade made the cached schema version wrong)
+        """
+        with self._lock:
+            registry = self._read()
+            if registry.pop(host, None) is not None:
+                self._write(registry)
+
+
+# Process-wide registry shared by all AXL instances
+ccm_version_registry = CCMVersionRegistry()
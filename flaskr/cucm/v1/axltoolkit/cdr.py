@@ -0,0 +1,472 @@
+"""
+
+CDR on Demand ingestion
+
+    - get_file_list lists the CDR / CMR flat files of a time window (at most one hour per request)
+    - get_file has CUCM push one file to an SFTP server, the files are read from the folder they land in (spool)
+    - Each file is parsed as it is read (csv module, one row at a time) and stored in SQLite with the file name, in
+      one transaction, so a file is never stored twice nor half stored
+    - The end of the last fully ingested window is the checkpoint the next poll starts from
+
+"""
+import calendar
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+log = logging.getLogger(__name__)
+
+# CDR on Demand time format (UTC)
+CDR_TIME_FORMAT = '%Y%m%d%H%M'
+
+# Longest time window of a get_file_list request, in seconds
+CDR_MAX_WINDOW = 3600
+
+# Stored CDR fields, out of the ~130 of a CDR file (name, SQLite type)
+CDR_COLUMNS = (
+    ('globalCallID_callManagerId', 'INTEGER'),
+    ('globalCallID_callId', 'INTEGER'),
+    ('origLegCallIdentifier', 'INTEGER'),
+    ('destLegIdentifier', 'INTEGER'),
+    ('dateTimeOrigination', 'INTEGER'),
+    ('dateTimeConnect', 'INTEGER'),
+    ('dateTimeDisconnect', 'INTEGER'),
+    ('duration', 'INTEGER'),
+    ('callingPartyNumber', 'TEXT'),
+    ('originalCalledPartyNumber', 'TEXT'),
+    ('finalCalledPartyNumber', 'TEXT'),
+    ('origDeviceName', 'TEXT'),
+    ('destDeviceName', 'TEXT'),
+    ('origCause_value', 'INTEGER'),
+    ('destCause_value', 'INTEGER')
+)
+
+# Stored CMR fields (name, SQLite type)
+CMR_COLUMNS = (
+    ('globalCallID_callManagerId', 'INTEGER'),
+    ('globalCallID_callId', 'INTEGER'),
+    ('callIdentifier', 'INTEGER'),
+    ('dateTimeStamp', 'INTEGER'),
+    ('directoryNum', 'TEXT'),
+    ('deviceName', 'TEXT'),
+    ('numberPacketsSent', 'INTEGER'),
+    ('numberPacketsReceived', 'INTEGER'),
+    ('numberPacketsLost', 'INTEGER'),
+    ('jitter', 'INTEGER'),
+    ('latency', 'INTEGER')
+)
+
+# Rows inserted per executemany batch
+CDR_INSERT_BATCH = 5000
+
+
+def cdr_time(timestamp):
+    """
+    Returns the CDR on Demand time (YYYYMMDDhhmm, UTC) of an epoch timestamp
+    """
+    return time.strftime(CDR_TIME_FORMAT, time.gmtime(timestamp))
+
+
+def cdr_timestamp(cdr_time_str):
+    """
+    Returns the epoch timestamp of a CDR on Demand time (YYYYMMDDhhmm, UTC)
+    """
+    return calendar.timegm(time.strptime(cdr_time_str, CDR_TIME_FORMAT))
+
+
+def cdr_file_rows(path, columns):
+    """
+    Generator yielding the columns of each record of a CDR / CMR flat file as a tuple, reading one row at a time.
+    The first line of the file names the fields, the second one holds their types.
+
+    :param path: The file path
+    :param columns: The (field name, SQLite type) of the fields to return
+    :type path: str
+    :type columns: tuple
+    :returns: return a generator of tuples
+    :rtype: Iterator[tuple]
+    """
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        next(reader, None)
+        positions = {name: index for index, name in enumerate(header)}
+        fields = [(positions.get(name), column_type == 'INTEGER') for name, column_type in columns]
+        for row in reader:
+            values = []
+            for index, integer in fields:
+                value = row[index] if index is not None and index < len(row) else ''
+                if integer:
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        value = None
+                values.append(value)
+            yield tuple(values)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CDRStore:
+    """
+    The CDRStore class
+    SQLite store of the CDR / CMR records, of the ingested files and of the ingestion checkpoint.
+    Only the fields of CDR_COLUMNS / CMR_COLUMNS are stored, as integers where possible, to keep millions of records
+    compact and quick to aggregate.
+
+    :param path: (optional) The SQLite database file (default: /tmp/cucm_cdr.db)
+    :type path: str
+    :returns: return a CDRStore object
+    :rtype: CDRStore
+    """
+
+    def __init__(self, path='/tmp/cucm_cdr.db'):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS cdr ({0})".format(
+                ', '.join(f'{name} {column_type}' for name, column_type in CDR_COLUMNS)))
+            connection.execute("CREATE TABLE IF NOT EXISTS cmr ({0})".format(
+                ', '.join(f'{name} {column_type}' for name, column_type in CMR_COLUMNS)))
+            connection.execute("CREATE INDEX IF NOT EXISTS cdr_origination ON cdr (dateTimeOrigination)")
+            connection.execute("CREATE INDEX IF NOT EXISTS cmr_timestamp ON cmr (dateTimeStamp)")
+            connection.execute("CREATE TABLE IF NOT EXISTS cdr_files "
+                               "(name TEXT PRIMARY KEY, records INTEGER, ingested INTEGER)")
+            connection.execute("CREATE TABLE IF NOT EXISTS cdr_checkpoint (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def _connection(self):
+        # One connection per thread, SQLite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def ingested(self, file_names):
+        """
+        Returns the names of the given files that are already stored
+        """
+        connection = self._connection()
+        ingested = set()
+        file_names = list(file_names)
+        for index in range(0, len(file_names), 500):
+            chunk = file_names[index:index + 500]
+            ingested.update(name for name, in connection.execute(
+                "SELECT name FROM cdr_files WHERE name IN ({0})".format(', '.join('?' * len(chunk))), chunk))
+        return ingested
+
+    def ingest_file(self, path, file_name):
+        """
+        Stores the records of a CDR (cdr_*) or CMR (cmr_*) flat file, unless the file is already stored
+
+        :param path: The file path
+        :param file_name: The CDR on Demand file name
+        :type path: str
+        :type file_name: str
+        :returns: return the number of records stored
+        :rtype: int
+        """
+        table, columns = ('cmr', CMR_COLUMNS) if file_name.startswith('cmr') else ('cdr', CDR_COLUMNS)
+        insert = "INSERT INTO {0} VALUES ({1})".format(table, ', '.join('?' * len(columns)))
+        records = 0
+        with self._connection() as connection:
+            if connection.execute("SELECT 1 FROM cdr_files WHERE name = ?", (file_name,)).fetchone():
+                return 0
+            for batch in _batches(cdr_file_rows(path, columns), CDR_INSERT_BATCH):
+                connection.executemany(insert, batch)
+                records += len(batch)
+            connection.execute("INSERT INTO cdr_files VALUES (?, ?, ?)", (file_name, records, int(time.time())))
+        return records
+
+    def checkpoint(self):
+        """
+        Returns the end (epoch seconds) of the last fully ingested time window, None before the first one
+        """
+        row = self._connection().execute("SELECT value FROM cdr_checkpoint WHERE name = 'window_end'").fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, window_end):
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO cdr_checkpoint VALUES ('window_end', ?)", (int(window_end),))
+
+    def summary(self, since=None, until=None, top=10):
+        """
+        Returns call aggregates of the calls originated between since and until (epoch seconds): call counts and
+        durations, calls per hour, top calling / called numbers, call termination causes and CMR voice quality
+
+        :param since: (optional) Calls originated at or after since (default: every call)
+        :param until: (optional) Calls originated before until (default: every call)
+        :param top: (optional) Number of top calling / called numbers (default: 10)
+        :type since: int
+        :type until: int
+        :type top: int
+        :returns: return the aggregates
+        :rtype: dict
+        """
+        connection = self._connection()
+        cdr_range = "dateTimeOrigination >= ? AND dateTimeOrigination < ?"
+        cmr_range = "dateTimeStamp >= ? AND dateTimeStamp < ?"
+        bounds = (since or 0, until or 2 ** 62)
+        calls, answered, total_duration, max_duration = connection.execute(
+            "SELECT COUNT(*), SUM(duration > 0), SUM(duration), MAX(duration) FROM cdr WHERE " + cdr_range,
+            bounds).fetchone()
+        cmr_count, jitter, latency, lost, received = connection.execute(
+            "SELECT COUNT(*), AVG(jitter), AVG(latency), SUM(numberPacketsLost), SUM(numberPacketsReceived) "
+            "FROM cmr WHERE " + cmr_range, bounds).fetchone()
+        packets = (lost or 0) + (received or 0)
+        return {
+            'calls': calls,
+            'answered': answered or 0,
+            'total_duration': total_duration or 0,
+            'average_duration': round(total_duration / answered, 1) if answered else None,
+            'max_duration': max_duration,
+            'calls_per_hour': [
+                {'hour': hour, 'calls': count, 'duration': duration or 0}
+                for hour, count, duration in connection.execute(
+                    "SELECT dateTimeOrigination / 3600 * 3600 AS hour, COUNT(*), SUM(duration) FROM cdr WHERE " +
+                    cdr_range + " GROUP BY hour ORDER BY hour", bounds)],
+            'top_calling': [
+                {'number': number, 'calls': count} for number, count in connection.execute(
+                    "SELECT callingPartyNumber, COUNT(*) AS calls FROM cdr WHERE " + cdr_range +
+                    " GROUP BY callingPartyNumber ORDER BY calls DESC LIMIT ?", bounds + (top,))],
+            'top_called': [
+                {'number': number, 'calls': count} for number, count in connection.execute(
+                    "SELECT finalCalledPartyNumber, COUNT(*) AS calls FROM cdr WHERE " + cdr_range +
+                    " GROUP BY finalCalledPartyNumber ORDER BY calls DESC LIMIT ?", bounds + (top,))],
+            'termination_causes': [
+                {'cause': cause, 'calls': count} for cause, count in connection.execute(
+                    "SELECT destCause_value, COUNT(*) AS calls FROM cdr WHERE " + cdr_range +
+                    " GROUP BY destCause_value ORDER BY calls DESC", bounds)],
+            'voice_quality': {
+                'cmr_records': cmr_count,
+                'average_jitter': round(jitter, 1) if jitter is not None else None,
+                'average_latency': round(latency, 1) if latency is not None else None,
+                'packet_loss_ratio': round((lost or 0) / packets, 5) if packets else None
+            }
+        }
+
+    def stats(self):
+        """
+        Returns the number of stored files and records and the checkpoint
+        """
+        connection = self._connection()
+        files, records = connection.execute("SELECT COUNT(*), SUM(records) FROM cdr_files").fetchone()
+        return {'path': self.path, 'files': files, 'records': records or 0, 'checkpoint': self.checkpoint()}
+
+
+class CDRIngestor:
+    """
+    The CDRIngestor class
+    Polls CDR on Demand one time window at a time from the store checkpoint, has the new files of each window pushed
+    to the SFTP server (workers files at a time), stores each file as soon as it is received and moves the
+    checkpoint past the window once all of its files are stored. A window with a failed file is retried at the
+    next poll, its stored files are not stored again.
+
+    :param store: The CDRStore
+    :param get_file_list: Callable returning the file names of a (from time, to time) window
+    :param get_file: Callable pushing a file of a (from time, to time) window to the SFTP server
+    :param spool_folder: The local folder the SFTP server stores pushed files in
+    :param window: (optional) Seconds per get_file_list window, at most CDR_MAX_WINDOW (default: 3600)
+    :param lag: (optional) Seconds a window must have ended for to be polled, so CUCM has written its files
+                (default: 120)
+    :param backfill: (optional) Seconds before now the first poll starts from (default: 86400)
+    :param interval: (optional) Seconds between two background polls (default: 300)
+    :param max_windows: (optional) Maximum number of windows ingested by a background poll (default: 24)
+    :param workers: (optional) Number of files pushed at the same time (default: 4)
+    :param file_wait: (optional) Seconds a pushed file may take to appear in the spool folder (default: 30)
+    :type store: CDRStore
+    :type get_file_list: Callable
+    :type get_file: Callable
+    :type spool_folder: str
+    :type window: int
+    :type lag: int
+    :type backfill: int
+    :type interval: float
+    :type max_windows: int
+    :type workers: int
+    :type file_wait: float
+    :returns: return a CDRIngestor object
+    :rtype: CDRIngestor
+    """
+
+    def __init__(self, store, get_file_list, get_file, spool_folder, window=CDR_MAX_WINDOW, lag=120, backfill=86400,
+                 interval=300, max_windows=24, workers=4, file_wait=30):
+        self.store = store
+        self.get_file_list = get_file_list
+        self.get_file = get_file
+        self.spool_folder = spool_folder
+        self.window = min(window, CDR_MAX_WINDOW)
+        self.lag = lag
+        self.backfill = backfill
+        self.interval = interval
+        self.max_windows = max_windows
+        self.file_wait = file_wait
+        self.polls = 0
+        self.files = 0
+        self.records = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_poll = None
+        self.last_result = None
+        self.progress = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cdr-files')
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, poll_now=False):
+        """
+        Starts the polling thread, which polls right away and then every interval seconds, unless it is running.
+        With poll_now, a running thread polls right away (once its current poll is over) instead of at the next
+        interval.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='cdr-ingestor', daemon=True)
+                self._thread.start()
+            elif poll_now:
+                self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll(max_windows=self.max_windows)
+            except Exception as e:
+                # Already counted by poll, retried at the next interval
+                log.warning(f'CDR poll failed: {e}')
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _fetch(self, from_time, to_time, file_name):
+        path = os.path.join(self.spool_folder, file_name)
+        # A file already in the spool folder may be the partial leftover of an interrupted push: request it again
+        if os.path.isfile(path):
+            os.remove(path)
+        self.get_file(from_time, to_time, file_name)
+        # The file is complete once get_file has returned and its size no longer changes
+        deadline = time.monotonic() + self.file_wait
+        size = None
+        while True:
+            current_size = os.path.getsize(path) if os.path.isfile(path) else None
+            if current_size is not None and current_size == size:
+                return path
+            if time.monotonic() >= deadline:
+                raise Exception(f"CDR file {file_name} was not received in {self.spool_folder}")
+            size = current_size
+            time.sleep(0.5)
+
+    def poll(self, max_windows=24):
+        """
+        Ingests the windows from the checkpoint up to lag seconds ago, at most max_windows of them
+
+        :param max_windows: (optional) Maximum number of windows ingested by this poll (default: 24)
+        :type max_windows: int
+        :returns: return the windows, files and records ingested, the failed files and the checkpoint
+        :rtype: dict
+        """
+        with self._poll_lock:
+            now = int(time.time())
+            window_start = self.store.checkpoint() or (now - self.backfill) // 60 * 60
+            result = {'windows': 0, 'files': 0, 'records': 0, 'failed': []}
+            self._set_progress(result, started=now, window=None, window_files=0)
+            try:
+                while result['windows'] < max_windows:
+                    window_end = min(window_start + self.window, (now - self.lag) // 60 * 60)
+                    if window_end <= window_start:
+                        break
+                    from_time, to_time = cdr_time(window_start), cdr_time(window_end)
+                    file_names = [file_name for file_name in self.get_file_list(from_time, to_time) or [] if file_name]
+                    ingested = self.store.ingested(file_names)
+                    futures = {self._executor.submit(self._fetch, from_time, to_time, file_name): file_name
+                               for file_name in file_names if file_name not in ingested}
+                    self._set_progress(result, window=[from_time, to_time], window_files=len(futures))
+                    for future in as_completed(futures):
+                        file_name = futures[future]
+                        try:
+                            path = future.result()
+                            result['records'] += self.store.ingest_file(path, file_name)
+                            os.remove(path)
+                        except Exception as e:
+                            result['failed'].append({'file': file_name, 'message': str(e)})
+                            continue
+                        result['files'] += 1
+                        self._set_progress(result)
+                    if result['failed']:
+                        # The checkpoint stays at the start of the window, retried at the next poll
+                        self.errors += 1
+                        self.last_error = f"{len(result['failed'])} CDR file(s) of {from_time}-{to_time} not ingested"
+                        break
+                    self.store.set_checkpoint(window_end)
+                    result['windows'] += 1
+                    window_start = window_end
+                if not result['failed']:
+                    # Caught up or max_windows reached without a failed file
+                    self.last_error = None
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                raise
+            finally:
+                self.polls += 1
+                self.files += result['files']
+                self.records += result['records']
+                self.last_poll = now
+                with self._lock:
+                    self.progress = None
+            result['checkpoint'] = self.store.checkpoint()
+            self.last_result = result
+            return result
+
+    def _set_progress(self, result, **progress):
+        # The progress of the poll running, read by stats
+        with self._lock:
+            self.progress = dict(self.progress or {}, **progress, windows=result['windows'], files=result['files'],
+                                 records=result['records'], failed=len(result['failed']))
+
+    def stats(self):
+        """
+        Returns the polling settings and counters and the store statistics
+        """
+        with self._lock:
+            progress = dict(self.progress) if self.progress is not None else None
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'polling': progress is not None,
+            'progress': progress,
+            'last_result': self.last_result,
+            'interval': self.interval,
+            'max_windows': self.max_windows,
+            'window': self.window,
+            'spool_folder': self.spool_folder,
+            'polls': self.polls,
+            'files': self.files,
+            'records': self.records,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_poll': self.last_poll,
+            'store': self.store.stats()
+        }
@@ -0,0 +1,291 @@
+"""
+
+Streaming readers of SOAP responses carrying a file attachment (ie: DimeGetFileService GetOneFile)
+
+    - Depending on the CUCM version, the attachment comes as a DIME message (application/dime) or as SOAP with
+      Attachments (multipart/related)
+    - Both are read from the HTTP response as it arrives and the file is handed over in chunks, so a trace file of
+      several GB never has to fit in memory
+    - The first payload is the SOAP envelope (read in full, it holds a Fault if the request failed), the file is
+      the next one
+
+"""
+import re
+import struct
+from lxml import etree
+
+# Bytes read from the HTTP response at a time
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# Largest SOAP envelope read before the attachment
+SOAP_ENVELOPE_MAX_SIZE = 1024 * 1024
+
+# DIME record header flags (VERSION:5 MB:1 ME:1 CF:1)
+DIME_VERSION = 1
+DIME_MESSAGE_END = 0x02
+DIME_CHUNKED = 0x01
+DIME_HEADER = struct.Struct('>BBHHHI')
+
+
+class ResumeOffsetError(Exception):
+    """
+    The attachment is shorter than the offset a download was resumed from (the file changed on the server)
+    """
+
+
+class ChunkReader:
+    """
+    The ChunkReader class
+    Reads exact amounts of bytes from an iterator of byte chunks (ie: requests.Response.iter_content)
+
+    :param chunks: The byte chunks
+    :type chunks: Iterator[bytes]
+    :returns: return a ChunkReader object
+    :rtype: ChunkReader
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def fill(self):
+        """
+        Appends the next chunk to the buffer. Returns False at the end of the chunks.
+        """
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        return False
+
+    def read(self, size):
+        """
+        Returns the next size bytes, fewer only at the end of the chunks
+        """
+        while len(self._buffer) < size and self.fill():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def peek(self, size):
+        """
+        Returns the next size bytes without consuming them
+        """
+        while len(self._buffer) < size and self.fill():
+            pass
+        return bytes(self._buffer[:size])
+
+    def unread(self, data):
+        """
+        Puts bytes back in front of the next ones
+        """
+        self._buffer[:0] = data
+
+    def iter_read(self, size, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """
+        Generator yielding the next size bytes in chunks of at most chunk_size bytes
+        """
+        while size > 0:
+            if not self._buffer and not self.fill():
+                raise Exception("Truncated attachment response")
+            data = bytes(self._buffer[:min(size, chunk_size)])
+            del self._buffer[:len(data)]
+            size -= len(data)
+            yield data
+
+    def iter_until(self, delimiter, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """
+        Generator yielding the bytes up to delimiter in chunks of at most chunk_size bytes, the delimiter is consumed
+        """
+        keep = len(delimiter) - 1
+        while True:
+            index = self._buffer.find(delimiter)
+            if index >= 0:
+                for start in range(0, index, chunk_size):
+                    yield bytes(self._buffer[start:min(index, start + chunk_size)])
+                del self._buffer[:index + len(delimiter)]
+                return
+            # The end of the buffer may be the start of the delimiter
+            while len(self._buffer) - keep >= chunk_size:
+                yield bytes(self._buffer[:chunk_size])
+                del self._buffer[:chunk_size]
+            if not self.fill():
+                raise Exception("Truncated multipart response")
+
+    def iter_all(self, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """
+        Generator yielding the remaining bytes in chunks
+        """
+        while self._buffer or self.fill():
+            data = bytes(self._buffer[:chunk_size])
+            del self._buffer[:len(data)]
+            yield data
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+def _dime_record_header(reader):
+    header = reader.read(DIME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < DIME_HEADER.size:
+        raise Exception("Truncated DIME record header")
+    flags, _, options_length, id_length, type_length, data_length = DIME_HEADER.unpack(header)
+    if flags >> 3 != DIME_VERSION:
+        raise Exception(f"Unsupported DIME version: {flags >> 3}")
+    reader.read(_padded(options_length) + _padded(id_length))
+    record_type = reader.read(_padded(type_length))[:type_length].decode('ascii', 'replace')
+    return flags, record_type, data_length
+
+
+def _dime_data(reader, flags, data_length, chunk_size, state):
+    # A chunked record (CF flag) is continued by the next record(s), up to the first record without the CF flag
+    while True:
+        yield from reader.iter_read(data_length, chunk_size)
+        reader.read(_padded(data_length) - data_length)
+        if not flags & DIME_CHUNKED:
+            break
+        header = _dime_record_header(reader)
+        if header is None:
+            raise Exception("Truncated DIME chunked record")
+        flags, _, data_length = header
+    state['flags'] = flags
+
+
+def dime_payloads(reader, chunk_size=ATTACHMENT_CHUNK_SIZE):
+    """
+    Generator yielding a (type, chunks) tuple for each payload of a DIME message, chunked records are joined.
+    The chunks of a payload must be read before moving to the next payload, unread chunks are skipped.
+
+    :param reader: The DIME message
+    :param chunk_size: (optional) Maximum chunk size in bytes (default: ATTACHMENT_CHUNK_SIZE)
+    :type reader: ChunkReader
+    :type chunk_size: int
+    :returns: return a generator of (payload type, byte chunks generator) tuples
+    :rtype: Iterator[tuple]
+    """
+    while True:
+        header = _dime_record_header(reader)
+        if header is None:
+            return
+        flags, record_type, data_length = header
+        state = {}
+        chunks = _dime_data(reader, flags, data_length, chunk_size, state)
+        yield record_type, chunks
+        for _ in chunks:
+            pass
+        if state.get('flags', DIME_MESSAGE_END) & DIME_MESSAGE_END:
+            return
+
+
+def mime_payloads(reader, boundary, chunk_size=ATTACHMENT_CHUNK_SIZE):
+    """
+    Generator yielding a (content type, chunks) tuple for each part of a multipart message.
+    The chunks of a part must be read before moving to the next part, unread chunks are skipped.
+
+    :param reader: The multipart message
+    :param boundary: The multipart boundary
+    :param chunk_size: (optional) Maximum chunk size in bytes (default: ATTACHMENT_CHUNK_SIZE)
+    :type reader: ChunkReader
+    :type boundary: str
+    :type chunk_size: int
+    :returns: return a generator of (content type, byte chunks generator) tuples
+    :rtype: Iterator[tuple]
+    """
+    delimiter = b'\r\n--' + boundary.encode('ascii')
+    # The first delimiter may start the message, without the CRLF of the following ones
+    reader.unread(b'\r\n')
+    for _ in reader.iter_until(delimiter, chunk_size):
+        pass
+    while True:
+        if reader.read(2) != b'\r\n':
+            # Close delimiter (--) or end of the message
+            return
+        if reader.peek(2) == b'\r\n':
+            # Part without headers
+            reader.read(2)
+            headers = b''
+        else:
+            headers = b''.join(reader.iter_until(b'\r\n\r\n', chunk_size))
+        content_type = ''
+        for line in headers.decode('latin-1').split('\r\n'):
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-type':
+                content_type = value.strip()
+        chunks = reader.iter_until(delimiter, chunk_size)
+        yield content_type, chunks
+        for _ in chunks:
+            pass
+
+
+def attachment_payloads(response, chunk_size=ATTACHMENT_CHUNK_SIZE):
+    """
+    Generator yielding a (type, chunks) tuple for each payload of a requests Response opened with stream=True:
+    the DIME payloads (application/dime), the multipart parts (multipart/related) or the whole body otherwise
+    """
+    content_type = response.headers.get('Content-Type', '')
+    reader = ChunkReader(response.iter_content(chunk_size))
+    if 'application/dime' in content_type.lower():
+        yield from dime_payloads(reader, chunk_size)
+    elif content_type.lower().startswith('multipart/'):
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type, re.IGNORECASE)
+        if boundary is None:
+            raise Exception(f"Multipart response without boundary: {content_type}")
+        yield from mime_payloads(reader, boundary.group(1), chunk_size)
+    else:
+        yield content_type, reader.iter_all(chunk_size)
+
+
+def soap_fault(envelope):
+    """
+    Returns the faultstring of a SOAP envelope holding a Fault, otherwise None
+    """
+    try:
+        root = etree.fromstring(envelope)
+    except etree.XMLSyntaxError:
+        return None
+    fault = root.find('.//{http://schemas.xmlsoap.org/soap/envelope/}Fault')
+    if fault is None:
+        return None
+    return fault.findtext('faultstring') or fault.findtext('{*}faultstring') or "SOAP Fault"
+
+
+def attachment_chunks(response, offset=0, chunk_size=ATTACHMENT_CHUNK_SIZE):
+    """
+    Generator yielding the file attached to a SOAP response in chunks, as it is received. Raises an Exception with
+    the faultstring if the SOAP envelope holds a Fault.
+
+    :param response: The requests Response, opened with stream=True
+    :param offset: (optional) Number of bytes of the file to skip, ie: already downloaded (default: 0)
+    :param chunk_size: (optional) Maximum chunk size in bytes (default: ATTACHMENT_CHUNK_SIZE)
+    :type response: requests.Response
+    :type offset: int
+    :type chunk_size: int
+    :returns: return a generator of byte chunks
+    :rtype: Iterator[bytes]
+    """
+    payloads = attachment_payloads(response, chunk_size)
+    envelope = bytearray()
+    for _, chunks in payloads:
+        for chunk in chunks:
+            envelope += chunk
+            if len(envelope) > SOAP_ENVELOPE_MAX_SIZE:
+                raise Exception(f"SOAP envelope larger than {SOAP_ENVELOPE_MAX_SIZE} bytes")
+        break
+    fault = soap_fault(bytes(envelope))
+    if fault:
+        raise Exception(fault)
+    response.raise_for_status()
+    attachment = next(payloads, None)
+    if attachment is None:
+        raise Exception("No file attached to the response")
+    size = 0
+    for chunk in attachment[1]:
+        if size + len(chunk) > offset:
+            yield chunk[max(0, offset - size):]
+        size += len(chunk)
+    if size < offset:
+        raise ResumeOffsetError(f"File of {size} bytes is shorter than the resume offset ({offset} bytes)")
@@ -0,0 +1,62 @@
+import threading
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from requests_file import FileAdapter
+
+# Keep-alive connections kept open per host, enough for the AXL client pool and the concurrent SXML / PAWS requests
+HTTP_POOL_MAXSIZE = 16
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(server_ip, username, password, tls_verify=True, pool_maxsize=HTTP_POOL_MAXSIZE):
+    """
+    Returns the process-wide authenticated requests Session of a server and account, creating it on first use.
+
+    Every toolkit (AXL, PAWS, SXML...) of the same server and account shares this Session, so they share:
+        - A pool of keep-alive HTTPS connections, instead of a new TLS handshake per toolkit setup
+        - The cookies set by the server, ie: JSESSIONIDSSO, so requests after the first one are authenticated by the
+          session cookie rather than by checking the Basic Authentication credentials again
+
+    :param server_ip: The Hostname / IP Address of the server
+    :param username: The username used for Basic HTTP Authentication
+    :param password: The password used for Basic HTTP Authentication
+    :param tls_verify: (optional) Certificate validation check for HTTPs connection (default: True)
+    :param pool_maxsize: (optional) Maximum number of keep-alive connections to the server (default: 16)
+    :type server_ip: str
+    :type username: str
+    :type password: str
+    :type tls_verify: bool
+    :type pool_maxsize: int
+    :returns: return the shared Session
+    :rtype: requests.Session
+    """
+    key = (server_ip, username, password, tls_verify)
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = Session()
+            session.auth = HTTPBasicAuth(username, password)
+            session.verify = tls_verify
+            # Requests to a single host: one connection pool holding up to pool_maxsize connections
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+            # zeep Transports mount a file:// adapter on their session: mounted beforehand, their mounts only replace
+            # it rather than reordering the adapters while other threads send requests
+            session.mount('file://', FileAdapter())
+            _http_sessions[key] = session
+        return session
+
+
+def http_setup_error(api_name, response):
+    """
+    Returns the message of an API setup failing with an HTTP error, ie: 'SXML Authentication error 401 - Unauthorized'
+    """
+    if response is None:
+        return f"{api_name} Connectivity Exception"
+    if response.status_code == 404:
+        return f"{api_name} Services Not Running: {response.status_code} - {response.reason}"
+    if response.status_code == 401:
+        return f"{api_name} Authentication error {response.status_code} - {response.reason}"
+    return f"{api_name} Connectivity Exception:{response.status_code} - {response.reason}"
@@ -0,0 +1,120 @@
+"""
+
+Log Collection helpers: selectLogFiles results and file downloads to disk
+
+    - Files are written to '<path>.part' as they are received and renamed to <path> once complete
+    - A download finding a '<path>.part' file resumes after its last byte, a download finding <path> with the
+      expected size skips the file
+    - The '<path>.part' file is locked (flock) while it is written, a download of a path already being downloaded
+      (by another thread or process) fails instead of writing the same file
+
+"""
+import fcntl
+import os
+import time
+from flaskr.cucm.v1.axltoolkit.dime import ResumeOffsetError
+
+
+def log_files(select_log_files_result):
+    """
+    Returns the files of a serialized selectLogFiles response as a list of dicts with name, absolutepath, filesize
+    (int) and modifiedDate, whichever node / service / system log list they are listed under
+    """
+    files = []
+    pending = [select_log_files_result]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, dict):
+            if 'absolutepath' in value:
+                file_info = dict(value)
+                try:
+                    file_info['filesize'] = int(file_info.get('filesize'))
+                except (TypeError, ValueError):
+                    file_info['filesize'] = None
+                files.append(file_info)
+            else:
+                pending.extend(value.values())
+        elif isinstance(value, list):
+            pending.extend(value)
+    return sorted(files, key=lambda file_info: file_info['absolutepath'])
+
+
+def log_file_path(folder, node, file_name):
+    """
+    Returns the local path of a node's file (folder/node/absolute path on the node). Raises an Exception if the
+    node or file name would lead outside of folder.
+    """
+    folder = os.path.realpath(folder)
+    path = os.path.realpath(os.path.join(folder, node, file_name.lstrip('/')))
+    if os.path.commonpath([folder, path]) != folder or not os.path.relpath(path, folder).startswith(node + os.sep):
+        raise Exception(f"Invalid log file name: {node}:{file_name}")
+    return path
+
+
+def log_download(get_file, file_name, path, size=None):
+    """
+    Downloads a file to disk in chunks (see UcmDimeGetFileToolkit.get_one_file), resuming a previous partial
+    download of the same path.
+
+    :param get_file: The function returning the file chunks, called with the file name and offset
+    :param file_name: The absolute path of the file on the server
+    :param path: The local path to write the file to
+    :param size: (optional) The expected file size (selectLogFiles filesize), a local file of that size is kept
+    :type get_file: function
+    :type file_name: str
+    :type path: str
+    :type size: int
+    :returns: return the local path, file size, number of bytes downloaded and whether the file was skipped.
+              Raises an Exception if the path is already being downloaded.
+    :rtype: dict
+    """
+    start = time.monotonic()
+    if _complete(path, size):
+        return {'path': path, 'size': size, 'downloaded': 0, 'skipped': True, 'seconds': 0.0}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = path + '.part'
+    with open(os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise Exception(f"File is already being downloaded: {path}")
+        if not _same_file(f, part_path):
+            # The download holding the lock before completed and renamed the file opened here
+            if _complete(path, size):
+                return {'path': path, 'size': size, 'downloaded': 0, 'skipped': True, 'seconds': 0.0}
+            raise Exception(f"File is already being downloaded: {path}")
+        if _complete(path, size):
+            # Completed by another download since the check above
+            os.remove(part_path)
+            return {'path': path, 'size': size, 'downloaded': 0, 'skipped': True, 'seconds': 0.0}
+        offset = os.fstat(f.fileno()).st_size
+        if size is not None and offset > size:
+            # The file changed on the server since the partial download
+            offset = 0
+        downloaded = 0
+        try:
+            f.seek(offset)
+            f.truncate()
+            for chunk in get_file(file_name, offset=offset):
+                f.write(chunk)
+                downloaded += len(chunk)
+            f.flush()
+        except ResumeOffsetError:
+            # Shorter than what was downloaded before: start over at the next download
+            os.remove(part_path)
+            raise
+        # Renamed while still locked, so no other download writes the file in between
+        os.replace(part_path, path)
+    return {'path': path, 'size': offset + downloaded, 'downloaded': downloaded, 'skipped': False,
+            'seconds': round(time.monotonic() - start, 3)}
+
+
+def _complete(path, size):
+    return size is not None and os.path.isfile(path) and os.path.getsize(path) == size
+
+
+def _same_file(f, path):
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,113 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class AXLObjectCache:
+    """
+    The AXLObjectCache class
+    Thread safe TTL + LRU cache of AXL objects (ie: getUser / getPhone / getLine results) keyed by
+    (object type, identifier), ie: ('user', 'jdoe') or ('line', ('1000', 'Internal_PT')).
+
+    Entries expire ttl seconds after they were stored and the least recently used entries are evicted beyond maxsize
+    entries. Callers get a copy of the cached object, so changing a returned object never changes the cache.
+
+    Writes must invalidate the objects they change. A read that started before an invalidation does not store its
+    (possibly outdated) result.
+
+    :param maxsize: (optional) Maximum number of cached objects (default: 1024)
+    :param ttl: (optional) Number of seconds an object is cached for, 0 disables the cache (default: 60)
+    :type maxsize: int
+    :type ttl: float
+    :returns: return an AXLObjectCache object
+    :rtype: AXLObjectCache
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self):
+        """
+        Returns the invalidation counter, to be passed to set() by a read that missed the cache
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """
+        Returns a (found, object copy) tuple
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires, value = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return True, copy.deepcopy(value)
+
+    def set(self, key, value, generation):
+        """
+        Stores a copy of an object read while the invalidation counter was generation, unless something has been
+        invalidated since
+        """
+        if not self.ttl:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, object_type=None, identifier=None):
+        """
+        Drops one object, every object of a type (identifier None) or everything (object_type None)
+        """
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if object_type is None:
+                self._entries.clear()
+            elif identifier is None:
+                for key in [key for key in self._entries if key[0] == object_type]:
+                    del self._entries[key]
+            else:
+                self._entries.pop((object_type, identifier), None)
+
+    def stats(self):
+        """
+        Returns the cache size and hit / miss / eviction / expiration / invalidation counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,421 @@
+import array
+import copy
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Counters sampled in the background for the counter history by default (see PerfMonCollector)
+PERFMON_HISTORY_COUNTERS = (
+    'Cisco CallManager\\RegisteredHardwarePhones',
+    'Cisco CallManager\\RegisteredOtherStationDevices',
+    'Cisco CallManager\\CallsActive',
+    'Cisco CallManager\\CallsCompleted'
+)
+
+
+def perfmon_has_percentage_counter(counters):
+    """
+    Returns True if any counter is a percentage counter (ie: Processor\\% CPU Time), whose value is computed between
+    two collects of the same session
+    """
+    return any(("%" in counter) or ("Percentage" in counter) for counter in counters)
+
+
+class PerfMonSession:
+    """
+    An open PerfMon session of a counter set, with its last sample
+    """
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.handle = None
+        self.sample = None
+        self.sampled = None
+        self.used = time.monotonic()
+        self.evicted = False
+        self.lock = threading.Lock()
+
+
+class PerfMonSessionPool:
+    """
+    The PerfMonSessionPool class
+    Keeps PerfMon sessions open, one per counter set, and reuses them across requests instead of opening a session,
+    adding the counters, collecting and closing the session on every request.
+
+        - Requests for the same counter set (in any order) share a session, collects closer than min_interval
+          seconds share the same sample
+        - Percentage counters are computed between two collects: once a session has been sampled, every collect
+          returns the values since the previous collect immediately. Only the first collect of a new session waits
+          percentage_interval seconds between two collects.
+        - A collect failing on a reused session (ie: the session expired or the PerfMon service restarted) reopens
+          the session and collects again
+        - Sessions unused for idle_timeout seconds, and the least recently used sessions beyond maxsize, are closed
+
+    :param open_session: Callable returning a new session handle
+    :param add_counter: Callable adding a list of counters to a session handle, returning True on success
+    :param collect_session_data: Callable returning the counter values of a session handle
+    :param close_session: Callable closing a session handle
+    :param maxsize: (optional) Maximum number of open sessions (default: 10)
+    :param idle_timeout: (optional) Seconds after which an unused session is closed (default: 600)
+    :param min_interval: (optional) Seconds during which a sample is shared rather than collected again (default: 1)
+    :param percentage_interval: (optional) Seconds between the first two collects of a new session with percentage
+                                counters (default: 5)
+    :type open_session: Callable
+    :type add_counter: Callable
+    :type collect_session_data: Callable
+    :type close_session: Callable
+    :type maxsize: int
+    :type idle_timeout: float
+    :type min_interval: float
+    :type percentage_interval: float
+    :returns: return a PerfMonSessionPool object
+    :rtype: PerfMonSessionPool
+    """
+
+    def __init__(self, open_session, add_counter, collect_session_data, close_session, maxsize=10, idle_timeout=600,
+                 min_interval=1.0, percentage_interval=5.0):
+        self.open_session = open_session
+        self.add_counter = add_counter
+        self.collect_session_data = collect_session_data
+        self.close_session = close_session
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.min_interval = min_interval
+        self.percentage_interval = percentage_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.expired = 0
+        self.collects = 0
+        self.shared = 0
+
+    def collect(self, counters):
+        """
+        Returns the values of a set of counters (the perfmonCollectSessionData result) from the pooled session of
+        the counter set
+
+        :param counters: The full counter names (ie: \\\\cucm-pub\\Cisco CallManager\\RegisteredHardwarePhones)
+        :type counters: list
+        :returns: return the counter values
+        :rtype: list
+        """
+        key = tuple(sorted(set(counters)))
+        session = self._checkout(key)
+        session.lock.acquire()
+        while session.evicted:
+            # Closed by another request between _checkout and here
+            session.lock.release()
+            session = self._checkout(key)
+            session.lock.acquire()
+        try:
+            session.used = time.monotonic()
+            if session.sample is not None and time.monotonic() - session.sampled < self.min_interval:
+                self.shared += 1
+                return copy.deepcopy(session.sample)
+            reused = session.handle is not None
+            try:
+                sample = self._collect(session)
+            except Exception:
+                if not reused:
+                    raise
+                # The session is gone on CUCM: open a new one
+                self.expired += 1
+                self._close(session)
+                sample = self._collect(session)
+            return copy.deepcopy(sample)
+        finally:
+            session.lock.release()
+
+    def _collect(self, session):
+        if session.handle is None:
+            session.handle = self.open_session()
+            session.sample = None
+            self.opened += 1
+            if not self.add_counter(session.handle, list(session.counters)):
+                self._close(session)
+                raise Exception(f"Failed to Query Counters: {list(session.counters)}")
+            if perfmon_has_percentage_counter(session.counters):
+                self.collect_session_data(session.handle)
+                self.collects += 1
+                time.sleep(self.percentage_interval)
+        sample = self.collect_session_data(session.handle)
+        self.collects += 1
+        session.sample = sample
+        session.sampled = time.monotonic()
+        return sample
+
+    def _close(self, session):
+        handle, session.handle = session.handle, None
+        if handle is None:
+            return
+        self.closed += 1
+        try:
+            self.close_session(handle)
+        except Exception:
+            # The session may already be gone on CUCM
+            pass
+
+    def _checkout(self, key):
+        """
+        Returns the pooled session of a counter set, creating it if needed, and closes the idle and least recently
+        used sessions that are not in use
+        """
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = PerfMonSession(key)
+            session.used = now
+            self._sessions.move_to_end(key)
+            excess = len(self._sessions) - self.maxsize
+            for other_key, other in list(self._sessions.items()):
+                if other is session:
+                    continue
+                if (excess > 0 or now - other.used > self.idle_timeout) and other.lock.acquire(blocking=False):
+                    del self._sessions[other_key]
+                    other.evicted = True
+                    stale.append(other)
+                    excess -= 1
+        for other in stale:
+            try:
+                self._close(other)
+            finally:
+                other.lock.release()
+        return session
+
+    def close_all(self):
+        """
+        Closes every pooled session
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            with session.lock:
+                session.evicted = True
+                self._close(session)
+
+    def stats(self):
+        """
+        Returns the open sessions and the open / close / expiry / collect counters
+        """
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'sessions': [{'counters': len(session.counters),
+                              'sample_age': round(now - session.sampled, 1) if session.sampled else None,
+                              'idle': round(now - session.used, 1)} for session in self._sessions.values()],
+                'maxsize': self.maxsize,
+                'opened': self.opened,
+                'closed': self.closed,
+                'expired': self.expired,
+                'collects': self.collects,
+                'shared': self.shared
+            }
+
+
+def perfmon_counter_name(counter_value):
+    """
+    Returns the name of a collected counter without its \\\\host\\ prefix, ie: Cisco CallManager\\CallsActive
+    """
+    name = counter_value.get('Name')
+    if isinstance(name, dict):
+        name = name.get('_value_1')
+    name = name or ''
+    if name.startswith('\\\\'):
+        name = name[2:].split('\\', 1)[-1]
+    return name
+
+
+class PerfMonRingBuffer:
+    """
+    The PerfMonRingBuffer class
+    Fixed-size time series of a counter: the last capacity (timestamp, value) samples, stored in two preallocated
+    arrays of doubles (16 bytes per sample). The oldest sample is overwritten once the buffer is full.
+
+    :param capacity: Number of samples kept
+    :type capacity: int
+    :returns: return a PerfMonRingBuffer object
+    :rtype: PerfMonRingBuffer
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array.array('d', bytes(8 * capacity))
+        self.values = array.array('d', bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, value):
+        with self._lock:
+            self.timestamps[self.head] = timestamp
+            self.values[self.head] = value
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def series(self, since=None):
+        """
+        Returns the (timestamps, values) lists of the samples taken at or after since (epoch seconds), oldest first
+        """
+        with self._lock:
+            start = (self.head - self.count) % self.capacity
+            if start + self.count <= self.capacity:
+                timestamps = self.timestamps[start:start + self.count]
+                values = self.values[start:start + self.count]
+            else:
+                timestamps = self.timestamps[start:] + self.timestamps[:self.head]
+                values = self.values[start:] + self.values[:self.head]
+        if since is not None:
+            # Samples are in time order: skip the older ones with a binary search
+            low, high = 0, len(timestamps)
+            while low < high:
+                middle = (low + high) // 2
+                if timestamps[middle] < since:
+                    low = middle + 1
+                else:
+                    high = middle
+            timestamps, values = timestamps[low:], values[low:]
+        return timestamps.tolist(), values.tolist()
+
+    def downsample(self, since=None, points=None):
+        """
+        Returns at most points (timestamp, value) samples taken at or after since: the samples are grouped into
+        points buckets of equal duration and each bucket is reduced to its mean timestamp and mean value
+        """
+        timestamps, values = self.series(since)
+        if not points or len(timestamps) <= points:
+            return list(zip(timestamps, values))
+        start = timestamps[0]
+        width = (timestamps[-1] - start) / points or 1.0
+        buckets = []
+        bucket = None
+        for timestamp, value in zip(timestamps, values):
+            index = min(int((timestamp - start) / width), points - 1)
+            if bucket is None or bucket[0] != index:
+                bucket = [index, 0.0, 0.0, 0]
+                buckets.append(bucket)
+            bucket[1] += timestamp
+            bucket[2] += value
+            bucket[3] += 1
+        return [(total_time / count, total_value / count) for index, total_time, total_value, count in buckets]
+
+
+class PerfMonCollector:
+    """
+    The PerfMonCollector class
+    Background thread sampling a fixed set of counters every interval seconds into one PerfMonRingBuffer per counter,
+    so that counter history can be charted without querying CUCM for every point.
+
+    :param collect: Callable returning the values of a list of counters (ie: SXML.perfmon_query_counters)
+    :param counters: The counters to sample (ie: Cisco CallManager\\CallsActive)
+    :param interval: (optional) Seconds between two samples, greater than 0 (default: 30)
+    :param capacity: (optional) Samples kept per counter (default: 2880, 24 hours every 30 seconds)
+    :type collect: Callable
+    :type counters: list
+    :type interval: float
+    :type capacity: int
+    :returns: return a PerfMonCollector object
+    :rtype: PerfMonCollector
+    """
+
+    def __init__(self, collect, counters, interval=30, capacity=2880):
+        # The sampling grid of _run never moves past now with an interval of 0 or less
+        if not (isinstance(interval, (int, float)) and math.isfinite(interval) and interval > 0):
+            raise Exception(f"Invalid PerfMon collector interval: {interval!r} (seconds, must be greater than 0)")
+        self.collect = collect
+        self.counters = list(counters)
+        self.interval = interval
+        self.buffers = {counter: PerfMonRingBuffer(capacity) for counter in self.counters}
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the sampling thread, unless it is running
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='perfmon-collector', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        next_sample = time.monotonic() + (self.interval if self.samples else 0)
+        while not self._stop.wait(max(0.0, next_sample - time.monotonic())):
+            self.sample()
+            next_sample += self.interval
+            # Keep a fixed sampling grid, skipping the samples missed by a slow collect
+            while next_sample <= time.monotonic():
+                next_sample += self.interval
+
+    def sample(self):
+        """
+        Collects the counters once and appends their valid values (CStatus 0 or 1) to their buffers
+        """
+        try:
+            counter_values = self.collect(self.counters)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return
+        timestamp = time.time()
+        for counter_value in counter_values or []:
+            buffer = self.buffers.get(perfmon_counter_name(counter_value))
+            if buffer is None or counter_value.get('CStatus') not in (0, 1):
+                continue
+            try:
+                value = float(counter_value.get('Value'))
+            except (TypeError, ValueError):
+                continue
+            if not math.isnan(value):
+                buffer.append(timestamp, value)
+        self.samples += 1
+        self.last_error = None
+
+    def history(self, counters=None, since=None, points=None):
+        """
+        Returns the downsampled history of counters (default: every sampled counter) as Chart.js datasets:
+        [{'label': counter, 'data': [{'x': epoch milliseconds, 'y': value}, ...]}, ...]
+
+        :param counters: (optional) The counters, each must be one of the sampled counters
+        :param since: (optional) Only samples taken at or after since (epoch seconds)
+        :param points: (optional) Maximum points per counter
+        :type counters: list
+        :type since: float
+        :type points: int
+        :returns: return the datasets
+        :rtype: list
+        """
+        counters = counters or self.counters
+        unknown = [counter for counter in counters if counter not in self.buffers]
+        if unknown:
+            raise Exception(f"Counters not sampled: {', '.join(unknown)}. Sampled counters: {', '.join(self.counters)}")
+        return [{'label': counter,
+                 'data': [{'x': int(timestamp * 1000), 'y': round(value, 3)}
+                          for timestamp, value in self.buffers[counter].downsample(since, points)]}
+                for counter in counters]
+
+    def stats(self):
+        """
+        Returns the sampled counters, interval, buffer usage and sample / error counters
+        """
+        return {
+            'counters': self.counters,
+            'interval': self.interval,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'samples': self.samples,
+            'buffered': {counter: buffer.count for counter, buffer in self.buffers.items()},
+            'errors': self.errors,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,117 @@
+import io
+from lxml import etree
+from zeep.xsd.types.builtins import String
+from zeep.xsd.types.collection import UnionType
+from zeep.xsd.types.simple import AnySimpleType
+
+SOAP_FAULT_TAG = '{http://schemas.xmlsoap.org/soap/envelope/}Fault'
+
+
+def text_converters(xsd_type):
+    """
+    Returns the {tag: callable} converters of the non-string simple elements and attributes of a zeep complex type
+    (ie: LPhone numberOfButtons, ctiid), so that element_to_dict returns the same python types as zeep.
+
+    :param xsd_type: The zeep type of the returned items (ie: client.get_type('ns0:LPhone'))
+    :type xsd_type: zeep.xsd.types.complex.ComplexType
+    :returns: return a dict of converters
+    :rtype: dict
+    """
+    converters = {}
+    for name, field in list(xsd_type.elements) + list(xsd_type.attributes):
+        field_type = field.type
+        if isinstance(field_type, UnionType):
+            field_type = field_type.item_class() if field_type.item_class else None
+        if isinstance(field_type, AnySimpleType) and not isinstance(field_type, (String, UnionType)) and \
+                type(field_type) is not AnySimpleType:
+            converters[name] = field_type.pythonvalue
+    return converters
+
+
+def element_to_dict(element, skip_empty=False, converters=None):
+    """
+    Converts an AXL response element (ie: a listPhone <phone>) straight to native python data, without going through
+    zeep objects. The result matches what serialize_object returns for the zeep object of the same element:
+        - Elements with child elements become dicts, repeated child tags become lists
+        - Attributes become keys (ie: uuid), the text of an element with attributes goes under '_value_1'
+          (ie: <devicePoolName uuid="{...}">Default</devicePoolName> -> {'_value_1': 'Default', 'uuid': '{...}'})
+        - Empty elements become None
+    Only tags present in the response are returned (zeep adds every schema element of the type, set to None).
+
+    :param element: The lxml element
+    :param skip_empty: (optional) Leave out empty elements (default: False)
+    :param converters: (optional) Converters of the element's own children and attributes (see text_converters)
+    :type element: lxml.etree._Element
+    :type skip_empty: bool
+    :type converters: dict
+    :returns: return the element as native python data
+    :rtype: dict or str
+    """
+    values = {}
+    repeated = set()
+    # Reversed document order visits every child before its parent, so no recursion is needed
+    for sub_element in reversed(list(element.iter(tag=etree.Element))):
+        if len(sub_element):
+            value = {}
+            for child in sub_element:
+                if not isinstance(child.tag, str):
+                    continue
+                child_value = values.pop(child)
+                if skip_empty and child_value is None:
+                    continue
+                tag = child.tag
+                if tag in value:
+                    if isinstance(value[tag], list) and tag in repeated:
+                        value[tag].append(child_value)
+                    else:
+                        value[tag] = [value[tag], child_value]
+                        repeated.add(tag)
+                else:
+                    value[tag] = child_value
+            repeated.clear()
+            if sub_element.attrib:
+                value.update(sub_element.attrib)
+        elif sub_element.attrib:
+            value = {'_value_1': sub_element.text}
+            value.update(sub_element.attrib)
+        else:
+            value = sub_element.text or None
+        values[sub_element] = value
+    value = values[element]
+    if converters and isinstance(value, dict):
+        for tag, converter in converters.items():
+            if isinstance(value.get(tag), str):
+                try:
+                    value[tag] = converter(value[tag])
+                except (TypeError, ValueError):
+                    value[tag] = None
+    return value
+
+
+def iter_list_response(content, item_name, skip_empty=False, converters=None):
+    """
+    Generator parsing a raw AXL list response (ie: listPhone) with lxml iterparse and yielding each returned item
+    (ie: each <phone>) as native python data (see element_to_dict). Items are discarded as soon as they have been
+    converted. Raises an Exception with the fault string on SOAP Faults.
+
+    :param content: The raw SOAP response body
+    :param item_name: The tag of the returned items (ie: phone, user)
+    :param skip_empty: (optional) Leave out empty elements (default: False)
+    :param converters: (optional) Converters of the items' children and attributes (see text_converters)
+    :type content: bytes
+    :type item_name: str
+    :type skip_empty: bool
+    :type converters: dict
+    :returns: return a generator of items
+    :rtype: Iterator[dict]
+    """
+    for event, element in etree.iterparse(io.BytesIO(content), events=('end',), huge_tree=True):
+        tag = element.tag
+        if tag == item_name and element.getparent() is not None and element.getparent().tag == 'return':
+            yield element_to_dict(element, skip_empty=skip_empty, converters=converters)
+            element.clear()
+            # Drop the items already read from the <return> element
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        elif tag == SOAP_FAULT_TAG:
+            raise Exception(element.findtext('faultstring') or 'AXL SOAP Fault')
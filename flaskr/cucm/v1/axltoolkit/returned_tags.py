@@ -0,0 +1,73 @@
+"""
+
+Named returnedTags profiles for the AXL list requests
+
+    - minimal: just enough to identify and show the items in a list
+    - standard: the settings commonly looked at when browsing
+    - full: every tag (the CUCMAxlToolkit list_phone / list_user defaults)
+    - custom: the returnedTags supplied by the caller
+
+"""
+
+RETURNED_TAGS_PROFILES = ['minimal', 'standard', 'full', 'custom']
+
+PHONE_RETURNED_TAGS_MINIMAL = ['name', 'description', 'model', 'product', 'protocol']
+
+PHONE_RETURNED_TAGS_STANDARD = PHONE_RETURNED_TAGS_MINIMAL + [
+    'class',
+    'devicePoolName',
+    'callingSearchSpaceName',
+    'locationName',
+    'securityProfileName',
+    'commonPhoneConfigName',
+    'phoneTemplateName',
+    'softkeyTemplateName',
+    'mediaResourceListName'
+]
+
+USER_RETURNED_TAGS_MINIMAL = ['userid', 'firstName', 'lastName', 'mailid']
+
+USER_RETURNED_TAGS_STANDARD = USER_RETURNED_TAGS_MINIMAL + [
+    'telephoneNumber',
+    'department',
+    'title',
+    'directoryUri',
+    'primaryExtension',
+    'homeCluster',
+    'imAndPresenceEnable',
+    'status',
+    'enableCti'
+]
+
+PHONE_RETURNED_TAGS = {'minimal': PHONE_RETURNED_TAGS_MINIMAL,
+                       'standard': PHONE_RETURNED_TAGS_STANDARD,
+                       'full': None}
+
+USER_RETURNED_TAGS = {'minimal': USER_RETURNED_TAGS_MINIMAL,
+                      'standard': USER_RETURNED_TAGS_STANDARD,
+                      'full': None}
+
+
+def resolve_returned_tags(profiles, profile, returned_tags=None):
+    """
+    Returns the returnedTags to request and the name of the profile they come from
+
+    Supplied returned_tags always win (custom profile). Otherwise the tags of the named profile are returned, None
+    for the full profile so that the toolkit requests every tag.
+
+    :param profiles: The profiles of the item type (PHONE_RETURNED_TAGS, USER_RETURNED_TAGS)
+    :param profile: The profile name (minimal, standard, full or custom)
+    :param returned_tags: (optional) The caller's own returnedTags
+    :type profiles: dict
+    :type profile: str
+    :type returned_tags: list or dict
+    :returns: return a (returned tags, profile name) tuple
+    :rtype: tuple
+    """
+    if returned_tags:
+        return returned_tags, 'custom'
+    if profile == 'custom':
+        raise Exception("returnedTags are required with the custom returnedTags profile")
+    if profile not in profiles:
+        raise Exception(f"Unknown returnedTags profile {profile}, valid profiles are: {', '.join(RETURNED_TAGS_PROFILES)}")
+    return profiles[profile], profile
@@ -0,0 +1,229 @@
+"""
+
+RisPort70 selectCmDevice helpers
+
+    - A selectCmDevice request returns at most 1000 devices, more SelectItems are split into 1000-item chunks
+    - Wildcard searches (ie: SEP*) may match more devices than one response holds, the rest is returned by repeating
+      the request with the StateInfo of the previous response
+    - Each response holds one CmNode per cluster node, the same device may be listed by several nodes (ie: registered
+      to one and unregistered from another), the per-node results are merged into one device name -> status index
+
+"""
+import bisect
+import fnmatch
+import time
+
+# Maximum devices (and SelectItems) of a single selectCmDevice request
+RIS_MAX_RETURNED_DEVICES = 1000
+
+# Registration status precedence when a device is listed by several nodes (highest wins)
+RIS_STATUS_RANK = {'Registered': 4, 'PartiallyRegistered': 3, 'Rejected': 2, 'UnRegistered': 1, 'Unknown': 0}
+
+
+def ris_select_items_chunks(select_items, chunk_size=RIS_MAX_RETURNED_DEVICES):
+    """
+    Splits the SelectItems (ie: device names, IP addresses, wildcards) into chunks of at most chunk_size items,
+    dropping blank and duplicate items. No SelectItems means every device ('*').
+
+    :param select_items: The SelectItems
+    :param chunk_size: (optional) Maximum items per chunk (default: RIS_MAX_RETURNED_DEVICES)
+    :type select_items: list
+    :type chunk_size: int
+    :returns: return a generator of item lists
+    :rtype: Iterator[list]
+    """
+    items = list(dict.fromkeys(item.strip() for item in select_items or [] if item and item.strip())) or ['*']
+    for index in range(0, len(items), chunk_size):
+        yield items[index:index + chunk_size]
+
+
+def ris_cm_devices(ris_result):
+    """
+    Generator yielding a (node name, device) tuple for each device of a serialized selectCmDevice response
+    """
+    cm_nodes = ((ris_result or {}).get('SelectCmDeviceResult') or {}).get('CmNodes') or {}
+    for cm_node in cm_nodes.get('item') or []:
+        if cm_node.get('ReturnCode') != 'Ok':
+            continue
+        for device in (cm_node.get('CmDevices') or {}).get('item') or []:
+            yield cm_node.get('Name'), device
+
+
+def ris_merge_device(index, node_name, device):
+    """
+    Adds a device listed by a node to a device name -> device index. When several nodes list the same device, the
+    record with the highest registration status (see RIS_STATUS_RANK) wins, then the most recent one (TimeStamp).
+    The winning record gets the name of the node that listed it under 'CmNode'.
+
+    :param index: The device name -> device dict to update
+    :param node_name: The name of the node that listed the device
+    :param device: The serialized CmDevice
+    :type index: dict
+    :type node_name: str
+    :type device: dict
+    :returns: return True if the device record was added or replaced
+    :rtype: bool
+    """
+    name = device.get('Name')
+    current = index.get(name)
+    if current is not None:
+        rank = RIS_STATUS_RANK.get(device.get('Status'), 0)
+        current_rank = RIS_STATUS_RANK.get(current.get('Status'), 0)
+        if rank < current_rank or (rank == current_rank and
+                                   (device.get('TimeStamp') or 0) <= (current.get('TimeStamp') or 0)):
+            return False
+    index[name] = dict(device, CmNode=node_name)
+    return True
+
+
+def ris_select_cm_device_result(devices, state_info=''):
+    """
+    Rebuilds a selectCmDevice response (SelectCmDeviceResult / CmNodes / CmDevices) holding the merged devices, so
+    that callers of a single selectCmDevice request read the merged result the same way
+
+    :param devices: The merged devices (see ris_merge_device)
+    :param state_info: (optional) The StateInfo of the last response
+    :type devices: Iterable[dict]
+    :type state_info: str
+    :returns: return the selectCmDevice response
+    :rtype: dict
+    """
+    cm_nodes = {}
+    for device in devices:
+        device = dict(device)
+        cm_nodes.setdefault(device.pop('CmNode'), []).append(device)
+    return {
+        'SelectCmDeviceResult': {
+            'TotalDevicesFound': sum(len(node_devices) for node_devices in cm_nodes.values()),
+            'CmNodes': {
+                'item': [{'ReturnCode': 'Ok', 'Name': node_name, 'NoChange': False,
+                          'CmDevices': {'item': node_devices}} for node_name, node_devices in cm_nodes.items()]
+            }
+        },
+        'StateInfo': state_info
+    }
+
+
+def ris_device_ips(device):
+    """
+    Returns the IP addresses of a serialized CmDevice
+    """
+    ip_addresses = (device.get('IPAddress') or {}).get('item') or []
+    return [ip_address.get('IP') for ip_address in ip_addresses if ip_address.get('IP')]
+
+
+class RisDeviceIndex:
+    """
+    The RisDeviceIndex class
+    Read-only registration snapshot of a cluster: the devices listed by each node, merged into one device name ->
+    device index (see ris_merge_device), indexed by name (exact / prefix / wildcard), IP address, status and model.
+
+    Indexes are built once and never changed, a refresh builds a new RisDeviceIndex, so lookups need no lock.
+
+    :param nodes: The node name -> list of devices listed by the node
+    :param state_info: (optional) The StateInfo of the selectCmDevice response the snapshot was built from
+    :param complete: (optional) True if a single selectCmDevice response held every device, which allows delta
+                     refreshes with StateInfo (default: False)
+    :param updated: (optional) time.monotonic() of the end of the refresh the snapshot was built by (default: now)
+    :param requests: (optional) Number of selectCmDevice requests the refresh took (default: 0)
+    :type nodes: dict
+    :type state_info: str
+    :type complete: bool
+    :type updated: float
+    :type requests: int
+    :returns: return a RisDeviceIndex object
+    :rtype: RisDeviceIndex
+    """
+
+    def __init__(self, nodes, state_info='', complete=False, updated=None, requests=0):
+        self.nodes = nodes
+        self.state_info = state_info
+        self.complete = complete
+        self.updated = time.monotonic() if updated is None else updated
+        self.requests = requests
+        self.devices = {}
+        for node_name, node_devices in nodes.items():
+            for device in node_devices:
+                ris_merge_device(self.devices, node_name, device)
+        self._names = {}
+        self._by_ip = {}
+        self._by_status = {}
+        self._by_model = {}
+        for name, device in self.devices.items():
+            self._names[name.upper()] = name
+            for ip_address in ris_device_ips(device):
+                self._by_ip.setdefault(ip_address, []).append(name)
+            self._by_status.setdefault(device.get('Status'), []).append(name)
+            self._by_model.setdefault(str(device.get('Model')), []).append(name)
+        self._sorted_names = sorted(self._names)
+
+    def age(self):
+        """
+        Returns the number of seconds since the snapshot was taken
+        """
+        return time.monotonic() - self.updated
+
+    def match_names(self, pattern):
+        """
+        Returns the names of the devices matching a RisPort70 style name pattern (case insensitive): exact name,
+        prefix (ie: SEP0011*) or * wildcards anywhere (ie: *1234)
+        """
+        pattern = pattern.strip().upper()
+        if '*' not in pattern:
+            return [self._names[pattern]] if pattern in self._names else []
+        prefix = pattern.split('*', 1)[0]
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        end = bisect.bisect_left(self._sorted_names, prefix + '\uffff') if prefix else len(self._sorted_names)
+        names = self._sorted_names[start:end]
+        if pattern != prefix + '*':
+            names = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+        return [self._names[name] for name in names]
+
+    def search(self, names=None, ip_addresses=None, status=None, model=None):
+        """
+        Returns the devices matching every given criteria, in name order
+
+        :param names: (optional) Name patterns (see match_names), a device matching any of them is returned
+        :param ip_addresses: (optional) IP addresses, a device with any of them is returned
+        :param status: (optional) Registration status (ie: Registered), Any or None for every status
+        :param model: (optional) Model number (ie: 36670 for a Cisco 8865)
+        :type names: list
+        :type ip_addresses: list
+        :type status: str
+        :type model: int
+        :returns: return a list of devices
+        :rtype: list
+        """
+        candidates = None
+        if names is not None:
+            candidates = {name for pattern in names for name in self.match_names(pattern)}
+        if ip_addresses is not None:
+            matches = {name for ip_address in ip_addresses for name in self._by_ip.get(ip_address.strip(), [])}
+            candidates = matches if candidates is None else candidates & matches
+        # Narrowed candidates are checked one by one rather than intersected with the (large) status / model lists
+        if status and status != 'Any':
+            if candidates is None:
+                candidates = set(self._by_status.get(status, []))
+            else:
+                candidates = {name for name in candidates if self.devices[name].get('Status') == status}
+        if model is not None:
+            if candidates is None:
+                candidates = set(self._by_model.get(str(model), []))
+            else:
+                candidates = {name for name in candidates if str(self.devices[name].get('Model')) == str(model)}
+        if candidates is None:
+            candidates = self.devices
+        return [self.devices[name] for name in sorted(candidates)]
+
+    def stats(self):
+        """
+        Returns the snapshot age, size, registration status counts and number of requests it took
+        """
+        return {
+            'age': round(self.age(), 1),
+            'devices': len(self.devices),
+            'nodes': {node_name: len(node_devices) for node_name, node_devices in self.nodes.items()},
+            'status': {status: len(names) for status, names in self._by_status.items()},
+            'complete': self.complete,
+            'requests': self.requests
+        }
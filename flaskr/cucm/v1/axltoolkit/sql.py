@@ -0,0 +1,193 @@
+import io
+import re
+from lxml import etree
+
+SOAP_FAULT_TAG = '{http://schemas.xmlsoap.org/soap/envelope/}Fault'
+
+_SELECT_RE = re.compile(r'^\s*SELECT\s+', re.IGNORECASE)
+_SKIP_FIRST_RE = re.compile(r'^\s*SELECT\s+(SKIP\s+\d+\s+)?(FIRST|LIMIT)\s+\d+', re.IGNORECASE)
+
+
+def sql_cdata(query):
+    """
+    Wraps a Thin AXL SQL statement in a CDATA section if it contains <, > (or their escaped forms)
+    """
+    if any(re.findall(r'<|>|&lt;|&gt;', query)):
+        if not re.search(r'^<!\[CDATA\[', query):
+            query = f"<![CDATA[{query}]]>"
+    return query
+
+
+def sql_chunk(query, skip, first):
+    """
+    Returns the SELECT statement limited to one chunk of rows, using the Informix SKIP n FIRST m projection clause
+
+    ie: sql_chunk('SELECT name FROM device ORDER BY name', 1000, 500)
+        -> 'SELECT SKIP 1000 FIRST 500 name FROM device ORDER BY name'
+
+    :param query: The SELECT statement. It should have an ORDER BY on a unique column (ie: pkid) so chunks neither
+                  overlap nor miss rows
+    :param skip: Number of rows to skip
+    :param first: Maximum number of rows to return
+    :type query: str
+    :type skip: int
+    :type first: int
+    :returns: return the chunked SELECT statement
+    :rtype: str
+    """
+    if not _SELECT_RE.match(query):
+        raise Exception("Only SELECT statements can be chunked: " + query)
+    if _SKIP_FIRST_RE.match(query):
+        raise Exception("SELECT statement already has a SKIP/FIRST clause: " + query)
+    return _SELECT_RE.sub(f'SELECT SKIP {int(skip)} FIRST {int(first)} ', query, count=1)
+
+
+def parse_sql_query_response(content):
+    """
+    Parses a raw executeSQLQuery SOAP response without building zeep objects.
+
+    The response is read with lxml iterparse and every <row> element is discarded as soon as its values have been
+    copied, so memory use is bound by the returned values rather than by the XML tree.
+
+    :param content: The raw SOAP response body
+    :type content: bytes
+    :returns: return a (column names, rows) tuple, each row being a list of column values (str or None) in column
+              order. Column names are empty if no row was returned.
+    :rtype: tuple
+    """
+    columns = []
+    rows = []
+    for event, element in etree.iterparse(io.BytesIO(content), events=('end',), huge_tree=True):
+        tag = element.tag
+        if tag == 'row':
+            if not columns:
+                columns = [column.tag for column in element]
+            rows.append([column.text for column in element])
+            element.clear()
+            # Drop the rows already read from the <return> element
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        elif tag == SOAP_FAULT_TAG:
+            raise Exception(element.findtext('faultstring') or 'executeSQLQuery SOAP Fault')
+    return columns, rows
+
+
+"""
+
+Batched (coalesced) Thin AXL updates
+
+"""
+
+# Conservative size limit of a single coalesced executeSQLUpdate statement
+SQL_MAX_STATEMENT_LENGTH = 16000
+
+
+def sql_quote(value):
+    """
+    Returns value as an Informix string literal, ie: O'Neil -> 'O''Neil'
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_coalesce(items, build, weight, max_length=SQL_MAX_STATEMENT_LENGTH):
+    """
+    Splits items into chunks whose coalesced statement stays within max_length characters.
+
+    :param items: The items (ie: userids) to coalesce
+    :param build: Callable building the statement of a list of items
+    :param weight: Callable returning the number of characters an item adds to the statement
+    :param max_length: (optional) Maximum statement length (default: SQL_MAX_STATEMENT_LENGTH)
+    :type items: list
+    :type build: Callable
+    :type weight: Callable
+    :type max_length: int
+    :returns: return a generator of item lists
+    :rtype: Iterator[list]
+    """
+    base = len(build([]))
+    chunk = []
+    length = base
+    for item in items:
+        item_length = weight(item)
+        if chunk and length + item_length > max_length:
+            yield chunk
+            chunk = []
+            length = base
+        chunk.append(item)
+        length += item_length
+    if chunk:
+        yield chunk
+
+
+def sql_in_list(values):
+    return ', '.join(sql_quote(value) for value in values)
+
+
+def sql_in_list_weight(value):
+    return len(sql_quote(value)) + 2
+
+
+def sql_insert_users_to_group(userids, group_name):
+    """
+    Single INSERT ... SELECT statement adding all userids to a User Group (enduserdirgroupmap)
+    """
+    return "insert into enduserdirgroupmap (fkenduser, fkdirgroup) " \
+           "select e.pkid, g.pkid from enduser e, dirgroup g " \
+           "where g.name = {0} and e.userid in ({1})".format(sql_quote(group_name), sql_in_list(userids))
+
+
+def sql_select_users_in_group(userids, group_name):
+    return "select e.userid from enduser e, enduserdirgroupmap m, dirgroup g " \
+           "where m.fkenduser = e.pkid and m.fkdirgroup = g.pkid " \
+           "and g.name = {0} and e.userid in ({1})".format(sql_quote(group_name), sql_in_list(userids))
+
+
+def sql_device_user_pairs(associations):
+    return ' or '.join(sql_device_user_pair(association) for association in associations) or '1=0'
+
+
+def sql_device_user_pair(association):
+    device, userid = association
+    return "(d.name = {0} and e.userid = {1})".format(sql_quote(device), sql_quote(userid))
+
+
+def sql_device_user_pair_weight(association):
+    return len(sql_device_user_pair(association)) + 4
+
+
+def sql_insert_devices_to_users(associations, association_type='1'):
+    """
+    Single INSERT ... SELECT statement associating every (device, userid) pair (enduserdevicemap)
+    """
+    return "insert into enduserdevicemap (fkenduser, fkdevice, defaultprofile, tkuserassociation) " \
+           "select e.pkid, d.pkid, 'f', {0} from enduser e, device d " \
+           "where {1}".format(sql_quote(association_type), sql_device_user_pairs(associations))
+
+
+def sql_select_devices_of_users(associations):
+    return "select d.name, e.userid from enduser e, device d, enduserdevicemap m " \
+           "where m.fkenduser = e.pkid and m.fkdevice = d.pkid " \
+           "and ({0})".format(sql_device_user_pairs(associations))
+
+
+def sql_service_parameter_case(parameter):
+    name, value = parameter
+    return "when {0} then {1}".format(sql_quote(name), sql_quote(value))
+
+
+def sql_service_parameter_weight(parameter):
+    return len(sql_service_parameter_case(parameter)) + sql_in_list_weight(parameter[0]) + 1
+
+
+def sql_update_service_parameters(parameters):
+    """
+    Single UPDATE statement setting several service parameters (processconfig) with a CASE expression
+    """
+    cases = ' '.join(sql_service_parameter_case(parameter) for parameter in parameters)
+    return "update processconfig set paramvalue = case paramname {0} end " \
+           "where paramname in ({1})".format(cases, sql_in_list(name for name, value in parameters))
+
+
+def sql_select_service_parameters(parameters):
+    return "select paramname, paramvalue from processconfig " \
+           "where paramname in ({0})".format(sql_in_list(name for name, value in parameters))
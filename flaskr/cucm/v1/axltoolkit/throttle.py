@@ -0,0 +1,327 @@
+import collections
+import functools
+import threading
+import time
+import requests
+
+
+def is_throttled(exception):
+    """
+    Returns True if a SOAP/transport exception means CUCM throttled the request (HTTP Status 503)
+    """
+    if getattr(exception, 'status_code', None) == 503:
+        return True
+    return "HTTP Status 503" in str(getattr(exception, 'detail', None) or exception)
+
+
+def is_timeout(exception):
+    """
+    Returns True if a SOAP/transport exception means the request timed out
+    """
+    return isinstance(exception, (requests.exceptions.Timeout, TimeoutError))
+
+
+class AXLThrottle:
+    """
+    The AXLThrottle class
+    Adaptive (AIMD) rate and concurrency limiter shared by every AXL request sent to one CUCM publisher.
+
+    CUCM answers HTTP 503 when its AXL throttle kicks in. Rather than every thread hammering CUCM until it gets a 503
+    and backing off on its own, all requests go through one token bucket with a concurrency limit:
+        - Each successful request raises the request rate and the concurrency limit, quickly until CUCM pushes back
+          for the first time (slow start), additively afterwards
+        - A 503 or a timeout halves both (at most once per round trip) and pauses all callers for cooldown seconds
+        - Latencies well above the usual latency of their operation (CUCM queueing requests) stop the increase
+    Callers that exceed the current rate or concurrency limit wait in line instead of being sent to CUCM.
+
+    The usual latency (baseline) is tracked per operation, since a listPhone legitimately takes much longer than a
+    getPhone. It follows drops right away and rises slowly (by baseline_decay of the difference per request), so a
+    lasting change of the server's speed moves the baseline instead of being taken for congestion forever.
+
+    :param rate: (optional) Initial request rate in requests per second (default: 5)
+    :param min_rate: (optional) Lowest request rate (default: 0.5)
+    :param max_rate: (optional) Highest request rate (default: 50)
+    :param concurrency: (optional) Initial number of requests in flight (default: 4)
+    :param max_concurrency: (optional) Highest number of requests in flight (default: 16)
+    :param cooldown: (optional) Seconds every caller is paused after a 503 (default: 1)
+    :param latency_factor: (optional) Latency, as a multiple of the operation's baseline, considered as congestion
+                           (default: 4)
+    :param baseline_decay: (optional) Share of the difference a latency above the baseline raises it by
+                           (default: 0.05)
+    :type rate: float
+    :type min_rate: float
+    :type max_rate: float
+    :type concurrency: int
+    :type max_concurrency: int
+    :type cooldown: float
+    :type latency_factor: float
+    :type baseline_decay: float
+    :returns: return an AXLThrottle object
+    :rtype: AXLThrottle
+    """
+
+    def __init__(self, rate=5.0, min_rate=0.5, max_rate=50.0, concurrency=4, max_concurrency=16, cooldown=1.0,
+                 latency_factor=4.0, baseline_decay=0.05):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.concurrency = float(concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.cooldown = cooldown
+        self.latency_factor = latency_factor
+        self.baseline_decay = baseline_decay
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.latency = None
+        self.baselines = {}  # operation name -> baseline latency
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._slow_start = True
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        # Bucket depth of one second worth of requests allows short bursts without exceeding the rate on average
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, timeout=None):
+        """
+        Wait until a request may be sent. Raises an Exception if it could not be sent within timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self._paused_until and self.in_flight < int(self.concurrency) and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    if now < self._paused_until:
+                        wait = self._paused_until - now
+                    elif self.tokens < 1:
+                        wait = (1 - self.tokens) / self.rate
+                    else:
+                        # Concurrency bound: release() notifies us
+                        wait = None
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise Exception(f"AXL request not sent: throttle queue wait exceeded {timeout} seconds")
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency, throttled=False, timed_out=False, operation=None):
+        """
+        Report the outcome of a request sent after acquire() and adapt the rate and concurrency limits
+
+        :param latency: The request duration in seconds
+        :param throttled: (optional) True if CUCM throttled the request (default: False)
+        :param timed_out: (optional) True if the request timed out (default: False)
+        :param operation: (optional) The SOAP operation name, whose latency baseline is used (default: None)
+        :type latency: float
+        :type throttled: bool
+        :type timed_out: bool
+        :type operation: str
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.requests += 1
+            if throttled or timed_out:
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.timeouts += 1
+                # Several in-flight requests fail together on a 503, only back off once per round trip
+                if now - self._last_decrease > (self.latency or self.cooldown):
+                    self._decrease(0.5, now)
+                    self._paused_until = now + self.cooldown
+            else:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                baseline = self.baselines.get(operation)
+                if baseline is None or latency <= baseline:
+                    self.baselines[operation] = latency
+                else:
+                    self.baselines[operation] = baseline + self.baseline_decay * (latency - baseline)
+                # Latencies well above the baseline (CUCM queueing requests) hold the limits until it catches up
+                if baseline is not None and latency > self.latency_factor * baseline:
+                    pass
+                elif self._slow_start:
+                    # Until CUCM pushes back for the first time, grow by half a request per success (~1.5x per second)
+                    self.rate = min(self.max_rate, self.rate + 0.5)
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 0.5 / self.concurrency)
+                else:
+                    self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self._cond.notify_all()
+
+    def _decrease(self, factor, now):
+        self._slow_start = False
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.concurrency = max(1.0, self.concurrency * factor)
+        self._last_decrease = now
+
+    def stats(self):
+        """
+        Returns the current limits, queue depth and counters
+        """
+        with self._cond:
+            return {
+                'rate': round(self.rate, 2),
+                'concurrency': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'latency': round(self.latency, 3) if self.latency is not None else None,
+                'baselines': {str(operation): round(baseline, 3) for operation, baseline in self.baselines.items()},
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'timeouts': self.timeouts
+            }
+
+
+class ThrottledService:
+    """
+    The ThrottledService class
+    Wraps a zeep ServiceProxy so that every SOAP operation goes through an AXLThrottle
+
+    :param service: The zeep ServiceProxy
+    :param throttle: The AXLThrottle shared by all clients of the same server
+    :param timeout: (optional) Maximum seconds a request waits in the throttle queue (default: None, no limit)
+    :type service: zeep.proxy.ServiceProxy
+    :type throttle: AXLThrottle
+    :type timeout: int
+    :returns: return a ThrottledService object
+    :rtype: ThrottledService
+    """
+
+    def __init__(self, service, throttle, timeout=None):
+        self._service = service
+        self._throttle = throttle
+        self._timeout = timeout
+
+    def __getattr__(self, key):
+        operation = getattr(self._service, key)
+        if key.startswith('_') or not callable(operation):
+            return operation
+        return self._wrap(operation, key)
+
+    def __getitem__(self, key):
+        return self._wrap(self._service[key], key)
+
+    def _wrap(self, operation, name):
+        @functools.wraps(operation)
+        def throttled_operation(*args, **kwargs):
+            self._throttle.acquire(timeout=self._timeout)
+            start = time.monotonic()
+            try:
+                result = operation(*args, **kwargs)
+            except Exception as e:
+                self._throttle.release(time.monotonic() - start, throttled=is_throttled(e), timed_out=is_timeout(e),
+                                       operation=name)
+                raise
+            # Raw responses (client.settings(raw_response=True)) are returned as-is, even HTTP 503 ones
+            self._throttle.release(time.monotonic() - start, throttled=getattr(result, 'status_code', None) == 503,
+                                   operation=name)
+            return result
+        return throttled_operation
+
+
+_axl_throttles = {}
+_axl_throttles_lock = threading.Lock()
+
+
+def get_axl_throttle(server_ip):
+    """
+    Returns the process-wide AXLThrottle for a server, creating it on first use
+    """
+    with _axl_throttles_lock:
+        throttle = _axl_throttles.get(server_ip)
+        if throttle is None:
+            throttle = _axl_throttles[server_ip] = AXLThrottle()
+        return throttle
+
+
+class RequestQuota:
+    """
+    The RequestQuota class
+    Sliding window request quota (ie: RisPort70 accepts 15 requests per minute per server, more requests are answered
+    with a fault). Callers beyond the quota wait until the oldest request of the window leaves it.
+
+    :param requests: (optional) Number of requests allowed per period (default: 15)
+    :param period: (optional) Period in seconds (default: 60)
+    :type requests: int
+    :type period: float
+    :returns: return a RequestQuota object
+    :rtype: RequestQuota
+    """
+
+    def __init__(self, requests=15, period=60.0):
+        self.requests = requests
+        self.period = period
+        self.sent = 0
+        self.waiting = 0
+        self._window = collections.deque()
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Wait until a request may be sent. Raises an Exception if it could not be sent within timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    while self._window and now - self._window[0] >= self.period:
+                        self._window.popleft()
+                    if len(self._window) < self.requests:
+                        self._window.append(now)
+                        self.sent += 1
+                        return
+                    wait = self.period - (now - self._window[0])
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise Exception(f"Request not sent: quota of {self.requests} requests per {self.period} "
+                                            f"seconds still exhausted after {timeout} seconds")
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+
+    def stats(self):
+        """
+        Returns the quota, the number of requests in the current window and the number of waiting callers
+        """
+        with self._cond:
+            now = time.monotonic()
+            return {
+                'requests': self.requests,
+                'period': self.period,
+                'in_window': sum(1 for sent in self._window if now - sent < self.period),
+                'queue_depth': self.waiting,
+                'sent': self.sent
+            }
+
+
+_request_quotas = {}
+
+
+def get_request_quota(server_ip, service, requests=15, period=60.0):
+    """
+    Returns the process-wide RequestQuota of a server's service (ie: realtimeservice2), creating it on first use
+    """
+    with _axl_throttles_lock:
+        quota = _request_quotas.get((server_ip, service))
+        if quota is None:
+            quota = _request_quotas[(server_ip, service)] = RequestQuota(requests=requests, period=period)
+        return quota
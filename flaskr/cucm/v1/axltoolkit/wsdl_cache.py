@@ -0,0 +1,361 @@
+import gc
+import hashlib
+import io
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import zeep
+from lxml import etree
+from zeep.settings import Settings
+from zeep.transports import Transport
+from zeep.wsdl import Document
+from flaskr.cucm.v1.axltoolkit.ccm_version import ccm_version_registry, get_ccm_version, axl_schema_version
+
+log = logging.getLogger(__name__)
+
+
+class WsdlDocumentCache:
+    """
+    The WsdlDocumentCache class
+    Process-wide and on-disk cache of parsed (compiled) zeep WSDL Documents.
+
+    zeep's SqliteCache only caches the raw documents it fetches over HTTP, every zeep.Client construction still
+    parses the WSDL and builds the complete XSD type tree, which for the multi-megabyte AXLAPI.wsdl + AXLSoap.xsd
+    costs seconds of CPU and tens of MB per build.  This cache keeps one parsed Document per WSDL in memory, which
+    is shared by every Client built in this process, and pickles it to disk so that a freshly started worker loads a
+    ready schema instead of re-parsing it.
+
+    Cache entries are keyed by (WSDL location, file modification time, zeep version). For local WSDL files the
+    modification time is the most recent one of the WSDL and the schema files next to it (ie: AXLSoap.xsd,
+    AXLEnums.xsd) so editing any of them invalidates the entry.  Remote (http/https) WSDLs are only cached in memory.
+
+    :param cache_dir: (optional) Directory where pickled Documents are stored (default: /tmp/axltoolkit_wsdl_cache)
+    :param persistent: (optional) Whether parsed Documents are also stored on disk (default: True)
+    :type cache_dir: str
+    :type persistent: bool
+    :returns: return a WsdlDocumentCache object
+    :rtype: WsdlDocumentCache
+    """
+
+    def __init__(self, cache_dir='/tmp/axltoolkit_wsdl_cache', persistent=True):
+        self.cache_dir = cache_dir
+        self.persistent = persistent
+        self._documents = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_local(wsdl):
+        return not wsdl.startswith(('http://', 'https://'))
+
+    @classmethod
+    def cache_key(cls, wsdl):
+        """
+        Returns the cache key of a WSDL location: a (location, mtime, zeep version) tuple
+        """
+        if not cls._is_local(wsdl):
+            return wsdl, 0, zeep.__version__
+        wsdl = os.path.realpath(wsdl)
+        schema_dir = os.path.dirname(wsdl)
+        mtime = os.stat(wsdl).st_mtime_ns
+        for file_name in os.listdir(schema_dir):
+            if file_name.endswith(('.wsdl', '.xsd')):
+                mtime = max(mtime, os.stat(os.path.join(schema_dir, file_name)).st_mtime_ns)
+        return wsdl, mtime, zeep.__version__
+
+    def _cache_file(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.pickle')
+
+    def get_document(self, wsdl, transport, settings=None, cache_name=None):
+        """
+        Returns a parsed zeep Document for the given WSDL location, loading it from memory, disk or by parsing it
+        (in that order).  Concurrent callers asking for the same WSDL wait for a single parse.
+
+        The returned Document is shared, create a zeep.Client with it (zeep.Client(wsdl=document, ...)) so the
+        Client keeps its own transport, plugins and settings.
+
+        :param wsdl: The WSDL file path or URL
+        :param transport: The zeep Transport used if the WSDL needs to be fetched and parsed
+        :param settings: (optional) The zeep Settings used if the WSDL needs to be parsed
+        :param cache_name: (optional) Cache the Document under this name instead of the WSDL location, and store it
+                           on disk even if the WSDL is remote (ie: 'RISService70@15.0.1.11900-23', see versioned_wsdl)
+        :type wsdl: str
+        :type transport: zeep.transports.Transport
+        :type settings: zeep.settings.Settings
+        :type cache_name: str
+        :returns: return a parsed Document
+        :rtype: zeep.wsdl.Document
+        """
+        key = (cache_name, 0, zeep.__version__) if cache_name else self.cache_key(wsdl)
+        persistent = self.persistent and (cache_name is not None or self._is_local(wsdl))
+        document = self._documents.get(key)
+        if document is not None:
+            return document
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            document = self._documents.get(key)
+            if document is not None:
+                return document
+            if persistent:
+                document = self._load(key)
+            if document is None:
+                document = Document(wsdl, transport, settings=settings or Settings())
+                if persistent:
+                    self._store(key, document)
+            self._documents[key] = document
+        return document
+
+    def _load(self, key):
+        """
+        Load a pickled Document from disk. Returns None if there is no usable cache file.
+        """
+        cache_file = self._cache_file(key)
+        try:
+            # Only trust cache files that we own and nobody else can write to
+            file_stat = os.stat(cache_file)
+            if file_stat.st_uid != os.getuid() or file_stat.st_mode & 0o022:
+                log.warning(f'Ignoring WSDL cache file with unsafe ownership/permissions: {cache_file}')
+                return None
+            with open(cache_file, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.warning(f'Cannot read WSDL cache file {cache_file}: {e}')
+            return None
+
+        # Loading creates hundreds of thousands of small objects, suspending the cyclic GC while doing so
+        # roughly halves the load time
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            document = _DocumentUnpickler(io.BytesIO(data), Transport(), Settings()).load()
+        except Exception as e:
+            log.warning(f'Discarding unusable WSDL cache file {cache_file}: {e}')
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        log.info(f'Loaded parsed WSDL {key[0]} from {cache_file}')
+        return document
+
+    def _store(self, key, document):
+        """
+        Pickle a parsed Document to disk. Failures are logged and otherwise ignored, we still have it in memory.
+        """
+        cache_file = self._cache_file(key)
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            buffer = io.BytesIO()
+            _DocumentPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(document)
+            # Write to a temporary file and rename it, so other workers never read a partially written file
+            fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_file, cache_file)
+        except (Exception, RecursionError) as e:
+            log.warning(f'Cannot store parsed WSDL {key[0]} to {cache_file}: {e}')
+            return
+        log.info(f'Stored parsed WSDL {key[0]} to {cache_file}')
+
+    def clear(self):
+        """
+        Drop all in-memory Documents (cache files on disk are kept)
+        """
+        with self._lock:
+            self._documents.clear()
+
+
+def _build_dynamic_type(name, bases, attributes):
+    return type(name, bases, attributes)
+
+
+class _DocumentPickler(pickle.Pickler):
+    """
+    Pickler for zeep Documents.
+
+    zeep Documents can't be pickled as-is: the Transport and Settings hold sessions and thread-locals, lxml QName and
+    Element objects don't support pickling and the XSD parser creates classes on the fly (zeep.xsd.dynamic_types,
+    zeep.objects) that can't be looked up by name.  Transport and Settings are swapped for fresh instances on load,
+    lxml objects are stored by value and the dynamic classes are re-created from their name, bases and attributes.
+    """
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Transport):
+            return ('transport',)
+        if isinstance(obj, Settings):
+            return ('settings',)
+        if isinstance(obj, etree.QName):
+            return ('qname', obj.text)
+        if isinstance(obj, etree._Element):
+            return ('element', etree.tostring(obj))
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type) and obj.__module__ in ('zeep.xsd.dynamic_types', 'zeep.objects'):
+            attributes = {key: value for key, value in vars(obj).items()
+                          if key not in ('__dict__', '__weakref__')}
+            return _build_dynamic_type, (obj.__name__, obj.__bases__, attributes)
+        # Dictionary views (ie: ComplexType attributes built from an OrderedDict) are only ever iterated
+        if isinstance(obj, (type({}.keys()), type({}.values()), type({}.items()))):
+            return list, (list(obj),)
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+    def __init__(self, file, transport, settings):
+        super().__init__(file)
+        self.transport = transport
+        self.settings = settings
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == 'transport':
+            return self.transport
+        if kind == 'settings':
+            return self.settings
+        if kind == 'qname':
+            return etree.QName(pid[1])
+        if kind == 'element':
+            return etree.fromstring(pid[1])
+        raise pickle.UnpicklingError(f'Unsupported persistent id: {kind}')
+
+
+# Process-wide cache shared by all toolkit instances
+wsdl_document_cache = WsdlDocumentCache()
+
+# Bundled WSDL copies (committed files, never written at runtime), one sub directory per CUCM major version
+# (ie: wsdl/15.0/RISService70.wsdl)
+LOCAL_WSDL_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'wsdl')
+
+# Local WSDL paths whose server WSDL could not be stored as a local copy (see store_local_wsdl)
+_local_wsdl_failures = set()
+
+
+def stored_wsdl_path(name, schema_version):
+    """
+    Returns the path of the runtime copy of a server's WSDL, in the wsdl_document_cache directory
+    (ie: /tmp/axltoolkit_wsdl_cache/wsdl/15.0/RISService70.wsdl)
+
+    :param name: The WSDL name (ie: RISService70)
+    :param schema_version: The CUCM major version (ie: 15.0)
+    :type name: str
+    :type schema_version: str
+    :returns: return the WSDL copy path
+    :rtype: str
+    """
+    return os.path.join(wsdl_document_cache.cache_dir, 'wsdl', schema_version, name + '.wsdl')
+
+
+def _usable_wsdl_copy(local_wsdl):
+    """
+    Returns True if a runtime WSDL copy exists and is owned by us and not writable by anybody else
+    """
+    try:
+        file_stat = os.stat(local_wsdl)
+    except OSError:
+        return False
+    if file_stat.st_uid != os.getuid() or file_stat.st_mode & 0o022:
+        log.warning(f'Ignoring WSDL copy with unsafe ownership/permissions: {local_wsdl}')
+        return False
+    return True
+
+
+def store_local_wsdl(remote_wsdl, local_wsdl, session, timeout=10):
+    """
+    Downloads a server's WSDL and stores it as a local copy in the wsdl_document_cache directory (see
+    stored_wsdl_path), so that the WSDL of a CUCM version is only downloaded the first time it is seen. Only
+    self-contained WSDLs (no imported or included documents) are stored. A WSDL that could not be stored is not
+    downloaded again by this process.
+
+    :param remote_wsdl: The WSDL URL on the server
+    :param local_wsdl: The local copy path
+    :param session: The requests Session used to download the WSDL
+    :param timeout: (optional) Download timeout in seconds (default: 10)
+    :type remote_wsdl: str
+    :type local_wsdl: str
+    :type session: requests.Session
+    :type timeout: int
+    :returns: return True if the local copy was stored
+    :rtype: bool
+    """
+    if local_wsdl in _local_wsdl_failures:
+        return False
+    try:
+        response = session.get(remote_wsdl, timeout=timeout)
+        response.raise_for_status()
+        root = etree.fromstring(response.content)
+        if root.xpath('//*[@schemaLocation or @location]'):
+            raise Exception('the WSDL imports other documents')
+        os.makedirs(os.path.dirname(local_wsdl), mode=0o700, exist_ok=True)
+        # Write to a temporary file and rename it, so other workers never read a partially written file
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(local_wsdl), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_file, local_wsdl)
+    except Exception as e:
+        log.warning(f'Cannot store {remote_wsdl} as {local_wsdl}: {e}')
+        _local_wsdl_failures.add(local_wsdl)
+        return False
+    log.info(f'Stored {remote_wsdl} as {local_wsdl}')
+    return True
+
+
+def versioned_wsdl(name, remote_wsdl, server_ip, session, timeout=10):
+    """
+    Returns the WSDL location and cache name a toolkit should load its WSDL from, so that building a toolkit does
+    not need to download the WSDL from the server:
+        - The bundled copy LOCAL_WSDL_FOLDER/<major version>/<name>.wsdl of the server's CUCM version
+        - Otherwise the copy stored in the wsdl_document_cache directory, which a version without a bundled copy gets
+          the first time it is seen (see store_local_wsdl)
+        - Otherwise the server's WSDL, whose parsed Document is stored on disk under '<name>@<full version>' (see
+          WsdlDocumentCache.get_document), so it is only downloaded the first time a CUCM version is seen
+    The CUCM version comes from ccm_version_registry, which returns the publisher's version for the nodes of a known
+    cluster. Only a server that is not a known cluster node is sent a getCCMVersion request (AXL usually only runs on
+    the publisher), and a failed request is not repeated for ccm_version_registry.failure_ttl seconds. If the version
+    can't be found, the server's WSDL is used and only cached in memory.
+
+    :param name: The WSDL name (ie: RISService70)
+    :param remote_wsdl: The WSDL URL on the server
+    :param server_ip: The Hostname / IP Address of the server
+    :param session: The requests Session used for the getCCMVersion request and the WSDL download
+    :param timeout: (optional) getCCMVersion request timeout in seconds (default: 10)
+    :type name: str
+    :type remote_wsdl: str
+    :type server_ip: str
+    :type session: requests.Session
+    :type timeout: int
+    :returns: return a (WSDL location, cache name) tuple
+    :rtype: tuple
+    """
+    ccm_version = ccm_version_registry.get(server_ip)
+    if ccm_version is None:
+        publisher = ccm_version_registry.publisher(server_ip)
+        if publisher is not None:
+            error = f'the version of its publisher {publisher} is not known yet'
+        else:
+            error = ccm_version_registry.failed(server_ip)
+            if error is None:
+                try:
+                    ccm_version = get_ccm_version(session, server_ip, timeout=timeout)
+                except Exception as e:
+                    error = ccm_version_registry.failed(server_ip, e)
+                else:
+                    ccm_version_registry.set(server_ip, ccm_version)
+        if ccm_version is None:
+            log.info(f'Unknown CUCM version of {server_ip}, loading {name} WSDL from the server: {error}')
+            return remote_wsdl, None
+    schema_version = axl_schema_version(ccm_version)
+    bundled_wsdl = os.path.join(LOCAL_WSDL_FOLDER, schema_version, name + '.wsdl')
+    if os.path.isfile(bundled_wsdl):
+        return bundled_wsdl, None
+    local_wsdl = stored_wsdl_path(name, schema_version)
+    if _usable_wsdl_copy(local_wsdl) or store_local_wsdl(remote_wsdl, local_wsdl, session, timeout):
+        return local_wsdl, None
+    return remote_wsdl, f'{name}@{ccm_version}'
@@ -1,23 +1,48 @@
 import requests
-import re
 import functools
+import inspect
 import os
-from time import sleep
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from zeep.xsd.valueobjects import CompoundValue
 from lxml import etree
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from flaskr.cucm.v1.axltoolkit import CUCMAxlToolkit, PawsToolkit, UcmRisPortToolkit, UcmServiceabilityToolkit, UcmPerfMonToolkit
-
-
-def serialize_object(obj, target_cls=OrderedDict):
+from flaskr.cucm.v1.axltoolkit import UcmLogCollectionToolkit, UcmDimeGetFileToolkit, UcmCDRonDemandToolkit
+from flaskr.cucm.v1.axltoolkit.ccm_version import get_ccm_version, axl_schema_version, ccm_version_registry
+from flaskr.cucm.v1.axltoolkit.ccm_version import is_schema_mismatch
+from flaskr.cucm.v1.axltoolkit.throttle import is_throttled, get_axl_throttle, get_request_quota
+from flaskr.cucm.v1.axltoolkit import sql
+from flaskr.cucm.v1.axltoolkit.sql import sql_chunk, parse_sql_query_response
+from flaskr.cucm.v1.axltoolkit.raw_response import iter_list_response, text_converters
+from flaskr.cucm.v1.axltoolkit.object_cache import AXLObjectCache
+from flaskr.cucm.v1.axltoolkit.returned_tags import PHONE_RETURNED_TAGS, USER_RETURNED_TAGS, resolve_returned_tags
+from flaskr.cucm.v1.axltoolkit.ris import RIS_MAX_RETURNED_DEVICES, ris_select_items_chunks, ris_cm_devices
+from flaskr.cucm.v1.axltoolkit.ris import ris_merge_device, ris_select_cm_device_result, RisDeviceIndex
+from flaskr.cucm.v1.axltoolkit.perfmon import PerfMonSessionPool, PerfMonCollector, PERFMON_HISTORY_COUNTERS
+from flaskr.cucm.v1.axltoolkit.http_session import get_http_session, http_setup_error
+from flaskr.cucm.v1.axltoolkit.log_collection import log_files, log_file_path, log_download
+from flaskr.cucm.v1.axltoolkit.cdr import CDRStore, CDRIngestor
+
+
+def serialize_object(obj, target_cls=OrderedDict, skip_empty=False):
     """
     Serialize zeep objects to native python data structures.
 
     This helper function is used in place of zeep.helpers.serialize_object in order to handle the etree._Element types
 
+    The object tree is walked with an explicit stack instead of recursion and CompoundValues are read through their
+    underlying values dict, which keeps large responses (ie: thousands of listPhone rows with 130+ tags each) cheap
+    to convert.
+
     :Parameters:
         - obj (any) - Object to be serialized
         - target_cls (collection) - Type of object to serialize to. Defaults to OrderedDict
+        - skip_empty (bool) - Leave out None / empty string / empty list values. Defaults to False
 
     :Returns:
         - (obj) - A Python Native Data Structured Object (str, list, dict)
@@ -25,22 +50,157 @@ def serialize_object(obj, target_cls=OrderedDict):
     **Doctest**::
 
     """
+    root = [None]
+    stack = [(root, 0, obj)]
+    while stack:
+        parent, key, value = stack.pop()
+        # type() based checks: isinstance() on a CompoundValue goes through its (slow) __getattribute__
+        value_type = type(value)
+        if issubclass(value_type, CompoundValue):
+            value = object.__getattribute__(value, '__values__')
+            value_type = type(value)
+        if issubclass(value_type, dict):
+            result = target_cls()
+            for sub_key, sub_value in value.items():
+                sub_type = type(sub_value)
+                if sub_type in _SCALAR_TYPES:
+                    if not skip_empty or (sub_value is not None and sub_value != ''):
+                        result[sub_key] = sub_value
+                elif issubclass(sub_type, _NESTED_TYPES):
+                    if skip_empty and sub_type is list and not sub_value:
+                        continue
+                    result[sub_key] = None
+                    stack.append((result, sub_key, sub_value))
+                elif not skip_empty or sub_value != '':
+                    result[sub_key] = sub_value
+            parent[key] = result
+        elif issubclass(value_type, list):
+            result = [None] * len(value)
+            for index, sub_value in enumerate(value):
+                if issubclass(type(sub_value), _NESTED_TYPES):
+                    stack.append((result, index, sub_value))
+                else:
+                    result[index] = sub_value
+            parent[key] = result
+        elif issubclass(value_type, etree._Element):
+            parent[key] = _serialize_element(value)
+        else:
+            parent[key] = value
+    return root[0]
 
-    if isinstance(obj, list):
-        return [serialize_object(sub, target_cls) for sub in obj]
 
-    if isinstance(obj, etree._Element):
-        def recursive_dict(element):
-            return element.tag[element.tag.find('}') + 1:], dict(map(recursive_dict, element)) or element.text
-        return recursive_dict(obj)
+_NESTED_TYPES = (dict, CompoundValue, list, etree._Element)
+_SCALAR_TYPES = frozenset((str, int, bool, float, type(None)))
+
+
+def _serialize_element(element):
+    """
+    Returns a (tag, children dict or text) tuple for an lxml element, without recursion
+    """
+    values = {}
+    # Reversed document order visits every child before its parent
+    for sub_element in reversed(list(element.iter(tag=etree.Element))):
+        children = {child.tag[child.tag.find('}') + 1:]: values.pop(child)
+                    for child in sub_element if isinstance(child.tag, str)}
+        values[sub_element] = children or sub_element.text
+    return element.tag[element.tag.find('}') + 1:], values[element]
+
+
+def _cache_identifier(argument, field=None):
+    """
+    Returns a function giving the AXL object cache identifier (case insensitive name) of the object a method acts on,
+    from the method argument (or the field of a dict argument, ie: user_data['userid']). The function returns None
+    when there is no such name (ie: update by uuid).
+    """
+    def identifier(arguments):
+        value = arguments.get(argument)
+        if field is not None:
+            value = value.get(field) if isinstance(value, dict) else None
+        return value.lower() if isinstance(value, str) else None
+    return identifier
+
+
+def _cache_line_identifier(arguments):
+    """
+    Returns the AXL object cache identifier (pattern, partition) of a line from get_line / update_line arguments
+    """
+    if 'line_data' in arguments:
+        line_data = arguments['line_data'] or {}
+        pattern, partition = line_data.get('pattern'), line_data.get('routePartitionName')
+    else:
+        pattern, partition = arguments.get('dn'), arguments.get('partition')
+    if not isinstance(pattern, str) or not isinstance(partition or '', str):
+        return None
+    return pattern, partition or ''
 
-    if isinstance(obj, (dict, CompoundValue)):
-        result = target_cls()
-        for key in obj:
-            result[key] = serialize_object(obj[key], target_cls)
-        return result
 
-    return obj
+class AXLClientPool:
+    """
+    The AXL Client Pool class
+
+    Holds up to `size` CUCMAxlToolkit clients which are checked out exclusively by one request at a time, so that
+    concurrent Flask threads never share a client's last_exception or SOAP history. All clients are built from the
+    same process-wide parsed AXL schema, so growing the pool only costs a zeep Client wrapper per client.
+
+    :param factory: Callable returning a new CUCMAxlToolkit client
+    :param size: Maximum number of clients in the pool
+    :param checkout_timeout: Seconds to wait for a free client before giving up
+    :type factory: Callable
+    :type size: Integer
+    :type checkout_timeout: Integer
+    :returns: return an AXLClientPool object
+    :rtype: AXLClientPool
+    """
+
+    def __init__(self, factory, size=4, checkout_timeout=30):
+        self.factory = factory
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        """
+        Returns an idle client, builds a new one if the pool is not full yet, otherwise waits for one to be checked in.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            build = self.created < self.size
+            if build:
+                self.created += 1
+        if build:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self.created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise Exception(f"Timed out waiting for a free AXL client (pool size {self.size})")
+
+    def checkin(self, client):
+        client.last_exception = None
+        self._idle.put(client)
+
+    @contextmanager
+    def client(self):
+        """
+        Context manager checking out a client for the duration of the with block
+        """
+        client = self.checkout()
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def stats(self):
+        return {'size': self.size, 'created': self.created, 'idle': self._idle.qsize()}
 
 
 class AXL:
@@ -66,14 +226,34 @@ class AXL:
         self.host = host
         self.username = username
         self.password = password
-        self.axlclient = None                   # This is the AXL Client Object (CUCMAxlToolkit from axltoolkit)
+        self.axl_pool = None                    # This is the pool of AXL Client Objects (CUCMAxlToolkit from axltoolkit)
+        self.axl_pool_size = 4                  # Maximum number of concurrent AXL Requests (one AXL Client each)
         self.axl_tls_verify = False             # Certificate validation check for HTTPs connection
-        self.axl_version = "1.0"                # This is the default AXL version to try to find current version
         self.axl_timeout = 30                   # Default Timeout in Seconds awaiting for Response
-        self.axl_attempts = 0                   # AXL Request Attempt Count
-        self.axl_max_retries = 3                # AXL Request Max Number of Retries when throttled
-        self.axl_backoff_times = [1, 5, 10]     # AXL Retry Request Backoff Timers in seconds. Invoked if we get throttling response 503
+        self.axl_max_retries = 3                # AXL Request Max Number of Retries when throttled (503), paced by the shared AXL throttle
+        self.axl_schema_recheck_interval = 300  # Minimum seconds between two CUCM version re-checks after schema mismatches
+        self._axl_schema_checked = 0.0          # time.monotonic() of the last CUCM version re-check
         self.axl_logging = False                # This controls the SOAP Request Logging to /tmp/axltoolkit.log
+        self.axl_page_size = 500                # Number of items requested per page (first) by the paged list methods
+        self.axl_returned_tags_profile = 'minimal'  # Default returnedTags profile of the list methods (minimal, standard, full)
+        self.axl_sql_chunk_size = 2000          # Number of rows per executeSQLQuery (SKIP n FIRST m) of the SQL query methods
+        self.axl_sql_concurrency = 4            # Number of SQL query chunks in flight
+        self.axl_sql_max_statement_length = sql.SQL_MAX_STATEMENT_LENGTH  # Size limit of coalesced SQL updates
+        self.axl_session = get_http_session(    # Shared HTTP Session of the host, used for version discovery
+            self.host, self.username, self.password, self.axl_tls_verify)
+        self._axl_setup_lock = threading.Lock()
+        self._axl_local = threading.local()     # Per thread state: the checked out AXL Client and its last exception
+        self._axl_converters = {}               # Raw list response converters per AXL type, built from the AXL schema
+        self._axl_list_metrics = {}             # Paged list response size / latency per item type and returnedTags profile
+        self._axl_metrics_lock = threading.Lock()
+        self.axl_cache = AXLObjectCache(maxsize=1024, ttl=60)  # Cache of getUser / getPhone / getLine results
+
+    @property
+    def axlclient(self):
+        """
+        The AXL Client (CUCMAxlToolkit) checked out by the current thread, None outside an AXL request
+        """
+        return getattr(self._axl_local, 'client', None)
 
     class Decorators(object):
         """
@@ -88,16 +268,32 @@ class AXL:
         @staticmethod
         def axl_setup(func):
             """
-            Decorator method that checks if we already have a client session setup,
-            if not initiates AXL._axl_setup(), and then executes the original decorated class method and returns
-            its return value.
+            Decorator method that checks if we already have a client pool setup, if not initiates AXL._axl_setup(),
+            then checks out an AXL Client from the pool for the current thread, executes the original decorated class
+            method and returns its return value. The client's last exception is kept in thread local storage for
+            axl_result_check_with_retry once the client has been returned to the pool.
             """
             @functools.wraps(func)
             def axl_setup_check(self, *args, **kwargs):
-                if not self.axlclient:
-                    self._axl_setup()
-                value = func(self, *args, **kwargs)
-                return value
+                if self.axl_pool is None:
+                    with self._axl_setup_lock:
+                        if self.axl_pool is None:
+                            self._axl_setup()
+                # Nested AXL method calls reuse the client already checked out by this thread
+                axlclient = self.axlclient
+                if axlclient is not None:
+                    axlclient.last_exception = None
+                    try:
+                        return func(self, *args, **kwargs)
+                    finally:
+                        self._axl_local.last_exception = axlclient.last_exception
+                with self.axl_pool.client() as axlclient:
+                    self._axl_local.client = axlclient
+                    try:
+                        return func(self, *args, **kwargs)
+                    finally:
+                        self._axl_local.last_exception = axlclient.last_exception
+                        self._axl_local.client = None
             return axl_setup_check
 
         @staticmethod
@@ -107,94 +303,199 @@ class AXL:
             failure reason is due to AXL throttling (HTTP Status 503). Otherwise if the original decorated class method
             returned value is None, it raises an Exception relaying the last SOAP exception message.
 
+            The attempt counter is local to each call, so concurrent requests never share retry state. There is no
+            per-call backoff: the 503 already made the server's shared AXL throttle lower its rate and pause all
+            callers, so the retry simply waits its turn in the throttle queue.
+
+            A fault showing that the AXL schema does not match the server's CUCM version (ie: after an upgrade) makes
+            the CUCM version be probed again and the client pool be rebuilt (see _axl_recheck_schema), then the
+            request is retried once.
+
             All successful responses will be dynamically converted from Zeep/Soap objects to native python objects
             via the local serialize_object method.
             """
             @functools.wraps(func)
             def axl_result_check_wrapper(self, *args, **kwargs):
-                while self.axl_attempts <= self.axl_max_retries:
-                    try:
-                        value = func(self, *args, **kwargs)
-                        if value is None:
-                            if self.axlclient.last_exception:
-                                if "HTTP Status 503" in str(self.axlclient.last_exception.detail):
-                                    if self.axl_attempts >= self.axl_max_retries:
-                                        raise Exception(f"Received 503 -- AXL Throttling hit {self.axl_max_retries} times")
-                                    sleep(self.axl_backoff_times[self.axl_attempts])
-                                    self.axl_attempts += 1
-                                else:
-                                    raise Exception(str(self.axlclient.last_exception))
-                        else:
-                            return serialize_object(value)
-                    except Exception as e:
-                        self.axl_attempts = 0
-                        raise Exception(e)
+                axl_attempts = 0
+                schema_rechecked = False
+                while True:
+                    self._axl_local.last_exception = None
+                    value = func(self, *args, **kwargs)
+                    if value is not None:
+                        return serialize_object(value)
+                    last_exception = self._axl_local.last_exception
+                    if last_exception is None:
+                        return None
+                    if is_schema_mismatch(last_exception) and not schema_rechecked:
+                        schema_rechecked = True
+                        if self._axl_recheck_schema():
+                            continue
+                    if not is_throttled(last_exception):
+                        raise Exception(str(last_exception))
+                    if axl_attempts >= self.axl_max_retries:
+                        raise Exception(f"Received 503 -- AXL Throttling hit {self.axl_max_retries} times")
+                    axl_attempts += 1
             return axl_result_check_wrapper
 
+        @staticmethod
+        def axl_cached(object_type, identifier):
+            """
+            Decorator method serving the decorated get method from the AXL object cache (self.axl_cache).
+
+            identifier is called with the decorated method's arguments (by name) and returns the cache identifier of
+            the object (ie: the userid). On a miss the original method is called and its result cached.
+
+            The decorated method gets a cached keyword argument: read-modify-write callers (ie: read a user's
+            associatedDevices to write them back) pass cached=False to read the object from CUCM, the cache is then
+            refreshed with it. Objects may be changed by other processes (or on CUCM) within the cache ttl.
+            """
+            def decorator(func):
+                signature = inspect.signature(func)
+
+                @functools.wraps(func)
+                def axl_cached_wrapper(self, *args, cached=True, **kwargs):
+                    arguments = signature.bind(self, *args, **kwargs)
+                    arguments.apply_defaults()
+                    object_identifier = identifier(arguments.arguments)
+                    if object_identifier is None:
+                        return func(self, *args, **kwargs)
+                    key = (object_type, object_identifier)
+                    if cached:
+                        found, value = self.axl_cache.get(key)
+                        if found:
+                            return value
+                    generation = self.axl_cache.generation()
+                    value = func(self, *args, **kwargs)
+                    if value is not None:
+                        self.axl_cache.set(key, value, generation)
+                    return value
+                return axl_cached_wrapper
+            return decorator
+
+        @staticmethod
+        def axl_cache_invalidate(object_type, identifier=None):
+            """
+            Decorator method dropping the objects changed by the decorated write method from the AXL object cache,
+            whether the write succeeded or not.
+
+            identifier is called with the decorated method's arguments (by name) and returns the cache identifier of
+            the changed object, or None when it can't be told (ie: update by uuid) in which case every cached object
+            of that type is dropped. Without object_type the whole cache is dropped.
+            """
+            def decorator(func):
+                signature = inspect.signature(func)
+
+                @functools.wraps(func)
+                def axl_cache_invalidate_wrapper(self, *args, **kwargs):
+                    arguments = signature.bind(self, *args, **kwargs)
+                    arguments.apply_defaults()
+                    try:
+                        return func(self, *args, **kwargs)
+                    finally:
+                        self.axl_cache.invalidate(object_type, identifier(arguments.arguments) if identifier else None)
+                return axl_cache_invalidate_wrapper
+            return decorator
+
     def _axl_setup(self):
         """
-        Internal AXL Class method which Tests and establishes AXL connection to a given VOS device.
+        Internal AXL Class method which establishes AXL connection to a given VOS device.
 
-        Calls _axl_get_schema which initializes self.axlclient if AXL Services are up and if user is authenticated.
+        Calls _axl_set_schema which initializes self.axl_pool. There is no separate connectivity test request: if AXL
+        Services are not running or if user is not authorized, the version discovery (or the first AXL request when
+        the version is already known) Raises an Exception with the appropriate error.
 
-        If AXL Services are not running or if user is not authorized Raise Exception with appropriate error.
+        """
+        self._axl_set_schema()
 
+    def _axl_recheck_schema(self):
         """
-        axl_test_url = "https://" + self.host + "/axl"
-        r = requests.get(axl_test_url,
-                         auth=(self.username, self.password),
-                         timeout=self.axl_timeout,
-                         verify=self.axl_tls_verify)
-        if r.status_code == 404:
-            raise Exception("AXL Services Not Running: " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 401:
-            raise Exception("AXL Authentication error " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 200:
-            self._axl_set_schema()
-        else:
-            raise Exception("AXL Connectivity Exception:" + str(r.status_code) + " - " + r.reason)
+        Internal AXL Class method called on an AXL schema mismatch: forgets the recorded CUCM version of the host and
+        drops the client pool, so that the next request probes the version again and builds clients with the
+        matching schema. Does nothing (and returns False) within an AXL request of the same thread, whose client is
+        still checked out, or if the version was re-checked less than axl_schema_recheck_interval seconds ago.
+        """
+        if self.axlclient is not None:
+            return False
+        with self._axl_setup_lock:
+            if time.monotonic() - self._axl_schema_checked < self.axl_schema_recheck_interval:
+                return False
+            self._axl_schema_checked = time.monotonic()
+            ccm_version_registry.invalidate(self.host)
+            self.axl_pool = None
+        return True
 
     def _axl_set_schema(self):
         """
         Internal AXL Class method which detects the CUCM version and instantiates the CUCMAxlToolkit with the
         appropriate WSDL file.
 
-        First we use the Default AXL Version self.axl_version and run getCCMVersion AXL request.
+        The CUCM version is looked up in the on-disk version registry first. If it is unknown (or expired) we send a
+        raw getCCMVersion request over self.axl_session, which does not need any AXL schema to be loaded, and record
+        the result in the registry so restarted workers can skip this step. If the first client can't be built with
+        a recorded version, the version is probed again in case it is outdated (ie: CUCM was upgraded).
 
         Strip the major version from the response. ie: 11.5 or 12.5
 
-        Initialize the self.axlclient with the current CUCM version
+        Initialize the self.axl_pool of AXL Clients with the current CUCM version
 
         """
+        ccm_version = ccm_version_registry.get(self.host)
+        recorded = ccm_version is not None
+        if ccm_version is None:
+            try:
+                ccm_version = get_ccm_version(self.axl_session, self.host, timeout=self.axl_timeout)
+            except Exception as e:
+                raise Exception("Exception with get_ccm_version --- " + str(e))
+            ccm_version_registry.set(self.host, ccm_version)
+
         schema_folder_path = os.path.dirname(os.path.realpath(__file__)) + "/axltoolkit/"
-        self.axlclient = CUCMAxlToolkit(username=self.username, password=self.password,
-                                        server_ip=self.host, version=self.axl_version,
-                                        tls_verify=self.axl_tls_verify, timeout=self.axl_timeout,
-                                        logging_enabled=self.axl_logging, schema_folder_path=schema_folder_path
-                                        )
-        ccm_version = self.axlclient.get_ccm_version()
-        if ccm_version:
-            axl_version = re.findall(r'^\d+\.\d+', ccm_version)[0]
-            self.axlclient = CUCMAxlToolkit(username=self.username, password=self.password,
-                                            server_ip=self.host, version=axl_version,
-                                            tls_verify=self.axl_tls_verify, timeout=self.axl_timeout,
-                                            logging_enabled=self.axl_logging, schema_folder_path=schema_folder_path)
-        else:
-            if self.axlclient.last_exception:
-                raise Exception("Exception with get_ccm_version --- " + str(self.axlclient.last_exception))
 
+        def axl_client_factory():
+            return CUCMAxlToolkit(username=self.username, password=self.password,
+                                  server_ip=self.host, version=axl_schema_version(ccm_version),
+                                  tls_verify=self.axl_tls_verify, timeout=self.axl_timeout,
+                                  logging_enabled=self.axl_logging, schema_folder_path=schema_folder_path)
+
+        axl_pool = AXLClientPool(axl_client_factory, size=self.axl_pool_size, checkout_timeout=self.axl_timeout)
+        # Build the first client right away so schema problems surface during setup
+        try:
+            axl_pool.checkin(axl_pool.checkout())
+        except Exception:
+            if not recorded:
+                raise
+            ccm_version_registry.invalidate(self.host)
+            return self._axl_set_schema()
+        self.axl_pool = axl_pool
+
+    def axl_stats(self):
+        """
+        Returns the shared AXL throttle state (current rate, concurrency, queue depth), the AXL Client pool usage and
+        the list request metrics per returnedTags profile and the AXL object cache statistics
+        """
+        return {'throttle': get_axl_throttle(self.host).stats(),
+                'pool': self.axl_pool.stats() if self.axl_pool else None,
+                'list': self.axl_list_metrics(),
+                'cache': self.axl_cache.stats()}
+
+    # The users' getUser associatedDevices list phones: adding a phone invalidates its owner (every user if unknown)
+    @Decorators.axl_cache_invalidate('user', _cache_identifier('phone_data', 'ownerUserName'))
+    @Decorators.axl_cache_invalidate('phone', _cache_identifier('phone_data', 'name'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def add_phone(self, phone_data=None):
         axl_result = self.axlclient.add_phone(phone_data=phone_data)
         return axl_result
 
+    @Decorators.axl_cached('phone', _cache_identifier('name'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def get_phone(self, name=None):
         axl_result = self.axlclient.get_phone(name)
         return axl_result
 
+    # Any user may have the phone in its associatedDevices
+    @Decorators.axl_cache_invalidate('user')
+    @Decorators.axl_cache_invalidate('phone', _cache_identifier('name'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def delete_phone(self, name=None):
@@ -209,18 +510,184 @@ class AXL:
 
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
-    def list_phone(self, search_criteria_data=None, returned_tags=None):
-        axl_result = self.axlclient.list_phone(search_criteria_data, returned_tags)
-        if axl_result['return'] is None:
+    def list_phone(self, search_criteria_data=None, returned_tags=None, skip=None, first=None, raw=False,
+                  returned_tags_profile=None):
+        returned_tags, returned_tags_profile = resolve_returned_tags(
+            PHONE_RETURNED_TAGS, returned_tags_profile or self.axl_returned_tags_profile, returned_tags)
+        axl_result = self.axlclient.list_phone(search_criteria_data, returned_tags, skip=skip, first=first, raw=raw)
+        # An empty page is the normal end of a paged listing, only an empty unpaged listing is an error
+        if axl_result is not None and not raw and axl_result['return'] is None and skip is None:
             raise Exception("List Phone did not return any Results given the search criteria")
         return axl_result
 
+    def list_phone_iter(self, search_criteria_data=None, returned_tags=None, page_size=None, prefetch=0,
+                        skip_empty=False, returned_tags_profile=None):
+        """
+        Generator listing phones page by page (listPhone with skip/first), yielding one phone at a time
+
+        Pages are converted straight from the raw XML response to dicts (see raw_response.element_to_dict) rather
+        than through zeep objects and serialize_object, so only the returned tags are part of each phone.
+
+        :param search_criteria_data: The listPhone searchCriteria
+        :param returned_tags: (optional) The listPhone returnedTags, as a dict or a list of tag names
+        :param returned_tags_profile: (optional) The returnedTags profile used when no returned_tags are supplied:
+                                      minimal, standard or full (default: self.axl_returned_tags_profile)
+        :param page_size: (optional) Number of phones requested per page (default: self.axl_page_size)
+        :param prefetch: (optional) Number of pages requested ahead in parallel, each on its own pooled AXL Client
+                         (default: 0, pages are requested one after the other)
+        :param skip_empty: (optional) Leave out empty tags (default: False)
+        :type search_criteria_data: dict
+        :type returned_tags: dict or list
+        :type returned_tags_profile: str
+        :type page_size: int
+        :type prefetch: int
+        :type skip_empty: bool
+        :returns: return a generator of phones
+        :rtype: Iterator[OrderedDict]
+        """
+        return self._axl_list_pages(self.list_phone, 'phone', 'LPhone', PHONE_RETURNED_TAGS, search_criteria_data,
+                                    returned_tags, returned_tags_profile, page_size, prefetch, skip_empty)
+
+    @Decorators.axl_result_check_with_retry
+    @Decorators.axl_setup
+    def list_user(self, search_criteria_data=None, returned_tags=None, skip=None, first=None, raw=False,
+                  returned_tags_profile=None):
+        returned_tags, returned_tags_profile = resolve_returned_tags(
+            USER_RETURNED_TAGS, returned_tags_profile or self.axl_returned_tags_profile, returned_tags)
+        axl_result = self.axlclient.list_user(search_criteria_data, returned_tags, skip=skip, first=first, raw=raw)
+        # An empty page is the normal end of a paged listing, only an empty unpaged listing is an error
+        if axl_result is not None and not raw and axl_result['return'] is None and skip is None:
+            raise Exception("List User did not return any Results given the search criteria")
+        return axl_result
+
+    def list_user_iter(self, search_criteria_data=None, returned_tags=None, page_size=None, prefetch=0,
+                       skip_empty=False, returned_tags_profile=None):
+        """
+        Generator listing end users page by page (listUser with skip/first), yielding one user at a time
+
+        See list_phone_iter for the parameters
+        """
+        return self._axl_list_pages(self.list_user, 'user', 'LUser', USER_RETURNED_TAGS, search_criteria_data,
+                                    returned_tags, returned_tags_profile, page_size, prefetch, skip_empty)
+
+    def _axl_list_pages(self, list_method, item_name, item_type, profiles, search_criteria_data, returned_tags,
+                        returned_tags_profile, page_size, prefetch, skip_empty=False):
+        """
+        Internal AXL Class generator yielding the items of a paged list method (list_phone, list_user, ...)
+
+        The returnedTags profile is resolved up front so that an unknown profile fails before the first request, and
+        the response size and latency of every page are recorded per profile (see axl_stats).
+        """
+        returned_tags_profile = resolve_returned_tags(
+            profiles, returned_tags_profile or self.axl_returned_tags_profile, returned_tags)[1]
+
+        def get_page(skip, first):
+            start = time.monotonic()
+            content = list_method(search_criteria_data, returned_tags, skip=skip, first=first, raw=True,
+                                  returned_tags_profile=returned_tags_profile)
+            items = list(iter_list_response(content, item_name, skip_empty=skip_empty,
+                                            converters=self._axl_text_converters(item_type)))
+            self._axl_record_list_metrics(item_name, returned_tags_profile, len(items), len(content),
+                                          time.monotonic() - start)
+            return items
+
+        return self._axl_list_items(get_page, page_size, prefetch)
+
+    def _axl_list_items(self, get_page, page_size, prefetch):
+        for page in self._axl_pages(get_page, page_size or self.axl_page_size, prefetch):
+            yield from page
+
+    def _axl_record_list_metrics(self, item_name, returned_tags_profile, items, response_bytes, seconds):
+        with self._axl_metrics_lock:
+            metrics = self._axl_list_metrics.setdefault(f"{item_name}/{returned_tags_profile}",
+                                                        {'pages': 0, 'items': 0, 'bytes': 0, 'seconds': 0.0})
+            metrics['pages'] += 1
+            metrics['items'] += items
+            metrics['bytes'] += response_bytes
+            metrics['seconds'] += seconds
+
+    def axl_list_metrics(self):
+        """
+        Returns the response size and latency of the paged list requests per item type and returnedTags profile
+        (ie: phone/minimal): pages and items retrieved, average bytes per item and average seconds per page
+        """
+        with self._axl_metrics_lock:
+            return {key: {'pages': metrics['pages'],
+                          'items': metrics['items'],
+                          'bytes_per_item': round(metrics['bytes'] / metrics['items']) if metrics['items'] else None,
+                          'seconds_per_page': round(metrics['seconds'] / metrics['pages'], 3)}
+                    for key, metrics in self._axl_list_metrics.items()}
+
+    def _axl_text_converters(self, type_name):
+        """
+        Internal AXL Class method returning (and caching) the raw_response text converters of an AXL type (ie: LPhone)
+        """
+        converters = self._axl_converters.get(type_name)
+        if converters is None:
+            with self.axl_pool.client() as axlclient:
+                converters = text_converters(axlclient.get_axl_type(type_name))
+            self._axl_converters[type_name] = converters
+        return converters
+
+    @staticmethod
+    def _axl_pages(get_page, page_size, prefetch):
+        """
+        Internal AXL Class generator driving paged requests: get_page(skip, first) is called with increasing skip
+        values until it returns fewer than page_size items, and each page (list) is yielded.
+
+        The first page is requested on its own: most results (ie: a single row lookup) fit in it, and no request is
+        sent past the end of the result. If it is full, up to prefetch further pages are kept in flight on a thread
+        pool (each thread checks out its own AXL Client from self.axl_pool and all of them go through the shared AXL
+        throttle) while the caller consumes the current page, so at most prefetch + 1 pages are held in memory. Pages
+        are always yielded in order.
+        """
+        page = get_page(0, page_size)
+        yield page
+        if len(page) < page_size:
+            return
+        if not prefetch:
+            skip = page_size
+            while True:
+                page = get_page(skip, page_size)
+                yield page
+                if len(page) < page_size:
+                    return
+                skip += page_size
+
+        with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix='axl-page') as executor:
+            pending = deque()
+            next_skip = page_size
+            try:
+                while True:
+                    while len(pending) <= prefetch:
+                        pending.append(executor.submit(get_page, next_skip, page_size))
+                        next_skip += page_size
+                    page = pending.popleft().result()
+                    yield page
+                    if len(page) < page_size:
+                        return
+            finally:
+                # Don't wait for pages past the end (or past the point where the consumer stopped)
+                for future in pending:
+                    future.cancel()
+
+    # Any user may have the phone in its associatedDevices (ie: renamed with newName)
+    @Decorators.axl_cache_invalidate('user')
+    @Decorators.axl_cache_invalidate('phone', _cache_identifier('phone_data', 'name'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def update_phone(self, phone_data=None):
         axl_result = self.axlclient.update_phone(phone_data=phone_data)
         return axl_result
 
+    @Decorators.axl_cached('line', _cache_line_identifier)
+    @Decorators.axl_result_check_with_retry
+    @Decorators.axl_setup
+    def get_line(self, dn=None, partition=None):
+        axl_result = self.axlclient.get_line(dn, partition)
+        return axl_result
+
+    @Decorators.axl_cache_invalidate('line', _cache_line_identifier)
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def update_line(self, line_data=None):
@@ -233,18 +700,223 @@ class AXL:
         axl_result = self.axlclient.apply_line(dn=dn, partition=partition)
         return axl_result
 
+    @Decorators.axl_cached('user', _cache_identifier('userid'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def get_user(self, userid=None):
         axl_result = self.axlclient.get_user(userid=userid)
         return axl_result
 
+    @Decorators.axl_cache_invalidate('user', _cache_identifier('user_data', 'userid'))
     @Decorators.axl_result_check_with_retry
     @Decorators.axl_setup
     def update_user(self, user_data=None):
         axl_result = self.axlclient.update_user(user_data=user_data)
         return axl_result
 
+    @Decorators.axl_result_check_with_retry
+    @Decorators.axl_setup
+    def sql_query_raw(self, query=None):
+        axl_result = self.axlclient.run_sql_query_raw(query)
+        return axl_result
+
+    @Decorators.axl_cache_invalidate(None)
+    @Decorators.axl_result_check_with_retry
+    @Decorators.axl_setup
+    def sql_update(self, query=None):
+        axl_result = self.axlclient.run_sql_update(query)
+        return axl_result
+
+    def sql_query_pages(self, query, chunk_size=None, concurrency=None):
+        """
+        Generator running a Thin AXL SELECT statement in chunks of rows (SKIP n FIRST m), yielding one
+        (column names, rows) tuple per chunk, each row being a list of values in column order.
+
+        The first chunk runs on its own, then if it was full the next chunks run concurrently (each on its own pooled
+        AXL Client, paced by the shared AXL throttle) so entire tables can be pulled past the executeSQLQuery row/size
+        limit. Responses are parsed straight from the raw XML instead of zeep objects. The query should have an ORDER
+        BY on a unique column (ie: ORDER BY pkid) so that the chunks neither overlap nor miss rows.
+
+        :param query: The SELECT statement, without SKIP/FIRST clause
+        :param chunk_size: (optional) Number of rows per executeSQLQuery (default: self.axl_sql_chunk_size)
+        :param concurrency: (optional) Number of chunks in flight (default: self.axl_sql_concurrency)
+        :type query: str
+        :type chunk_size: int
+        :type concurrency: int
+        :returns: return a generator of (columns, rows) tuples
+        :rtype: Iterator[tuple]
+        """
+        chunk_size = chunk_size or self.axl_sql_chunk_size
+        concurrency = self.axl_sql_concurrency if concurrency is None else concurrency
+        columns = []
+
+        def get_chunk(skip, first):
+            chunk_columns, rows = parse_sql_query_response(self.sql_query_raw(sql_chunk(query, skip, first)))
+            if chunk_columns and not columns:
+                columns.extend(chunk_columns)
+            return rows
+
+        for rows in self._axl_pages(get_chunk, chunk_size, max(concurrency - 1, 0)):
+            yield columns, rows
+
+    def sql_query_rows(self, query, chunk_size=None, concurrency=None):
+        """
+        Generator running a Thin AXL SELECT statement in chunks (see sql_query_pages) and yielding one dict per row
+        """
+        for columns, rows in self.sql_query_pages(query, chunk_size=chunk_size, concurrency=concurrency):
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def sql_query(self, query, chunk_size=None, concurrency=None):
+        """
+        Runs a Thin AXL SELECT statement in chunks (see sql_query_pages) and returns the complete result in columnar
+        form: {'query': query, 'num_rows': 2, 'columns': {'name': ['SEP001', 'SEP002'], 'pkid': ['...', '...']}}
+        """
+        result = {'query': query, 'num_rows': 0, 'columns': OrderedDict()}
+        values = None
+        for columns, rows in self.sql_query_pages(query, chunk_size=chunk_size, concurrency=concurrency):
+            if not rows:
+                continue
+            if values is None:
+                values = [result['columns'].setdefault(column, []) for column in columns]
+            for column_values, chunk_values in zip(values, zip(*rows)):
+                column_values.extend(chunk_values)
+            result['num_rows'] += len(rows)
+        return result
+
+    def _sql_update_batch(self, items, build_update, weight, select_applied, concurrency=None):
+        """
+        Internal AXL Class method applying one coalesced Thin AXL update per chunk of items instead of one
+        executeSQLUpdate per item, and working out the outcome of each item.
+
+        Items are split in chunks whose update statement fits within self.axl_sql_max_statement_length. For each
+        chunk (up to concurrency chunks at a time, paced by the shared AXL throttle):
+            - select_applied(chunk) finds the items already applied (ie: users already in the group), which are skipped
+              since Informix can't filter them out in an INSERT ... SELECT on the same table
+            - build_update(remaining items) is executed as a single statement
+            - select_applied(remaining items) tells which items were applied, the others matched nothing (ie: unknown
+              userid)
+        If a coalesced statement fails, its items are retried in halves until the failing item(s) are isolated, so a
+        single bad row only fails itself.
+
+        :returns: return a dict of item: None if the item is applied, 'not found' if it matched nothing or the error
+                  message of its failed statement
+        :rtype: dict
+        """
+        def apply_chunk(chunk):
+            already_applied = select_applied(chunk)
+            remaining = [item for item in chunk if item not in already_applied]
+            outcomes = dict.fromkeys(already_applied & set(chunk))
+            if not remaining:
+                return outcomes
+            try:
+                self.sql_update(build_update(remaining))
+            except Exception as e:
+                if len(remaining) == 1:
+                    outcomes[remaining[0]] = str(e)
+                    return outcomes
+                # Bisect the chunk to isolate the failing item(s)
+                half = len(remaining) // 2
+                outcomes.update(apply_chunk(remaining[:half]))
+                outcomes.update(apply_chunk(remaining[half:]))
+                return outcomes
+            applied = select_applied(remaining)
+            for item in remaining:
+                outcomes[item] = None if item in applied else 'not found'
+            return outcomes
+
+        items = list(dict.fromkeys(items))
+        chunks = list(sql.sql_coalesce(items, build_update, weight, self.axl_sql_max_statement_length))
+        concurrency = self.axl_sql_concurrency if concurrency is None else concurrency
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='axl-sql') as executor:
+            for chunk_outcomes in executor.map(apply_chunk, chunks):
+                outcomes.update(chunk_outcomes)
+        return outcomes
+
+    def sql_associate_users_to_group(self, userids, group_name, concurrency=None):
+        """
+        Adds end users to a User Group with coalesced Thin AXL inserts (see _sql_update_batch)
+
+        :param userids: The end user IDs
+        :param group_name: The User Group name
+        :param concurrency: (optional) Number of statements in flight (default: self.axl_sql_concurrency)
+        :type userids: list
+        :type group_name: str
+        :type concurrency: int
+        :returns: return one {'userid': , 'success': , 'message': } outcome per userid
+        :rtype: list
+        """
+        if not self.sql_query("select pkid from dirgroup where name = " + sql.sql_quote(group_name))['num_rows']:
+            raise Exception(f"User Group {group_name} not found")
+
+        def select_applied(chunk):
+            query = sql.sql_select_users_in_group(chunk, group_name)
+            return set(self.sql_query(query, concurrency=1)['columns'].get('userid', []))
+
+        outcomes = self._sql_update_batch(userids, lambda chunk: sql.sql_insert_users_to_group(chunk, group_name),
+                                          sql.sql_in_list_weight, select_applied, concurrency=concurrency)
+        return [{'userid': userid, 'success': outcomes[userid] is None,
+                 'message': f"Associated to {group_name}" if outcomes[userid] is None else
+                 "User not found" if outcomes[userid] == 'not found' else outcomes[userid]}
+                for userid in dict.fromkeys(userids)]
+
+    def sql_associate_devices_to_users(self, associations, association_type='1', concurrency=None):
+        """
+        Associates devices to end users (controlled devices) with coalesced Thin AXL inserts (see _sql_update_batch)
+
+        :param associations: The (device name, userid) pairs
+        :param association_type: (optional) The tkuserassociation value (default: '1')
+        :param concurrency: (optional) Number of statements in flight (default: self.axl_sql_concurrency)
+        :type associations: list
+        :type association_type: str
+        :type concurrency: int
+        :returns: return one {'device': , 'userid': , 'success': , 'message': } outcome per pair
+        :rtype: list
+        """
+        associations = [tuple(association) for association in associations]
+
+        def select_applied(chunk):
+            rows = self.sql_query_rows(sql.sql_select_devices_of_users(chunk), concurrency=1)
+            return {(row['name'], row['userid']) for row in rows}
+
+        outcomes = self._sql_update_batch(associations,
+                                          lambda chunk: sql.sql_insert_devices_to_users(chunk, association_type),
+                                          sql.sql_device_user_pair_weight, select_applied, concurrency=concurrency)
+        return [{'device': device, 'userid': userid, 'success': outcomes[(device, userid)] is None,
+                 'message': "Associated" if outcomes[(device, userid)] is None else
+                 "Device or user not found" if outcomes[(device, userid)] == 'not found' else
+                 outcomes[(device, userid)]}
+                for device, userid in dict.fromkeys(associations)]
+
+    def sql_update_service_parameters(self, parameters, concurrency=None):
+        """
+        Sets service parameter values (processconfig) with coalesced Thin AXL updates (see _sql_update_batch)
+
+        :param parameters: The service parameter names and values, ie: {'MaxNumberOfDevices': '1000'}
+        :param concurrency: (optional) Number of statements in flight (default: self.axl_sql_concurrency)
+        :type parameters: dict
+        :type concurrency: int
+        :returns: return one {'name': , 'value': , 'success': , 'message': } outcome per parameter
+        :rtype: list
+        """
+        parameters = [(name, str(value)) for name, value in parameters.items()]
+
+        def select_applied(chunk):
+            values = {}
+            for row in self.sql_query_rows(sql.sql_select_service_parameters(chunk), concurrency=1):
+                values.setdefault(row['paramname'], set()).add(row['paramvalue'])
+            # Parameters with the same name exist for several services/nodes, all of them must hold the value
+            return {(name, value) for name, value in chunk if values.get(name) == {value}}
+
+        outcomes = self._sql_update_batch(parameters, sql.sql_update_service_parameters,
+                                          sql.sql_service_parameter_weight, select_applied, concurrency=concurrency)
+        return [{'name': name, 'value': value, 'success': outcomes[(name, value)] is None,
+                 'message': "Updated" if outcomes[(name, value)] is None else
+                 "Service parameter not found" if outcomes[(name, value)] == 'not found' else
+                 outcomes[(name, value)]}
+                for name, value in parameters]
+
 
 class PAWS:
     """
@@ -320,30 +992,22 @@ class PAWS:
 
     def _paws_setup(self):
         """
-        Internal PAWS Class method which Tests and establishes PAWS connection to a given VOS device.
+        Internal PAWS Class method which establishes PAWS connection to a given VOS device.
 
-        If PAWS Services are up and if user is authenticated initializes self.pawsclient with a new PawsToolkit
-        for the chosen PAWS API Service (ie: VersionService, ClusterNodeServices)
+        Initializes self.pawsclient with a new PawsToolkit for the chosen PAWS API Service (ie: VersionService,
+        ClusterNodeServices), over the host's shared HTTP Session (see get_http_session).
 
-        If PAWS Services are not running or if user is not authorized Raise Exception with appropriate error.
+        If PAWS Services are not running or if user is not authorized (WSDL download failure) Raise Exception with
+        appropriate error.
 
         """
-        paws_test_url = "https://" + self.host + "/platform-services/services/listServices"
-        r = requests.get(paws_test_url,
-                         auth=(self.username, self.password),
-                         timeout=self.paws_timeout,
-                         verify=self.paws_tls_verify)
-        if r.status_code == 404:
-            raise Exception("PAWS Services Not Running: " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 401:
-            raise Exception("PAWS Authentication error " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 200:
+        try:
             self.pawsclient = PawsToolkit(username=self.username, password=self.password,
                                           server_ip=self.host, service=self.service,
                                           tls_verify=self.paws_tls_verify, timeout=self.paws_timeout,
                                           logging_enabled=self.paws_logging)
-        else:
-            raise Exception("PAWS Connectivity Exception:" + str(r.status_code) + " - " + r.reason)
+        except requests.exceptions.HTTPError as e:
+            raise Exception(http_setup_error("PAWS", e.response))
 
     @Decorators.paws_result_check
     @Decorators.paws_setup
@@ -381,34 +1045,61 @@ class SXML:
         self.host = host
         self.username = username
         self.password = password
-        self.sxmlclient = None        # This is the PAWS Client Object
+        self.sxmlclients = {}         # SXML Client Objects per SXML Service Name, built on first use
+        self._sxml_local = threading.local()  # SXML Service Name of the request being sent by the current thread
+        self._sxml_setup_lock = threading.Lock()
         self.sxml_tls_verify = False  # TLS Verify on PAWS HTTPS connections
         self.sxml_timeout = 30        # Default Timeout in Seconds for PAWS Queries
         self.service = service        # This is the SXML Service Name (ie: UcmRisPortToolkit, UcmServiceabilityToolkit, UcmPerfMonToolkit)
         self.sxml_logging = False     # This controls the SOAP Logging
-        self.service_map = {          # This maps Service Names to Service Test URLs and axltoolkit Classes
+        self.ris_max_returned_devices = RIS_MAX_RETURNED_DEVICES  # Devices (and SelectItems) per selectCmDevice request
+        self.ris_quota = get_request_quota(host, 'realtimeservice2')  # RisPort70 requests per minute, shared per host
+        self.ris_quota_timeout = 120  # Maximum seconds a selectCmDevice request waits for the RisPort70 quota
+        self.ris_snapshot_interval = 60   # Seconds between background registration snapshot refreshes, 0 disables them
+        self.ris_snapshot_max_age = 120   # Default staleness bound in seconds of the registration snapshot searches
+        self.ris_snapshot_quota_share = 0.5  # Share of ris_quota the registration snapshot requests may use
+        self._ris_snapshot = None         # Current registration snapshot (RisDeviceIndex)
+        self._ris_snapshot_error = None   # Error of the last failed registration snapshot refresh
+        self._ris_snapshot_last_request = None  # time.monotonic() of the last registration snapshot request
+        self._ris_snapshot_lock = threading.Lock()
+        self._ris_snapshot_refresh_lock = threading.Lock()
+        self._ris_snapshot_wake = threading.Event()  # Set to have the background thread refresh the snapshot now
+        self._ris_snapshot_thread = None
+        self.perfmon_sessions = PerfMonSessionPool(  # Open PerfMon sessions, reused across counter queries
+            self.perfmon_open_session, self.perfmon_add_counter, self.perfmon_collect_session_data,
+            self.perfmon_close_session, maxsize=10, idle_timeout=600)
+        self.perfmon_history_counters = list(PERFMON_HISTORY_COUNTERS)  # Counters sampled for perfmon_history
+        self.perfmon_history_interval = 30     # Seconds between two perfmon_history samples
+        self.perfmon_history_capacity = 2880   # Samples kept per counter (24 hours every 30 seconds)
+        self.perfmon_collector = None          # Background PerfMonCollector, started by perfmon_history_start
+        self._perfmon_collector_lock = threading.Lock()
+        self.cdr_quota = get_request_quota(host, 'CDRonDemandService2', requests=10)  # CDR on Demand requests per minute
+        self.cdr_quota_timeout = 120      # Maximum seconds a CDR on Demand request waits for the quota
+        self.cdr_sftp_host = None         # SFTP server CUCM sends the CDR on Demand files to
+        self.cdr_sftp_username = None     # SFTP server username
+        self.cdr_sftp_password = None     # SFTP server password
+        self.cdr_sftp_folder = None       # Folder of the CDR on Demand files on the SFTP server
+        self.cdr_spool_folder = None      # Local folder of the CDR on Demand files (default: cdr_sftp_folder)
+        self.cdr_store_path = '/tmp/cucm_cdr.db'  # SQLite database of the ingested CDR / CMR records
+        self.cdr_ingestor = None          # CDRIngestor, created by the first cdr_ingest
+        self._cdr_ingestor_lock = threading.Lock()
+        self.service_map = {          # This maps Service Names to axltoolkit Classes
             "realtimeservice2": {
-                "service_test_url": "/realtimeservice2/services/listServices",
                 "toolkit": UcmRisPortToolkit
             },
             "controlcenterservice2": {
-                "service_test_url": "/controlcenterservice2/services/listServices",
                 "toolkit": UcmServiceabilityToolkit
             },
             "CDRonDemandService2": {
-                "service_test_url": "/CDRonDemandService2/services/listServices",
-                "toolkit": ""
+                "toolkit": UcmCDRonDemandToolkit
             },
             "logcollectionservice2": {
-                "service_test_url": "/logcollectionservice2/services/listServices",
-                "toolkit": ""
+                "toolkit": UcmLogCollectionToolkit
             },
             "logcollectionservice": {
-                "service_test_url": "/logcollectionservice/services",
-                "toolkit": ""
+                "toolkit": UcmDimeGetFileToolkit
             },
             "perfmonservice2": {
-                "service_test_url": "/perfmonservice2/services/listServices",
                 "toolkit": UcmPerfMonToolkit
             }
         }
@@ -425,15 +1116,18 @@ class SXML:
         @staticmethod
         def sxml_setup(service=None):
             """
-            Decorator method that checks if we already have a client session setup and the right type/instance
-            if not initiates SXML._sxml_setup() with the chosen SXML service, and then executes the original
-            decorated class method and returns its return value.
+            Decorator method that checks if we already have a client setup for the chosen SXML service, if not
+            initiates SXML._sxml_setup() with it, selects it as self.sxmlclient for the current thread, and then
+            executes the original decorated class method and returns its return value.
+
+            Clients are kept per service, so calls alternating between services (ie: RisPort and PerfMon) reuse them.
             """
             def decorator(func):
                 @functools.wraps(func)
                 def sxml_setup_check(self, *args, **kwargs):
-                    if not isinstance(self.sxmlclient, self.service_map[service]['toolkit']):
+                    if service not in self.sxmlclients:
                         self._sxml_setup(service=service)
+                    self._sxml_local.service = service
                     value = func(self, *args, **kwargs)
                     return value
                 return sxml_setup_check
@@ -459,35 +1153,256 @@ class SXML:
 
     def _sxml_setup(self, service=None):
         """
-        Internal SXML Class method which Tests and establishes SXML connection to a given VOS device.
+        Internal SXML Class method which establishes SXML connection to a given VOS device.
 
-        If given SXML Service is up and if user is authenticated initializes self.sxmlclient with a mapped axltoolkit
-        class for the chosen SXML API Service (ie: UcmRisPortToolkit, UcmServiceabilityToolkit, UcmPerfMonToolkit)
+        Adds a client of the mapped axltoolkit class for the chosen SXML API Service (ie: UcmRisPortToolkit,
+        UcmServiceabilityToolkit, UcmPerfMonToolkit) to self.sxmlclients. Clients share the host's HTTP Session (see
+        get_http_session) and the parsed WSDLs (see wsdl_document_cache).
 
-        If given SXML Service is not running or if user is not authorized Raise Exception with appropriate error.
+        If given SXML Service is not running or if user is not authorized (WSDL download failure) Raise Exception with
+        appropriate error.
 
         """
-        sxml_test_url = "https://" + self.host + self.service_map[service]['service_test_url']
-        r = requests.get(sxml_test_url,
-                         auth=(self.username, self.password),
-                         timeout=self.sxml_timeout,
-                         verify=self.sxml_tls_verify)
-        if r.status_code == 404:
-            raise Exception("SXML Services Not Running: " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 401:
-            raise Exception("SXML Authentication error " + str(r.status_code) + " - " + r.reason)
-        if r.status_code == 200:
-            self.sxmlclient = self.service_map[service]['toolkit'](
+        with self._sxml_setup_lock:
+            if service in self.sxmlclients:
+                return
+            if not self.service_map[service]['toolkit']:
+                raise Exception("SXML Service not supported: " + service)
+            try:
+                self.sxmlclients[service] = self.service_map[service]['toolkit'](
                     username=self.username, password=self.password, server_ip=self.host, tls_verify=self.sxml_tls_verify,
                     timeout=self.sxml_timeout, logging_enabled=self.sxml_logging)
-        else:
-            raise Exception("SXML Connectivity Exception:" + str(r.status_code) + " - " + r.reason)
+            except requests.exceptions.HTTPError as e:
+                raise Exception(http_setup_error("SXML", e.response))
+
+    @property
+    def sxmlclient(self):
+        """
+        The SXML Client Object of the service selected by the current thread's request (see sxml_setup), or of the
+        SXML object's own service
+        """
+        return self.sxmlclients.get(getattr(self._sxml_local, 'service', None) or self.service)
 
     @Decorators.sxml_result_check
     @Decorators.sxml_setup(service="realtimeservice2")
     def ris_query(self, search_criteria=None):
+        self.ris_quota.acquire(timeout=self.ris_quota_timeout)
         return self.sxmlclient.get_service().selectCmDevice(StateInfo='', CmSelectionCriteria=search_criteria)
 
+    @Decorators.sxml_result_check
+    @Decorators.sxml_setup(service="realtimeservice2")
+    def ris_select_cm_device(self, search_criteria=None, state_info=''):
+        self.ris_quota.acquire(timeout=self.ris_quota_timeout)
+        return self.sxmlclient.get_service().selectCmDevice(StateInfo=state_info, CmSelectionCriteria=search_criteria)
+
+    def ris_iter_devices(self, search_criteria=None):
+        """
+        Generator running as many selectCmDevice requests as needed to return every device matching the search
+        criteria, yielding a (node name, device) tuple for each device of each node as soon as its response arrives.
+
+        SelectItems are not limited to 1000 items: they are split into chunks of ris_max_returned_devices items, and
+        chunks matching more devices than one response holds (ie: wildcards) are walked with StateInfo. Every request
+        waits for the RisPort70 quota (ris_quota) shared by all callers of the same server.
+
+        :param search_criteria: The CmSelectionCriteria (SelectBy, SelectItems, Status, DeviceClass, Model...),
+                                MaxReturnedDevices is ignored. SelectItems may be given as [{'item': 'SEP...'}, ...]
+                                or as a list of strings.
+        :type search_criteria: dict
+        :returns: return a generator of (node name, device) tuples
+        :rtype: Iterator[tuple]
+        """
+        criteria = dict(search_criteria or {})
+        select_items = [item['item'] if isinstance(item, dict) else item for item in criteria.get('SelectItems') or []]
+        criteria['MaxReturnedDevices'] = self.ris_max_returned_devices
+        for chunk in ris_select_items_chunks(select_items, self.ris_max_returned_devices):
+            criteria['SelectItems'] = [{'item': item} for item in chunk]
+            state_info = ''
+            while True:
+                ris_result = self.ris_select_cm_device(search_criteria=criteria, state_info=state_info)
+                returned = 0
+                for node_name, device in ris_cm_devices(ris_result):
+                    returned += 1
+                    yield node_name, device
+                next_state_info = ris_result.get('StateInfo')
+                # A response that is not full is the last one of the chunk
+                if returned < self.ris_max_returned_devices or not next_state_info or next_state_info == state_info:
+                    break
+                state_info = next_state_info
+
+    def ris_device_index(self, search_criteria=None):
+        """
+        Returns a device name -> device dict of every device matching the search criteria (see ris_iter_devices),
+        merging the records of devices listed by several nodes (see ris_merge_device)
+        """
+        index = {}
+        for node_name, device in self.ris_iter_devices(search_criteria=search_criteria):
+            ris_merge_device(index, node_name, device)
+        return index
+
+    def ris_device_search(self, search_criteria=None):
+        """
+        Same as ris_query, without the 1000 devices limit: returns a selectCmDevice response holding the merged
+        results of all the requests needed (see ris_device_index)
+        """
+        return ris_select_cm_device_result(self.ris_device_index(search_criteria=search_criteria).values())
+
+    def _ris_snapshot_request(self, search_criteria, state_info):
+        """
+        Sends a selectCmDevice request of a registration snapshot refresh, at most one every ris_quota.period /
+        (ris_quota.requests * ris_snapshot_quota_share) seconds, so that refreshing the snapshot of a large cluster
+        (one request per 1000 devices) leaves the rest of the RisPort70 quota to the other requests
+        """
+        gap = self._ris_snapshot_request_gap()
+        if self._ris_snapshot_last_request is not None:
+            wait = self._ris_snapshot_last_request + gap - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        self._ris_snapshot_last_request = time.monotonic()
+        return self.ris_select_cm_device(search_criteria=search_criteria, state_info=state_info)
+
+    def _ris_snapshot_request_gap(self):
+        return self.ris_quota.period / max(self.ris_quota.requests * self.ris_snapshot_quota_share, 1e-3)
+
+    def ris_snapshot_refresh(self, max_age=None):
+        """
+        Refreshes the cluster-wide registration snapshot (every device, any status) and returns it. With max_age, a
+        snapshot refreshed by another caller in the meantime and younger than max_age seconds is returned as-is.
+
+        If the previous snapshot fitted in a single selectCmDevice response, a delta refresh sends its StateInfo:
+        nodes reporting NoChange keep their devices and only the changed nodes' devices are replaced. Otherwise, or
+        if the delta response is full, every device is read again, walking the responses with StateInfo. The
+        requests are paced to ris_snapshot_quota_share of the RisPort70 quota (see _ris_snapshot_request).
+
+        The current snapshot keeps being served while the new one is built, it is replaced once the refresh is over.
+        """
+        criteria = {'SelectBy': 'Name', 'Status': 'Any', 'SelectItems': [{'item': '*'}],
+                    'MaxReturnedDevices': self.ris_max_returned_devices}
+        with self._ris_snapshot_refresh_lock:
+            snapshot = self._ris_snapshot
+            if max_age is not None and snapshot is not None and snapshot.age() <= max_age:
+                return snapshot
+            requests = 0
+            try:
+                nodes = None
+                if snapshot is not None and snapshot.complete:
+                    nodes = dict(snapshot.nodes)
+                    state_info = snapshot.state_info
+                    ris_result = self._ris_snapshot_request(criteria, state_info)
+                    requests += 1
+                    cm_nodes = (ris_result.get('SelectCmDeviceResult') or {}).get('CmNodes') or {}
+                    for cm_node in cm_nodes.get('item') or []:
+                        if cm_node.get('ReturnCode') == 'Ok' and not cm_node.get('NoChange'):
+                            nodes[cm_node.get('Name')] = (cm_node.get('CmDevices') or {}).get('item') or []
+                    state_info = ris_result.get('StateInfo') or ''
+                    complete = sum(len(node_devices) for node_devices in nodes.values()) < \
+                        self.ris_max_returned_devices
+                    if not complete:
+                        nodes = None
+                if nodes is None:
+                    nodes = {}
+                    state_info = ''
+                    pages = 0
+                    while True:
+                        ris_result = self._ris_snapshot_request(criteria, state_info)
+                        requests += 1
+                        pages += 1
+                        returned = 0
+                        for node_name, device in ris_cm_devices(ris_result):
+                            nodes.setdefault(node_name, []).append(device)
+                            returned += 1
+                        next_state_info = ris_result.get('StateInfo') or ''
+                        if returned < self.ris_max_returned_devices or not next_state_info or \
+                                next_state_info == state_info:
+                            state_info = next_state_info
+                            break
+                        state_info = next_state_info
+                    complete = pages == 1
+            except Exception as e:
+                self._ris_snapshot_error = str(e)
+                raise
+            # The snapshot is as old as the end of the refresh: a paced refresh of a large cluster takes minutes
+            snapshot = RisDeviceIndex(nodes, state_info=state_info, complete=complete and bool(state_info),
+                                      updated=time.monotonic(), requests=requests)
+            with self._ris_snapshot_lock:
+                self._ris_snapshot = snapshot
+                self._ris_snapshot_error = None
+            return snapshot
+
+    def ris_snapshot(self, max_age=None):
+        """
+        Returns the cluster-wide registration snapshot (RisDeviceIndex). The first call starts the background refresh
+        thread (every ris_snapshot_interval seconds), so searches are served without waiting for CUCM.
+
+        A snapshot older than max_age seconds (default: ris_snapshot_max_age) is still returned while the background
+        thread is woken up to refresh it (stale-while-revalidate). The caller only waits for CUCM when there is no
+        snapshot yet, or when the background refresh is disabled. max_age is raised to the paced refresh time of the
+        cluster (see ris_snapshot_refresh_time), no snapshot can be younger than that.
+
+        :param max_age: (optional) Staleness bound in seconds
+        :type max_age: float
+        :returns: return the registration snapshot
+        :rtype: RisDeviceIndex
+        """
+        if max_age is None:
+            max_age = self.ris_snapshot_max_age
+        max_age = max(max_age, self.ris_snapshot_refresh_time())
+        self._ris_snapshot_start()
+        snapshot = self._ris_snapshot
+        if snapshot is None or (snapshot.age() > max_age and not self.ris_snapshot_interval):
+            snapshot = self.ris_snapshot_refresh(max_age=max_age)
+        elif snapshot.age() > max_age and not self._ris_snapshot_refresh_lock.locked():
+            self._ris_snapshot_wake.set()
+        return snapshot
+
+    def ris_snapshot_refresh_time(self):
+        """
+        Returns the number of seconds the last registration snapshot refresh takes once paced to
+        ris_snapshot_quota_share of the RisPort70 quota (one request per 1000 devices, see _ris_snapshot_request)
+        """
+        snapshot = self._ris_snapshot
+        if snapshot is None:
+            return 0
+        return max(snapshot.requests - 1, 0) * self._ris_snapshot_request_gap()
+
+    def _ris_snapshot_start(self):
+        """
+        Starts the background registration snapshot refresh thread, unless it is running or disabled
+        """
+        if not self.ris_snapshot_interval or self._ris_snapshot_thread is not None:
+            return
+        with self._ris_snapshot_lock:
+            if self._ris_snapshot_thread is None:
+                self._ris_snapshot_thread = threading.Thread(target=self._ris_snapshot_refresher,
+                                                             name='ris-snapshot', daemon=True)
+                self._ris_snapshot_thread.start()
+
+    def _ris_snapshot_refresher(self):
+        while self.ris_snapshot_interval:
+            snapshot = self._ris_snapshot
+            # The first snapshot is taken by the caller that started the thread, ris_snapshot wakes the thread up
+            # when a caller found the snapshot older than its max_age
+            wait = self.ris_snapshot_interval - (snapshot.age() if snapshot is not None else 0)
+            if wait > 0 and not self._ris_snapshot_wake.is_set():
+                self._ris_snapshot_wake.wait(wait)
+                continue
+            self._ris_snapshot_wake.clear()
+            try:
+                self.ris_snapshot_refresh()
+            except Exception:
+                # The error is reported by ris_snapshot_stats, retry at the next interval
+                time.sleep(self.ris_snapshot_interval)
+        self._ris_snapshot_thread = None
+
+    def ris_snapshot_stats(self):
+        """
+        Returns the registration snapshot age, size, status counts and last refresh error, and the RisPort70 quota
+        """
+        snapshot = self._ris_snapshot
+        return {'snapshot': snapshot.stats() if snapshot is not None else None,
+                'refresh_time': round(self.ris_snapshot_refresh_time(), 1),
+                'error': self._ris_snapshot_error,
+                'quota': self.ris_quota.stats()}
+
     @Decorators.sxml_result_check
     @Decorators.sxml_setup(service="controlcenterservice2")
     def ccs_get_service_status(self, service_list=None):
@@ -522,3 +1437,412 @@ class SXML:
     @Decorators.sxml_setup(service="perfmonservice2")
     def perfmon_collect_session_data(self, session_handle=None):
         return self.sxmlclient.perfmon_collect_session_data(session_handle)
+
+    def perfmon_query_counters(self, counters=None, host=None):
+        """
+        Returns the values of PerfMon counters from a pooled PerfMon session (see PerfMonSessionPool), so that
+        repeated queries of the same counters neither open a new session nor wait between two samples for
+        percentage counters
+
+        :param counters: The counters (Object + Instance + Name, ie: Cisco CallManager\\RegisteredHardwarePhones)
+        :param host: (optional) The host to query the counters of (default: the SXML host)
+        :type counters: list
+        :type host: str
+        :returns: return the counter values (perfmonCollectSessionData result)
+        :rtype: list
+        """
+        if host is None:
+            host = self.host
+        return self.perfmon_sessions.collect([f"\\\\{host}\\" + counter for counter in counters])
+
+    def perfmon_history_start(self):
+        """
+        Starts the background PerfMonCollector sampling the perfmon_history_counters every perfmon_history_interval
+        seconds, unless it is running. Called when the application starts, so that the history already covers the
+        time before the first perfmon_history query. Counters changed afterwards apply once the collector is rebuilt.
+
+        :returns: return the collector
+        :rtype: PerfMonCollector
+        """
+        with self._perfmon_collector_lock:
+            if self.perfmon_collector is None:
+                self.perfmon_collector = PerfMonCollector(self.perfmon_query_counters, self.perfmon_history_counters,
+                                                          interval=self.perfmon_history_interval,
+                                                          capacity=self.perfmon_history_capacity)
+        self.perfmon_collector.start()
+        return self.perfmon_collector
+
+    def perfmon_history(self, counters=None, since=None, points=None):
+        """
+        Returns the sampled history of the perfmon_history_counters as Chart.js datasets (see PerfMonCollector),
+        starting the background collector if it is not running (see perfmon_history_start).
+
+        :param counters: (optional) Counters to return (default: every perfmon_history_counters counter)
+        :param since: (optional) Only samples taken at or after since (epoch seconds)
+        :param points: (optional) Maximum points per counter, longer series are downsampled
+        :type counters: list
+        :type since: float
+        :type points: int
+        :returns: return the datasets
+        :rtype: list
+        """
+        return self.perfmon_history_start().history(counters=counters, since=since, points=points)
+
+    def perfmon_stats(self):
+        """
+        Returns the PerfMon session pool and background collector statistics
+        """
+        return {'sessions': self.perfmon_sessions.stats(),
+                'collector': self.perfmon_collector.stats() if self.perfmon_collector is not None else None}
+
+    @Decorators.sxml_result_check
+    @Decorators.sxml_setup(service="CDRonDemandService2")
+    def cdr_get_file_list(self, from_time=None, to_time=None):
+        self.cdr_quota.acquire(timeout=self.cdr_quota_timeout)
+        return self.sxmlclient.get_file_list(from_time, to_time)
+
+    @Decorators.sxml_result_check
+    @Decorators.sxml_setup(service="CDRonDemandService2")
+    def cdr_get_file(self, from_time=None, to_time=None, file_name=None):
+        if not self.cdr_sftp_host:
+            raise Exception("CDR on Demand SFTP server not configured")
+        self.cdr_quota.acquire(timeout=self.cdr_quota_timeout)
+        return self.sxmlclient.get_file(self.cdr_sftp_host, self.cdr_sftp_username, self.cdr_sftp_password, from_time,
+                                        to_time, self.cdr_sftp_folder, file_name)
+
+    def _cdr_ingestor(self):
+        if self.cdr_ingestor is None:
+            with self._cdr_ingestor_lock:
+                if self.cdr_ingestor is None:
+                    self.cdr_ingestor = CDRIngestor(CDRStore(self.cdr_store_path), self.cdr_get_file_list,
+                                                    self.cdr_get_file, self.cdr_spool_folder or self.cdr_sftp_folder)
+        return self.cdr_ingestor
+
+    def cdr_ingest(self, max_windows=24):
+        """
+        Starts the background ingestion of the CDR on Demand files from the last checkpoint (see CDRIngestor.poll),
+        which polls right away and then every CDRIngestor.interval seconds. Progress is reported by cdr_stats
+
+        :param max_windows: (optional) Maximum number of one hour windows ingested by each poll (default: 24)
+        :type max_windows: int
+        :returns: return the ingestion statistics (see cdr_stats)
+        :rtype: dict
+        """
+        ingestor = self._cdr_ingestor()
+        ingestor.max_windows = max_windows
+        ingestor.start(poll_now=True)
+        return self.cdr_stats()
+
+    def cdr_summary(self, since=None, until=None, top=10):
+        """
+        Returns the call aggregates of the ingested records (see CDRStore.summary)
+        """
+        return self._cdr_ingestor().store.summary(since=since, until=until, top=top)
+
+    def cdr_stats(self):
+        """
+        Returns the CDR ingestion and store statistics and the CDR on Demand quota
+        """
+        return dict(self._cdr_ingestor().stats(), quota=self.cdr_quota.stats())
+
+    @Decorators.sxml_result_check
+    @Decorators.sxml_setup(service="logcollectionservice2")
+    def log_select_files(self, service_logs=None, system_logs=None, minutes=60, search_str=''):
+        return self.sxmlclient.select_log_files(service_logs=service_logs, system_logs=system_logs, rel_text='Minutes',
+                                                rel_time=minutes, search_str=search_str)
+
+    def log_list_files(self, service_logs=None, system_logs=None, minutes=60, search_str=''):
+        """
+        Returns the log files of the selected services / system logs modified within the last minutes (see log_files)
+
+        :param service_logs: (optional) Service log names (ie: Cisco CallManager)
+        :param system_logs: (optional) System log names (ie: Event Viewer-Application Log)
+        :param minutes: (optional) Only files modified within the last minutes (default: 60)
+        :param search_str: (optional) Only files whose name contains search_str
+        :type service_logs: list
+        :type system_logs: list
+        :type minutes: int
+        :type search_str: str
+        :returns: return the files (name, absolutepath, filesize, modifiedDate)
+        :rtype: list
+        """
+        return log_files(self.log_select_files(service_logs=service_logs, system_logs=system_logs, minutes=minutes,
+                                               search_str=search_str))
+
+    @Decorators.sxml_setup(service="logcollectionservice")
+    def log_get_file(self, file_name=None, offset=0):
+        """
+        Returns a generator of the file content chunks, streamed from the server (see
+        UcmDimeGetFileToolkit.get_one_file). The request is sent when the first chunk is read.
+        """
+        return self.sxmlclient.get_one_file(file_name, offset=offset)
+
+    def log_download_file(self, file_name=None, path=None, size=None):
+        """
+        Downloads a file to the local path, resuming a previous partial download (see log_download)
+        """
+        return log_download(self.log_get_file, file_name, path, size=size)
+
+
+class SXMLCluster:
+    """
+    Serviceability XML API calls fanned out to every node of a CUCM cluster
+
+    Cluster nodes are discovered with a Thin AXL query of the processnode table on the publisher. A call (ie:
+    perfmon_query_counters, ccs_get_service_status) is sent to the SXML service of every node concurrently, each node
+    having its own SXML object, so that a cluster-wide view takes as long as the slowest node rather than the sum of
+    all nodes.
+
+    :param axl: The AXL object of the publisher, used to discover the cluster nodes
+    :param username: The username of an account with access to the API on every node.
+    :param password: The password for your user account
+    :type axl: AXL
+    :type username: String
+    :type password: String
+    :returns: return an SXMLCluster object
+    :rtype: SXMLCluster
+    """
+
+    def __init__(self, axl, username, password):
+        self.axl = axl
+        self.username = username
+        self.password = password
+        self.cluster_nodes_ttl = 300        # Seconds the discovered cluster nodes are cached for
+        self.cluster_node_roles = ['1']     # processnode roles (tkprocessnoderole) queried: 1 CUCM, 2 IM and Presence
+        self.fanout_timeout = 15            # Seconds each node has to answer a fanned out call
+        self.fanout_workers = 16            # Maximum number of nodes queried at the same time
+        self._cluster_nodes = None          # (discovery time, node list)
+        self._sxml = {}                     # (node, service) -> SXML object
+        self.log_download_folder = '/tmp/cucm_logs'  # Local folder of downloaded log files (folder/node/file path)
+        self.log_download_workers = 4       # Maximum number of log files downloaded at the same time
+        self.log_download_jobs_kept = 20    # Log download jobs kept for their status (oldest finished ones dropped)
+        self._log_jobs = OrderedDict()      # job id -> log download job status
+        self._lock = threading.Lock()
+        self._executor = None
+        self._log_executor = None
+
+    def cluster_nodes(self):
+        """
+        Returns the names (hostnames / IP addresses) of the cluster nodes, discovered with Thin AXL
+        and cached for cluster_nodes_ttl seconds. If the discovery fails, the publisher (AXL host) alone is returned.
+        """
+        with self._lock:
+            if self._cluster_nodes is not None and time.monotonic() - self._cluster_nodes[0] < self.cluster_nodes_ttl:
+                return list(self._cluster_nodes[1])
+        query = "select name, tkprocessnoderole from processnode where systemnode = 'f' and tkprocessnoderole in " \
+                "({0}) order by pkid".format(sql.sql_in_list(self.cluster_node_roles))
+        try:
+            nodes = self.axl.sql_query(query)['columns'].get('name') or [self.axl.host]
+        except Exception:
+            # Retry the discovery at the next call
+            return [self.axl.host]
+        # The SXML clients of the nodes are built with the publisher's CUCM version (see versioned_wsdl)
+        ccm_version_registry.set_publisher(nodes, self.axl.host)
+        with self._lock:
+            self._cluster_nodes = (time.monotonic(), nodes)
+        return list(nodes)
+
+    def check_nodes(self, nodes):
+        """
+        Raises an Exception if one of the nodes is not a cluster node (see cluster_nodes). Node names come from API
+        requests: an SXML object sends the cluster credentials to its node, it must never be created for another host.
+        """
+        cluster_nodes = {cluster_node.lower() for cluster_node in self.cluster_nodes()}
+        unknown_nodes = [node for node in nodes if str(node).lower() not in cluster_nodes]
+        if unknown_nodes:
+            raise Exception(f"Not a cluster node: {', '.join(map(str, unknown_nodes))}")
+
+    def node(self, node, service):
+        """
+        Returns the SXML object of a cluster node's service, creating it on first use. Raises an Exception if node is
+        not a cluster node.
+        """
+        self.check_nodes([node])
+        with self._lock:
+            sxml = self._sxml.get((node, service))
+            if sxml is None:
+                sxml = self._sxml[(node, service)] = SXML(node, self.username, self.password, service)
+            return sxml
+
+    def fan_out(self, service, method, *args, nodes=None, timeout=None, **kwargs):
+        """
+        Calls an SXML method on every cluster node concurrently and returns the result of each node, in node order:
+        [{'node': node, 'success': True, 'message': '...', 'latency': 0.123, 'result': ...}, ...]
+
+        A node failing or not answering within timeout seconds only fails its own result.
+
+        :param service: The SXML API Service Name (ie: perfmonservice2)
+        :param method: The SXML method name (ie: perfmon_query_counters)
+        :param nodes: (optional) The nodes to query (default: every cluster node, see cluster_nodes)
+        :param timeout: (optional) Seconds each node has to answer (default: fanout_timeout)
+        :type service: str
+        :type method: str
+        :type nodes: list
+        :type timeout: float
+        :returns: return the per node results. Raises an Exception if one of the nodes is not a cluster node.
+        :rtype: list
+        """
+        if nodes is None:
+            nodes = self.cluster_nodes()
+        else:
+            self.check_nodes(nodes)
+        if timeout is None:
+            timeout = self.fanout_timeout
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.fanout_workers, thread_name_prefix='sxml-fanout')
+            executor = self._executor
+
+        def call(node):
+            start = time.monotonic()
+            try:
+                result = getattr(self.node(node, service), method)(*args, **kwargs)
+            except Exception as e:
+                return {'node': node, 'success': False, 'message': str(e),
+                        'latency': round(time.monotonic() - start, 3), 'result': None}
+            return {'node': node, 'success': True, 'message': "Node Results Retrieved Successfully",
+                    'latency': round(time.monotonic() - start, 3), 'result': result}
+
+        futures = [executor.submit(call, node) for node in nodes]
+        wait(futures, timeout=timeout)
+        results = []
+        for node, future in zip(nodes, futures):
+            if future.done():
+                results.append(future.result())
+            else:
+                # The request keeps running in the background, its result is dropped
+                future.cancel()
+                message = f"Node did not answer within {timeout} seconds"
+                results.append({'node': node, 'success': False, 'message': message, 'latency': None, 'result': None})
+        return results
+
+    def perfmon_query_counters(self, counters=None, nodes=None, timeout=None):
+        """
+        Returns the values of PerfMon counters of every cluster node (see SXML.perfmon_query_counters and fan_out)
+        """
+        return self.fan_out('perfmonservice2', 'perfmon_query_counters', counters=counters, nodes=nodes,
+                            timeout=timeout)
+
+    def ccs_get_service_status(self, service_list=None, nodes=None, timeout=None):
+        """
+        Returns the service status of every cluster node (see SXML.ccs_get_service_status and fan_out)
+        """
+        return self.fan_out('controlcenterservice2', 'ccs_get_service_status', service_list=service_list,
+                            nodes=nodes, timeout=timeout)
+
+    def log_list_files(self, service_logs=None, system_logs=None, minutes=60, search_str='', nodes=None,
+                       timeout=None):
+        """
+        Returns the log files of every cluster node (see SXML.log_list_files and fan_out)
+        """
+        return self.fan_out('logcollectionservice2', 'log_list_files', service_logs=service_logs,
+                            system_logs=system_logs, minutes=minutes, search_str=search_str, nodes=nodes,
+                            timeout=timeout)
+
+    def log_get_file(self, node, file_name, offset=0):
+        """
+        Returns a generator of the content chunks of a node's file (see SXML.log_get_file)
+        """
+        return self.node(node, 'logcollectionservice').log_get_file(file_name, offset=offset)
+
+    def log_download_start(self, service_logs=None, system_logs=None, minutes=60, search_str='', nodes=None,
+                           timeout=None):
+        """
+        Starts downloading the log files of every cluster node in the background (see log_download) and returns the
+        job status, the download progress is then read with log_download_job. Raises an Exception if one of the nodes
+        is not a cluster node.
+        """
+        if nodes is not None:
+            self.check_nodes(nodes)
+        job = {'id': uuid.uuid4().hex, 'state': 'running', 'message': "Log Files Download Running",
+               'started': time.time(), 'finished': None, 'folder': self.log_download_folder, 'nodes': None,
+               'files_total': None, 'files_done': 0, 'files_failed': 0, 'bytes_downloaded': 0, 'files': []}
+        with self._lock:
+            self._log_jobs[job['id']] = job
+            finished_jobs = [job_id for job_id, log_job in self._log_jobs.items() if log_job['state'] != 'running']
+            for job_id in finished_jobs[:max(0, len(self._log_jobs) - self.log_download_jobs_kept)]:
+                del self._log_jobs[job_id]
+
+        def run():
+            try:
+                self.log_download(service_logs=service_logs, system_logs=system_logs, minutes=minutes,
+                                  search_str=search_str, nodes=nodes, timeout=timeout, job=job)
+                state, message = 'done', "Log Files Downloaded"
+            except Exception as e:
+                state, message = 'failed', str(e)
+            with self._lock:
+                job.update(state=state, message=message, finished=time.time())
+
+        threading.Thread(target=run, name='sxml-log-download', daemon=True).start()
+        return self.log_download_job(job['id'])
+
+    def log_download_job(self, job_id=None):
+        """
+        Returns the status of a log download job (see log_download_start), None if there is no such job, or the
+        status of every job (without their file results) if job_id is not supplied
+        """
+        with self._lock:
+            if job_id is None:
+                return [dict(job, files=None) for job in self._log_jobs.values()]
+            job = self._log_jobs.get(job_id)
+            return dict(job, files=list(job['files'])) if job is not None else None
+
+    def log_download(self, service_logs=None, system_logs=None, minutes=60, search_str='', nodes=None,
+                     timeout=None, job=None):
+        """
+        Downloads the log files of every cluster node to log_download_folder/node/file path, log_download_workers
+        files at a time. Files already downloaded are skipped and partial downloads are resumed (see log_download).
+        Files may take long to download: API requests use log_download_start to run this in the background.
+
+        :param service_logs: (optional) Service log names (ie: Cisco CallManager)
+        :param system_logs: (optional) System log names (ie: Event Viewer-Application Log)
+        :param minutes: (optional) Only files modified within the last minutes (default: 60)
+        :param search_str: (optional) Only files whose name contains search_str
+        :param nodes: (optional) The nodes to download the files of (default: every cluster node)
+        :param timeout: (optional) Seconds each node has to list its files (default: fanout_timeout)
+        :param job: (optional) The job status updated as the files are downloaded (see log_download_start)
+        :type service_logs: list
+        :type system_logs: list
+        :type minutes: int
+        :type search_str: str
+        :type nodes: list
+        :type timeout: float
+        :type job: dict
+        :returns: return the file listing result of each node and the download result of each file
+        :rtype: dict
+        """
+        node_results = self.log_list_files(service_logs=service_logs, system_logs=system_logs, minutes=minutes,
+                                           search_str=search_str, nodes=nodes, timeout=timeout)
+        with self._lock:
+            if self._log_executor is None:
+                self._log_executor = ThreadPoolExecutor(max_workers=self.log_download_workers,
+                                                        thread_name_prefix='sxml-logs')
+            executor = self._log_executor
+
+        def download(node, file_info):
+            file_name = file_info['absolutepath']
+            try:
+                path = log_file_path(self.log_download_folder, node, file_name)
+                result = self.node(node, 'logcollectionservice').log_download_file(file_name, path,
+                                                                                   size=file_info['filesize'])
+            except Exception as e:
+                result = {'node': node, 'file': file_name, 'success': False, 'message': str(e)}
+            else:
+                message = "File Already Downloaded" if result['skipped'] else "File Downloaded Successfully"
+                result = dict(result, node=node, file=file_name, success=True, message=message)
+            if job is not None:
+                with self._lock:
+                    job['files'].append(result)
+                    job['files_done' if result['success'] else 'files_failed'] += 1
+                    job['bytes_downloaded'] += result.get('downloaded', 0)
+            return result
+
+        node_summaries = [{'node': node_result['node'], 'success': node_result['success'],
+                           'message': node_result['message'], 'latency': node_result['latency'],
+                           'files': len(node_result['result'] or [])} for node_result in node_results]
+        if job is not None:
+            with self._lock:
+                job.update(nodes=node_summaries, files_total=sum(node['files'] for node in node_summaries))
+        futures = [executor.submit(download, node_result['node'], file_info)
+                   for node_result in node_results if node_result['success'] for file_info in node_result['result']]
+        return {'nodes': node_summaries, 'files': [future.result() for future in futures]}
@@ -1,7 +1,169 @@
+import asyncio
+import email.utils
+import random
+import sys
+import threading
+import time
+import aiohttp
+from lxml import etree
 from requests import get, post, put, delete, packages, request
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, HTTPError
 from requests.auth import HTTPBasicAuth
+from requests.models import Request, Response
+from requests.structures import CaseInsensitiveDict
 from requests import Session
+from urllib3.util.retry import Retry
+
+# Keep-alive connections kept open to the server, at most this many requests are sent at the same time without
+# opening (and then discarding) extra connections
+REST_POOL_MAXSIZE = 16
+
+# (connect, read) timeouts in seconds, a server that stops answering fails the request instead of blocking a thread
+REST_TIMEOUT = (5, 30)
+
+# Retries of failed connections, and of idempotent requests failing on a read error or a 429 / 502 / 503 / 504
+REST_RETRIES = 3
+REST_RETRY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+REST_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Longest wait in seconds before a retry, whatever the Retry-After header of the response asks for
+REST_RETRY_AFTER_MAX = 10.0
+
+# Requests of an AsyncREST object sent at the same time, further requests wait for one of them to complete
+ASYNC_REST_CONCURRENCY = 64
+
+
+# Namespace of the xml: prefix (ie: xml:lang), declared by every XML document
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+_xml_parsers = threading.local()
+
+
+def xml_root(content):
+    """
+    Parses an XML response body (bytes) with lxml and returns its root element. Comments and processing instructions
+    are dropped, entities are not resolved. Raises an lxml.etree.XMLSyntaxError if the content is not XML.
+    """
+    # lxml parsers must not be shared between threads
+    parser = getattr(_xml_parsers, 'parser', None)
+    if parser is None:
+        parser = etree.XMLParser(resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True)
+        _xml_parsers.parser = parser
+    return etree.fromstring(content, parser)
+
+
+def xml_to_dict(root, list_tags=()):
+    """
+    Converts an XML element into plain dicts, in a single pass and in the layout of xmltodict.parse:
+        - Attributes are '@name' keys, the text of an element with attributes or children is the '#text' key
+        - An element without attributes nor children is its text (None if empty)
+        - Repeated elements are a list, as are the elements named in list_tags (at any depth), even if single
+        - Namespaces are not processed: names keep the prefix of the document (ie: 'ns:user', '@ns:id') and namespace
+          declarations are '@xmlns' / '@xmlns:ns' attributes. Only a declaration below the root that no element or
+          attribute name uses, in a document without any namespaced name, is left out.
+
+    :param root: The XML element, ie: xml_root(response.content)
+    :param list_tags: (optional) Names of the elements always converted to a list (xmltodict force_list)
+    :type root: lxml.etree._Element
+    :type list_tags: Set
+    :returns: return a dictionary with the element name as the key
+    :rtype: Dict
+    """
+    # UDS and CMS don't use namespaces: documents are converted without looking up prefixes, unless a namespaced name
+    # shows up, in which case the conversion starts over with the (slower) namespace aware _xml_ns_value
+    if not root.nsmap:
+        try:
+            return {root.tag: _xml_value(root, list_tags)}
+        except _XMLNamespaced:
+            pass
+    return {_xml_ns_name(root): _xml_ns_value(root, list_tags, {})}
+
+
+class _XMLNamespaced(Exception):
+    pass
+
+
+def _xml_value(element, list_tags):
+    if element.tag[0] == '{':
+        raise _XMLNamespaced()
+    text = ((element.text or '') + ''.join(child.tail or '' for child in element)).strip()
+    if not len(element) and not element.attrib:
+        return text or None
+    # Names are interned: lxml returns a new string each time, thousands of elements would each keep a copy
+    value = {}
+    for name, attribute in element.attrib.items():
+        if name[0] == '{':
+            raise _XMLNamespaced()
+        value[sys.intern('@' + name)] = attribute
+    for child in element:
+        tag = sys.intern(child.tag)
+        child_value = _xml_value(child, list_tags)
+        if tag in value:
+            if isinstance(value[tag], list):
+                value[tag].append(child_value)
+            else:
+                value[tag] = [value[tag], child_value]
+        elif tag in list_tags:
+            value[tag] = [child_value]
+        else:
+            value[tag] = child_value
+    if text:
+        value['#text'] = text
+    return value
+
+
+def _xml_ns_name(element):
+    # lxml names namespaced elements {uri}name, the document (and xmltodict) prefix:name
+    localname = etree.QName(element).localname
+    return element.prefix + ':' + localname if element.prefix else localname
+
+
+def _xml_ns_value(element, list_tags, parent_nsmap):
+    nsmap = element.nsmap
+    prefixes = {uri: prefix for prefix, uri in nsmap.items() if prefix}
+    prefixes[XML_NAMESPACE] = 'xml'
+    value = {}
+    # Namespace declarations of the element itself, inherited ones are declared by an ancestor
+    for prefix, uri in nsmap.items():
+        if parent_nsmap.get(prefix) != uri:
+            value[sys.intern('@xmlns:' + prefix if prefix else '@xmlns')] = uri
+    for name, attribute in element.attrib.items():
+        if name[0] == '{':
+            uri, name = name[1:].split('}', 1)
+            if uri in prefixes:
+                name = prefixes[uri] + ':' + name
+        value[sys.intern('@' + name)] = attribute
+    text = ((element.text or '') + ''.join(child.tail or '' for child in element)).strip()
+    if not len(element) and not value:
+        return text or None
+    for child in element:
+        tag = sys.intern(_xml_ns_name(child))
+        child_value = _xml_ns_value(child, list_tags, nsmap)
+        if tag in value:
+            if isinstance(value[tag], list):
+                value[tag].append(child_value)
+            else:
+                value[tag] = [value[tag], child_value]
+        elif tag in list_tags:
+            value[tag] = [child_value]
+        else:
+            value[tag] = child_value
+    if text:
+        value['#text'] = text
+    return value
+
+
+class RESTRetry(Retry):
+    """
+    The RESTRetry class
+    urllib3 Retry honoring Retry-After headers for at most REST_RETRY_AFTER_MAX seconds: urllib3 sleeps for the whole
+    Retry-After value (backoff_max does not apply to it), which would block the thread for as long as the server asks.
+    """
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return min(retry_after, REST_RETRY_AFTER_MAX) if retry_after is not None else None
 
 
 class REST:
@@ -16,6 +178,9 @@ class REST:
     :param base_url: (optional) The base URL, such as "/api/v1" for a given API
     :param headers: (optional) A dictionary of header key/value pairs
     :param tls_verify: (optional) Whether certificate validation will be performed.
+    :param pool_maxsize: (optional) Maximum number of keep-alive connections to the server (default: 16)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
+    :param retries: (optional) Number of retries of failed connections and idempotent requests (default: 3)
     :type host: String
     :type username: String
     :type password: String
@@ -23,23 +188,46 @@ class REST:
     :type base_url: String
     :type headers: Dict
     :type tls_verify: Bool
+    :type pool_maxsize: Integer
+    :type timeout: Tuple
+    :type retries: Integer
     :returns: return an REST object
     :rtype: REST
     """
 
-    def __init__(self, host, username=None, password=None, base_url=None, headers={}, port=443, tls_verify=False):
+    def __init__(self, host, username=None, password=None, base_url=None, headers={}, port=443, tls_verify=False,
+                 pool_maxsize=REST_POOL_MAXSIZE, timeout=REST_TIMEOUT, retries=REST_RETRIES):
         """
         Initialize an object with the host, port, and base_url using the parameters passed in.
         """
         self.host = host
         self.port = str(port)
         self.base_url = base_url
+        self.timeout = timeout
 
         self.session = Session()
         self.session.auth = HTTPBasicAuth(username, password)
         self.session.verify = tls_verify
         self.session.headers.update(headers)
 
+        # Exponential backoff between retries (an immediate retry, then about 1s and 2s) with up to 0.5s of random
+        # jitter, so that threads failing together don't retry together. Retry-After headers (ie: 429) are honored, for
+        # at most REST_RETRY_AFTER_MAX seconds.
+        self.retry = RESTRetry(total=retries, connect=retries, read=retries, status=retries, other=0,
+                           allowed_methods=REST_RETRY_METHODS, status_forcelist=REST_RETRY_STATUSES,
+                           backoff_factor=0.5, backoff_jitter=0.5, backoff_max=10, raise_on_status=False)
+        # Requests to a single host: one connection pool holding up to pool_maxsize connections
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=self.retry)
+        self.session.mount('https://', self.adapter)
+
+        self._metrics_lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.latency = None
+
     def _send_request(self, api_method, parameters={}, payload=None, http_method='GET'):
         """
         Used to send a REST request using the desired http_method (GET, PUT, POST, DELETE) to the
@@ -70,16 +258,21 @@ class REST:
         url = "https://{}:{}{}/{}".format(self.host, self.port, self.base_url, api_method)
 
         # Send the request and handle RequestException that may occur
+        with self._metrics_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.monotonic()
+        raw_response = None
         try:
             if http_method in ['GET', 'POST', 'PUT', 'DELETE']:
                 if http_method == 'GET':
-                    raw_response = self.session.get(url, params=parameters)
+                    raw_response = self.session.get(url, params=parameters, timeout=self.timeout)
                 elif http_method == 'POST':
-                    raw_response = self.session.post(url, data=payload, params=parameters)
+                    raw_response = self.session.post(url, data=payload, params=parameters, timeout=self.timeout)
                 elif http_method == 'PUT':
-                    raw_response = self.session.put(url, data=payload, params=parameters)
+                    raw_response = self.session.put(url, data=payload, params=parameters, timeout=self.timeout)
                 elif http_method == 'DELETE':
-                    raw_response = self.session.delete(url)
+                    raw_response = self.session.delete(url, timeout=self.timeout)
 
                 result = {
                     'success': True,
@@ -91,8 +284,57 @@ class REST:
             result = {
                 'success': False,
                 'message': 'RequestException {} request to: {} :: {}'.format(http_method, url, e)}
+        finally:
+            self._record_request(time.monotonic() - start, raw_response, result['success'])
         return result
 
+    def _record_request(self, latency, raw_response, success):
+        # The urllib3 Retry object of the response holds one history entry per retried attempt
+        retry = getattr(getattr(raw_response, 'raw', None), 'retries', None)
+        with self._metrics_lock:
+            self.in_flight -= 1
+            self.requests += 1
+            if not success:
+                self.failures += 1
+            self.retries += len(getattr(retry, 'history', None) or ())
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def rest_stats(self):
+        """
+        Returns the connection pool usage and the request counters
+
+        :returns: return a dictionary with the following keys:
+           'pool_maxsize'  :rtype:Integer: Maximum number of keep-alive connections
+           'connections'   :rtype:Integer: Connections opened since the start (more than pool_maxsize means
+                                           requests beyond the pool size opened short-lived connections)
+           'idle'          :rtype:Integer: Open connections currently unused
+           'in_flight'     :rtype:Integer: Requests being sent
+           'max_in_flight' :rtype:Integer: Most requests sent at the same time
+           'requests', 'failures', 'retries' :rtype:Integer: Request counters
+           'latency'       :rtype:Float:   Moving average of the request latency in seconds
+        :rtype: Dict
+        """
+        connections = idle = 0
+        for pool_key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            # The pool queue holds the idle connections and None placeholders for the connections not opened yet
+            idle += sum(1 for connection in list(pool.pool.queue) if connection is not None) if pool.pool else 0
+        with self._metrics_lock:
+            return {
+                'pool_maxsize': self.adapter._pool_maxsize,
+                'connections': connections,
+                'idle': idle,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'latency': round(self.latency, 3) if self.latency is not None else None
+            }
+
     def _check_response(self, raw_response):
         """
         Evaluates a response status.  If it has a non-2XX value, then set the 'success' result
@@ -111,3 +353,236 @@ class REST:
             raw_response['success'] = False
             raw_response['message'] = 'HTTPError Exception: {}'.format(e)
         return raw_response
+
+
+class AsyncREST:
+    """
+    The AsyncREST class
+    The asyncio (aiohttp) variant of the REST class, to keep many requests in flight from a single thread:
+
+        async with AsyncCUPI(host, username, password) as cupi:
+            users = await asyncio.gather(*[cupi._cupi_request('users', parameters=p) for p in searches])
+
+    - At most concurrency requests are sent at the same time, further requests wait for their turn
+    - Timeouts and retries are the ones of the REST class, as are the results of _send_request: the response is a
+      requests Response, so the subclasses parse it with the same functions as their REST counterparts
+    - The aiohttp ClientSession is created on the first request and bound to the running event loop. Close it with
+      close() (or use the object as an async context manager) before the loop ends.
+
+    :param host: The Hostname / IP Address of the server
+    :param username: (optional) The username of an account with access to the API.
+    :param password: (optional) The password for your user account
+    :param base_url: (optional) The base URL, such as "/api/v1" for a given API
+    :param headers: (optional) A dictionary of header key/value pairs
+    :param port: (optional) The server port for API access (default: 443)
+    :param tls_verify: (optional) Whether certificate validation will be performed.
+    :param concurrency: (optional) Maximum number of requests sent at the same time (default: 64)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
+    :param retries: (optional) Number of retries of failed connections and idempotent requests (default: 3)
+    :type host: String
+    :type username: String
+    :type password: String
+    :type base_url: String
+    :type headers: Dict
+    :type port: Integer
+    :type tls_verify: Bool
+    :type concurrency: Integer
+    :type timeout: Tuple
+    :type retries: Integer
+    :returns: return an AsyncREST object
+    :rtype: AsyncREST
+    """
+
+    def __init__(self, host, username=None, password=None, base_url=None, headers={}, port=443, tls_verify=False,
+                 concurrency=ASYNC_REST_CONCURRENCY, timeout=REST_TIMEOUT, retries=REST_RETRIES):
+        """
+        Initialize an object with the host, port, and base_url using the parameters passed in.
+        """
+        self.host = host
+        self.port = str(port)
+        self.base_url = base_url
+        self.headers = dict(headers)
+        self.auth = aiohttp.BasicAuth(username, password or '') if username is not None else None
+        self.tls_verify = tls_verify
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.retry_count = retries
+
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.latency = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the aiohttp ClientSession and its connections
+        """
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    def _get_session(self):
+        # The session, its connections and the semaphore belong to the event loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency,
+                                             ssl=bool(self.tls_verify))
+            self._session = aiohttp.ClientSession(connector=connector, auth=self.auth, headers=self.headers,
+                                                  timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._session
+
+    @staticmethod
+    def _query_params(parameters):
+        # Like requests: parameters set to None are left out, lists are sent as repeated parameters
+        params = []
+        for key, value in (parameters or {}).items():
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                if item is not None:
+                    params.append((key, item if isinstance(item, str) else str(item)))
+        return params
+
+    @staticmethod
+    def _retry_after(headers):
+        # Retry-After header in seconds or as an HTTP date
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt):
+        # Same backoff as the Retry of the REST class: an immediate retry, then about 1s, 2s... with random jitter
+        return min(10.0, 0.5 * 2 ** (attempt - 1) if attempt > 1 else 0.0) + random.uniform(0, 0.5)
+
+    async def _send_request(self, api_method, parameters={}, payload=None, http_method='GET'):
+        """
+        Send a request to the server and return the result (see REST._send_request).
+
+        :param api_method:  The API method, such as "users" that will be used with the existing base_url to form a
+                            complete url, such as "/vmrest/users"
+        :param parameters:  A dictionary of parameters to be sent, such as {'filter': 'sales'}
+        :param payload:     The payload to be sent, typically with a POST or PUT
+        :param http_method: The request verb. Supported: 'GET', 'PUT', 'POST', and 'DELETE'
+        :type api_method: String
+        :type parameters: Dict
+        :type payload: String (usually JSON-encoded)
+        :type http_method: String (GET, PUT, POST, DELETE)
+        :returns: return a dictionary with the following keys:
+           'success'  :rtype:Bool:   Whether the response received from the server is deemed a success
+           'message'  :rtype:String: A message indicating success or details of any exception encountered
+           'response' :rtype:requests.models.Response: The response, as a requests Response
+        :rtype: Dict
+        """
+        result = {'success': False, 'message': '', 'response': ''}
+        url = "https://{}:{}{}/{}".format(self.host, self.port, self.base_url, api_method)
+        if http_method not in ['GET', 'POST', 'PUT', 'DELETE']:
+            return result
+        session = self._get_session()
+        params = self._query_params(parameters) if http_method != 'DELETE' else None
+        data = payload if http_method in ['POST', 'PUT'] else None
+
+        self.waiting += 1
+        async with self._semaphore:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            start = time.monotonic()
+            try:
+                result = await self._send_with_retries(session, http_method, url, params, data)
+            finally:
+                self.in_flight -= 1
+                latency = time.monotonic() - start
+                self.requests += 1
+                if not result['success']:
+                    self.failures += 1
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        return result
+
+    async def _send_with_retries(self, session, http_method, url, params, data):
+        attempt = 0
+        while True:
+            try:
+                async with session.request(http_method, url, params=params, data=data) as raw_response:
+                    content = await raw_response.read()
+                    response = self._requests_response(http_method, raw_response, content)
+                retry = response.status_code in REST_RETRY_STATUSES and http_method in REST_RETRY_METHODS
+                if not retry or attempt >= self.retry_count:
+                    return {
+                        'success': True,
+                        'response': response,
+                        'message': 'Successful {} request to: {}'.format(http_method, url)
+                    }
+                delay = self._retry_after(response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Failed connections are retried whatever the method, read errors only for idempotent requests
+                connect_error = isinstance(e, aiohttp.ClientConnectorError)
+                if attempt >= self.retry_count or not (connect_error or http_method in REST_RETRY_METHODS):
+                    return {
+                        'success': False,
+                        'message': 'ClientError {} request to: {} :: {}'.format(http_method, url, str(e) or repr(e))}
+                delay = None
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(min(delay, REST_RETRY_AFTER_MAX) if delay is not None else self._backoff(attempt))
+
+    @staticmethod
+    def _requests_response(http_method, raw_response, content):
+        # Wrap the aiohttp response into a requests Response for the parse functions of the REST subclasses
+        response = Response()
+        response.status_code = raw_response.status
+        response.reason = raw_response.reason
+        response.headers = CaseInsensitiveDict(raw_response.headers)
+        response.url = str(raw_response.url)
+        response.encoding = raw_response.charset
+        response._content = content
+        response.request = Request(http_method, response.url).prepare()
+        return response
+
+    _check_response = REST._check_response
+
+    def rest_stats(self):
+        """
+        Returns the request concurrency and counters
+
+        :returns: return a dictionary with the following keys:
+           'concurrency'   :rtype:Integer: Maximum number of requests sent at the same time
+           'in_flight'     :rtype:Integer: Requests being sent
+           'waiting'       :rtype:Integer: Requests waiting for their turn
+           'max_in_flight' :rtype:Integer: Most requests sent at the same time
+           'requests', 'failures', 'retries' :rtype:Integer: Request counters
+           'latency'       :rtype:Float:   Moving average of the request latency in seconds
+        :rtype: Dict
+        """
+        return {
+            'concurrency': self.concurrency,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'max_in_flight': self.max_in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'retries': self.retries,
+            'latency': round(self.latency, 3) if self.latency is not None else None
+        }
@@ -1,7 +1,5 @@
-import json
-import xmltodict
-import xml.parsers.expat
-from flaskr.rest.v1.rest import REST
+from flaskr.rest.v1.rest import REST, REST_POOL_MAXSIZE, REST_TIMEOUT, AsyncREST, ASYNC_REST_CONCURRENCY
+from flaskr.rest.v1.rest import xml_root, xml_to_dict
 from base64 import b64encode
 
 
@@ -15,15 +13,20 @@ class UDS(REST):
     :param username: The username of an account with access to the API.
     :param password: The password for your user account
     :param port: (optional) The server port for API access (default: 443)
+    :param pool_maxsize: (optional) Maximum number of keep-alive connections to the server (default: 16)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
     :type host: String
     :type username: String
     :type password: String
     :type port: Integer
+    :type pool_maxsize: Integer
+    :type timeout: Tuple
     :returns: return an UDS object
     :rtype: UDS
     '''
 
-    def __init__(self, host, username=None, password=None, port=8443):
+    def __init__(self, host, username=None, password=None, port=8443, pool_maxsize=REST_POOL_MAXSIZE,
+                 timeout=REST_TIMEOUT):
         '''
         Initialize the UDS class as a child of the REST class. Define the UDS-specific headers, and API base_url
         '''
@@ -33,7 +36,8 @@ class UDS(REST):
         }
 
         # Create a super class, where the UDS class inherits from the REST class.
-        super().__init__(host, username, password, base_url='/cucm-uds', headers=headers, port=port)
+        super().__init__(host, username, password, base_url='/cucm-uds', headers=headers, port=port,
+                         pool_maxsize=pool_maxsize, timeout=timeout)
 
 
     def _uds_request(self, api_method, parameters={}, payload=None, http_method='GET'):
@@ -86,34 +90,22 @@ class UDS(REST):
         result = {'success': raw_resp['success'], 'message': raw_resp['message'], 'response': ''}
         
         try:
-            # Convert the binary encoded XML to a OrderedDict using xmltodict.parse
-            parsed_response = xmltodict.parse(raw_resp['response'].content.decode("utf-8"))
-            
-            # Get the root key from the dictionary (e.g. 'coSpaces')
-            rootobj = list(parsed_response.keys())[0]
+            # Parse the binary encoded XML and convert it to a dict (in the layout of xmltodict.parse)
+            parsed_response = xml_to_dict(xml_root(raw_resp['response'].content))
+
+            # Get the root key from the dictionary (e.g. 'users')
+            rootobj = next(iter(parsed_response))
 
             # Check if we had returned a 200-299 response code
-            if result['success']:
-                try:
-                    # check if there is only one element, @totalCount will be 1.  in that case, xmltodict
-                    # would not have created a list of dicts
-                    if(parsed_response[rootobj]["@totalCount"] == "1"):
-                        # Get the child key nested under the root (e.g. 'user')
-                        childobj = [key for key in parsed_response[rootobj].keys() if key[0] not in '@'][0]
-
-                        # Force the child element to be a list
-                        parsed_response = xmltodict.parse(
-                            raw_resp['response'].content, force_list={childobj: True})
-
-                # The @totalCount key does not exist; just return the result
-                except KeyError:
-                    pass
-                
-                # Replace the response value with our parsed_response, converting the OrderedDict to dict
-                result['response'] = json.loads(json.dumps(parsed_response))
-
-            else:
-                result['response'] = json.loads(json.dumps(parsed_response))
+            if result['success'] and isinstance(parsed_response[rootobj], dict):
+                # check if there is only one element, @totalCount will be 1.  in that case, the child element
+                # (e.g. 'user') is a dict rather than a list of dicts: force it to be a list
+                children = [key for key in parsed_response[rootobj] if key[0] != '@']
+                if parsed_response[rootobj].get('@totalCount') == '1' and children:
+                    parsed_response[rootobj][children[0]] = [parsed_response[rootobj][children[0]]]
+
+            # Replace the response value with our parsed_response
+            result['response'] = parsed_response
 
         except Exception as e:
             result['message'] = 'Failed to decode response content: \
@@ -133,7 +125,11 @@ class UDS(REST):
         '''
         params = {'username': userid}
         user = self._uds_request("users", parameters=params)
+        return self._single_user(user)
 
+    @staticmethod
+    def _single_user(user):
+        # Returns the result of a user search with the num_found key and the single user found as the response
         user['num_found'] = 0
         if user['success']:
             try:
@@ -145,3 +141,55 @@ class UDS(REST):
             except KeyError:
                 pass
         return user
+
+
+class AsyncUDS(AsyncREST):
+    '''
+    The AsyncUDS Server class
+
+    The asyncio variant of the UDS class (see AsyncREST): _uds_request and get_user are coroutines, their results are
+    the same.
+
+    :param host: The Hostname / IP Address of the server
+    :param username: The username of an account with access to the API.
+    :param password: The password for your user account
+    :param port: (optional) The server port for API access (default: 8443)
+    :param concurrency: (optional) Maximum number of requests sent at the same time (default: 64)
+    :param timeout: (optional) (connect, read) timeouts in seconds (default: (5, 30))
+    :type host: String
+    :type username: String
+    :type password: String
+    :type port: Integer
+    :type concurrency: Integer
+    :type timeout: Tuple
+    :returns: return an AsyncUDS object
+    :rtype: AsyncUDS
+    '''
+
+    def __init__(self, host, username=None, password=None, port=8443, concurrency=ASYNC_REST_CONCURRENCY,
+                 timeout=REST_TIMEOUT):
+        headers = {
+            'Accept': 'application/xml'
+        }
+        super().__init__(host, username, password, base_url='/cucm-uds', headers=headers, port=port,
+                         concurrency=concurrency, timeout=timeout)
+
+    async def _uds_request(self, api_method, parameters={}, payload=None, http_method='GET'):
+        '''
+        Send a request to a UDS server, see UDS._uds_request
+        '''
+        resp = await self._send_request(api_method, parameters=parameters,
+                                        payload=payload, http_method=http_method)
+        if resp['success']:
+            resp = self._check_response(resp)
+            resp = self._uds_parse_response(resp)
+        return resp
+
+    _uds_parse_response = UDS._uds_parse_response
+
+    async def get_user(self, userid=None):
+        '''
+        Retrieve user via UDS, see UDS.get_user
+        '''
+        user = await self._uds_request("users", parameters={'username': userid})
+        return UDS._single_user(user)
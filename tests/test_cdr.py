@@ -0,0 +1,104 @@
+import os
+import pytest
+from flaskr.cucm.v1.axltoolkit.cdr import CDR_COLUMNS, CMR_COLUMNS, CDRIngestor, CDRStore, cdr_time, cdr_timestamp
+
+
+def write_flat_file(path, columns, rows):
+    # CDR / CMR flat file: field names, field types, then one line per record
+    with open(path, 'w') as f:
+        f.write(','.join(f'"{name}"' for name, column_type in columns) + '\n')
+        f.write(','.join(column_type for name, column_type in columns) + '\n')
+        for row in rows:
+            f.write(','.join(str(row.get(name, '')) for name, column_type in columns) + '\n')
+
+
+class FakeCDROnDemand:
+    """
+    CDR on Demand double: one CDR and one CMR file per window, get_file writes the file to the spool folder and fails
+    for the file names starting with a failing prefix
+    """
+
+    def __init__(self, spool_folder, failing=()):
+        self.spool_folder = spool_folder
+        self.failing = set(failing)
+        self.pushed = []
+
+    def get_file_list(self, from_time, to_time):
+        return [f'cdr_StandAloneCluster_01_{from_time}_1', f'cmr_StandAloneCluster_01_{from_time}_1']
+
+    def get_file(self, from_time, to_time, file_name):
+        self.pushed.append(file_name)
+        if file_name.startswith(tuple(self.failing)):
+            raise Exception("SFTP push failed")
+        origination = cdr_timestamp(from_time)
+        path = os.path.join(self.spool_folder, file_name)
+        if file_name.startswith('cmr'):
+            write_flat_file(path, CMR_COLUMNS, [{'dateTimeStamp': origination, 'jitter': 4}])
+        else:
+            write_flat_file(path, CDR_COLUMNS, [{'dateTimeOrigination': origination, 'duration': 30,
+                                                 'callingPartyNumber': '1000'},
+                                                {'dateTimeOrigination': origination + 1, 'duration': 0,
+                                                 'callingPartyNumber': '1001'}])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CDRStore(str(tmp_path / 'cdr.db'))
+
+
+def ingestor(store, cdr_on_demand, spool_folder):
+    # Two 10 minute windows until now
+    return CDRIngestor(store, cdr_on_demand.get_file_list, cdr_on_demand.get_file, spool_folder, window=600, lag=0,
+                       backfill=1200, file_wait=5)
+
+
+def test_cdr_time():
+    assert cdr_time(cdr_timestamp('202401311530')) == '202401311530'
+
+
+def test_ingest_file_once(store, tmp_path):
+    path = str(tmp_path / 'cdr_file')
+    write_flat_file(path, CDR_COLUMNS, [{'dateTimeOrigination': 1700000000, 'duration': 'x',
+                                         'callingPartyNumber': '1000'}])
+    assert store.ingest_file(path, 'cdr_file') == 1
+    assert store.ingest_file(path, 'cdr_file') == 0
+    assert store.ingested(['cdr_file', 'cdr_other']) == {'cdr_file'}
+    assert store.stats()['records'] == 1
+    row = store._connection().execute("SELECT dateTimeOrigination, duration, callingPartyNumber FROM cdr").fetchone()
+    assert row == (1700000000, None, '1000')
+
+
+def test_poll_ingests_every_window_and_moves_the_checkpoint(store, tmp_path):
+    cdr_on_demand = FakeCDROnDemand(str(tmp_path))
+    cdr_ingestor = ingestor(store, cdr_on_demand, str(tmp_path))
+    result = cdr_ingestor.poll()
+    assert result['windows'] == 2 and result['files'] == 4 and result['records'] == 6 and not result['failed']
+    assert result['checkpoint'] == store.checkpoint()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(('cdr_', 'cmr_'))]
+    summary = store.summary()
+    assert summary['calls'] == 4 and summary['answered'] == 2
+    assert summary['voice_quality']['cmr_records'] == 2
+    # Nothing new until the next window has ended
+    assert cdr_ingestor.poll()['windows'] == 0
+    assert len(cdr_on_demand.pushed) == 4
+
+
+def test_failed_file_keeps_the_checkpoint(store, tmp_path):
+    cdr_on_demand = FakeCDROnDemand(str(tmp_path), failing=['cmr'])
+    cdr_ingestor = ingestor(store, cdr_on_demand, str(tmp_path))
+    result = cdr_ingestor.poll()
+    cdr_file, cmr_file = sorted(cdr_on_demand.pushed)
+    assert cdr_file.startswith('cdr') and cmr_file.startswith('cmr')
+    assert result['windows'] == 0 and result['files'] == 1
+    assert result['failed'] == [{'file': cmr_file, 'message': "SFTP push failed"}]
+    assert store.checkpoint() is None
+    assert cdr_ingestor.stats()['errors'] == 1 and cdr_ingestor.stats()['last_error']
+    # The next poll only pushes the failed file of the first window again
+    cdr_on_demand.failing = set()
+    cdr_on_demand.pushed = []
+    result = cdr_ingestor.poll()
+    assert result['windows'] == 2 and not result['failed']
+    assert cdr_on_demand.pushed[0] == cmr_file and cdr_file not in cdr_on_demand.pushed
+    assert len(cdr_on_demand.pushed) == 3
+    assert store.stats()['records'] == 6
+    assert cdr_ingestor.stats()['last_error'] is None
@@ -0,0 +1,90 @@
+import random
+import threading
+import time
+import pytest
+from flaskr.cuc.v1.cupi import CUPI
+
+
+class FakeCUPI(CUPI):
+    """
+    CUPI serving the "users" list method from memory, each page request takes a random time (out of order replies)
+    """
+
+    def __init__(self, users, failing_page=None, delay=0.01):
+        super().__init__('cuc', 'user', 'password')
+        self.users = users
+        self.failing_page = failing_page
+        self.delay = delay
+        self.requested = []
+        self._requested_lock = threading.Lock()
+
+    def _cupi_request(self, api_method, parameters={}, payload=None, http_method='GET'):
+        page_number, rows_per_page = parameters['pageNumber'], parameters['rowsPerPage']
+        with self._requested_lock:
+            self.requested.append(page_number)
+        time.sleep(random.uniform(0, self.delay))
+        if page_number == self.failing_page:
+            return {'success': False, 'message': 'Internal Server Error', 'response': ''}
+        start = (page_number - 1) * rows_per_page
+        items = self.users[start:start + rows_per_page]
+        response = {'@total': str(len(self.users))}
+        if items:
+            response['User'] = items[0] if len(items) == 1 else items
+        return {'success': True, 'message': 'OK', 'response': response}
+
+
+def users(count):
+    return [{'Alias': f'user{index:04d}'} for index in range(count)]
+
+
+@pytest.mark.parametrize('count', [0, 1, 10, 101, 1000])
+def test_list_iter_yields_every_object_in_order(count):
+    cupi = FakeCUPI(users(count))
+    objects = cupi.list_iter('users', rows_per_page=10, workers=4)
+    assert objects.total == count
+    assert list(objects) == users(count)
+    assert sorted(cupi.requested) == list(range(1, max(1, -(-count // 10)) + 1))
+
+
+def test_list_iter_item_name():
+    assert FakeCUPI(users(3)).list_iter('users', rows_per_page=2).item_name == 'User'
+
+
+def test_list_iter_stops_when_objects_were_deleted():
+    cupi = FakeCUPI(users(100))
+    objects = cupi.list_iter('users', rows_per_page=10, workers=1)
+    del cupi.users[45:]
+    assert list(objects) == users(45)
+
+
+def test_list_iter_first_page_error_is_raised_by_list_iter():
+    with pytest.raises(Exception, match='Internal Server Error'):
+        FakeCUPI(users(100), failing_page=1).list_iter('users', rows_per_page=10)
+
+
+def test_list_iter_page_error_is_raised_in_order():
+    objects = FakeCUPI(users(100), failing_page=4).list_iter('users', rows_per_page=10)
+    received = []
+    with pytest.raises(Exception, match='Internal Server Error'):
+        for user in objects:
+            received.append(user)
+    assert received == users(30)
+
+
+def test_list_iter_close_cancels_the_pending_pages():
+    cupi = FakeCUPI(users(1000), delay=0.05)
+    objects = cupi.list_iter('users', rows_per_page=10, workers=2)
+    assert [next(objects) for _ in range(15)] == users(15)
+    objects.close()
+    # The first page, the page being read and at most workers pages in flight
+    assert len(cupi.requested) <= 5
+    time.sleep(0.2)
+    assert len(cupi.requested) <= 5
+
+
+@pytest.mark.parametrize('rows_per_page', [0, -1])
+def test_list_iter_rejects_empty_pages(rows_per_page):
+    cupi = FakeCUPI(users(10))
+    with pytest.raises(ValueError, match='rows_per_page'):
+        cupi.list_iter('users', rows_per_page=rows_per_page)
+    assert cupi.requested == []
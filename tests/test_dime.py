@@ -0,0 +1,116 @@
+import struct
+import pytest
+from flaskr.cucm.v1.axltoolkit.dime import ResumeOffsetError, attachment_chunks
+
+ENVELOPE = (b'<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+            b'<ns:GetOneFileResponse xmlns:ns="http://schemas.cisco.com/ast/soap"/></soapenv:Body></soapenv:Envelope>')
+FAULT = (b'<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+         b'<soapenv:Fault><faultcode>soapenv:Server</faultcode><faultstring>File not found</faultstring>'
+         b'</soapenv:Fault></soapenv:Body></soapenv:Envelope>')
+FILE = bytes(range(256)) * 41 + b'end'
+
+
+class FakeResponse:
+    """
+    Streamed requests Response double, the body arrives in chunks of chunk_size bytes whatever iter_content asks for
+    """
+
+    def __init__(self, content_type, body, chunk_size=7):
+        self.headers = {'Content-Type': content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+
+def dime_record(data, record_type, first=False, last=False, chunked=False):
+    padded = lambda value: value + b'\0' * (-len(value) % 4)  # noqa: E731
+    flags = 1 << 3 | (0x04 if first else 0) | (0x02 if last else 0) | (0x01 if chunked else 0)
+    record_type = record_type.encode('ascii')
+    return struct.pack('>BBHHHI', flags, 0x10, 0, 0, len(record_type), len(data)) + padded(record_type) + \
+        padded(data)
+
+
+def dime_message(envelope, data, chunks=1):
+    size = -(-len(data) // chunks)
+    parts = [data[start:start + size] for start in range(0, len(data), size)]
+    records = [dime_record(envelope, 'http://schemas.xmlsoap.org/soap/envelope/', first=True)]
+    for index, part in enumerate(parts):
+        last = index == len(parts) - 1
+        records.append(dime_record(part, 'application/octet-stream' if index == 0 else '', last=last,
+                                   chunked=not last))
+    return b''.join(records)
+
+
+def mime_message(envelope, data, boundary='MIMEBoundary_1234'):
+    return b''.join([
+        b'--', boundary.encode(), b'\r\nContent-Type: text/xml; charset=UTF-8\r\n\r\n', envelope,
+        b'\r\n--', boundary.encode(), b'\r\nContent-Type: application/octet-stream\r\nContent-ID: <file>\r\n\r\n',
+        data, b'\r\n--', boundary.encode(), b'--\r\n'])
+
+
+def download(response, offset=0, chunk_size=100):
+    return b''.join(attachment_chunks(response, offset=offset, chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_dime_attachment(chunks):
+    response = FakeResponse('application/dime', dime_message(ENVELOPE, FILE, chunks=chunks))
+    assert download(response) == FILE
+
+
+def test_mime_attachment():
+    response = FakeResponse('multipart/related; type="text/xml"; boundary="MIMEBoundary_1234"',
+                            mime_message(ENVELOPE, FILE))
+    assert download(response) == FILE
+
+
+def test_mime_attachment_containing_a_partial_boundary():
+    data = b'\r\n--MIMEBoundary_12' + FILE
+    response = FakeResponse('multipart/related; boundary=MIMEBoundary_1234', mime_message(ENVELOPE, data))
+    assert download(response) == data
+
+
+def test_chunks_do_not_exceed_chunk_size():
+    response = FakeResponse('application/dime', dime_message(ENVELOPE, FILE), chunk_size=1000)
+    assert max(len(chunk) for chunk in attachment_chunks(response, chunk_size=100)) <= 100
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/dime', dime_message(ENVELOPE, FILE)),
+    ('multipart/related; boundary="MIMEBoundary_1234"', mime_message(ENVELOPE, FILE))])
+def test_resume_offset(content_type, body):
+    assert download(FakeResponse(content_type, body), offset=5000) == FILE[5000:]
+
+
+def test_resume_offset_beyond_the_file():
+    response = FakeResponse('application/dime', dime_message(ENVELOPE, FILE))
+    with pytest.raises(ResumeOffsetError):
+        download(response, offset=len(FILE) + 1)
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/dime', dime_record(FAULT, 'http://schemas.xmlsoap.org/soap/envelope/', first=True, last=True)),
+    ('multipart/related; boundary="MIMEBoundary_1234"', mime_message(FAULT, b'')),
+    ('text/xml', FAULT)])
+def test_soap_fault(content_type, body):
+    with pytest.raises(Exception, match='File not found'):
+        download(FakeResponse(content_type, body))
+
+
+def test_missing_attachment():
+    response = FakeResponse('application/dime',
+                            dime_record(ENVELOPE, 'http://schemas.xmlsoap.org/soap/envelope/', first=True, last=True))
+    with pytest.raises(Exception, match='No file attached'):
+        download(response)
+
+
+def test_truncated_dime_message():
+    response = FakeResponse('application/dime', dime_message(ENVELOPE, FILE)[:-500])
+    with pytest.raises(Exception, match='Truncated'):
+        download(response)
@@ -0,0 +1,98 @@
+import fcntl
+import os
+import pytest
+from flaskr.cucm.v1.axltoolkit.dime import ResumeOffsetError
+from flaskr.cucm.v1.axltoolkit.log_collection import log_download, log_file_path, log_files
+
+FILE = b'0123456789' * 100
+
+
+def file_source(data, fail_after=None):
+    """
+    get_file double serving data from offset, raising after fail_after bytes to simulate a dropped connection
+    """
+    calls = []
+
+    def get_file(file_name, offset=0):
+        calls.append(offset)
+        if offset > len(data):
+            raise ResumeOffsetError("shorter")
+        sent = 0
+        for start in range(offset, len(data), 100):
+            if fail_after is not None and sent >= fail_after:
+                raise Exception("Connection reset")
+            yield data[start:start + 100]
+            sent += 100
+    get_file.calls = calls
+    return get_file
+
+
+def test_log_download(tmp_path):
+    path = str(tmp_path / 'node' / 'var' / 'log' / 'trace.txt')
+    result = log_download(file_source(FILE), '/var/log/trace.txt', path, size=len(FILE))
+    assert result['size'] == result['downloaded'] == len(FILE) and not result['skipped']
+    assert open(path, 'rb').read() == FILE
+    assert not os.path.exists(path + '.part')
+
+
+def test_log_download_resumes_a_partial_download(tmp_path):
+    path = str(tmp_path / 'trace.txt')
+    with pytest.raises(Exception, match='Connection reset'):
+        log_download(file_source(FILE, fail_after=300), '/trace.txt', path, size=len(FILE))
+    assert os.path.getsize(path + '.part') == 300 and not os.path.exists(path)
+    get_file = file_source(FILE)
+    result = log_download(get_file, '/trace.txt', path, size=len(FILE))
+    assert get_file.calls == [300]
+    assert result['downloaded'] == len(FILE) - 300 and result['size'] == len(FILE)
+    assert open(path, 'rb').read() == FILE
+
+
+def test_log_download_skips_a_complete_file(tmp_path):
+    path = str(tmp_path / 'trace.txt')
+    log_download(file_source(FILE), '/trace.txt', path, size=len(FILE))
+    get_file = file_source(FILE)
+    assert log_download(get_file, '/trace.txt', path, size=len(FILE))['skipped']
+    assert get_file.calls == []
+
+
+def test_log_download_restarts_when_the_file_shrank(tmp_path):
+    path = str(tmp_path / 'trace.txt')
+    with open(path + '.part', 'wb') as f:
+        f.write(b'x' * 2000)
+    # Larger than the expected size: downloaded again from the start
+    get_file = file_source(FILE)
+    log_download(get_file, '/trace.txt', path, size=len(FILE))
+    assert get_file.calls == [0] and open(path, 'rb').read() == FILE
+    # Size unknown and shorter than the partial download: the partial download is dropped
+    with open(path + '.part', 'wb') as f:
+        f.write(b'x' * 2000)
+    with pytest.raises(ResumeOffsetError):
+        log_download(file_source(FILE), '/trace.txt', path)
+    assert not os.path.exists(path + '.part')
+
+
+def test_log_download_of_a_file_being_downloaded(tmp_path):
+    path = str(tmp_path / 'trace.txt')
+    with open(path + '.part', 'wb') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        with pytest.raises(Exception, match='already being downloaded'):
+            log_download(file_source(FILE), '/trace.txt', path, size=len(FILE))
+
+
+def test_log_file_path(tmp_path):
+    folder = str(tmp_path)
+    assert log_file_path(folder, 'cucm-pub', '/var/log/active/trace.txt') == \
+        os.path.join(os.path.realpath(folder), 'cucm-pub', 'var', 'log', 'active', 'trace.txt')
+    with pytest.raises(Exception, match='Invalid log file name'):
+        log_file_path(folder, 'cucm-pub', '/../../etc/passwd')
+    with pytest.raises(Exception, match='Invalid log file name'):
+        log_file_path(folder, '..', 'trace.txt')
+
+
+def test_log_files():
+    result = {'ServiceLogs': {'ServiceLog': [{'SetOfFiles': {'File': [
+        {'name': 'b.txt', 'absolutepath': '/var/log/b.txt', 'filesize': '10', 'modifiedDate': 'x'},
+        {'name': 'a.txt', 'absolutepath': '/var/log/a.txt', 'filesize': None, 'modifiedDate': 'x'}]}}]}}
+    files = log_files(result)
+    assert [file_info['absolutepath'] for file_info in files] == ['/var/log/a.txt', '/var/log/b.txt']
+    assert [file_info['filesize'] for file_info in files] == [None, 10]
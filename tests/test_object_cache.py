@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+from flaskr.cucm.v1.axltoolkit.object_cache import AXLObjectCache
+from flaskr.cucm.v1.cucm import AXL
+
+
+def test_get_returns_copies():
+    cache = AXLObjectCache()
+    user = {'userid': 'jdoe', 'associatedDevices': {'device': ['SEP001']}}
+    cache.set(('user', 'jdoe'), user, cache.generation())
+    user['associatedDevices']['device'].append('SEP002')
+    found, value = cache.get(('user', 'jdoe'))
+    assert found and value['associatedDevices']['device'] == ['SEP001']
+    value['associatedDevices']['device'].append('SEP003')
+    assert cache.get(('user', 'jdoe'))[1]['associatedDevices']['device'] == ['SEP001']
+
+
+def test_invalidate_one_type_or_everything():
+    cache = AXLObjectCache()
+    generation = cache.generation()
+    for key in [('user', 'a'), ('user', 'b'), ('phone', 'sep001')]:
+        cache.set(key, {}, generation)
+    cache.invalidate('user', 'a')
+    assert not cache.get(('user', 'a'))[0] and cache.get(('user', 'b'))[0]
+    cache.invalidate('user')
+    assert not cache.get(('user', 'b'))[0] and cache.get(('phone', 'sep001'))[0]
+    cache.invalidate()
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['invalidations'] == 3
+
+
+def test_read_started_before_an_invalidation_is_not_stored():
+    cache = AXLObjectCache()
+    generation = cache.generation()
+    cache.invalidate('user', 'jdoe')
+    cache.set(('user', 'jdoe'), {'userid': 'jdoe'}, generation)
+    assert not cache.get(('user', 'jdoe'))[0]
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('flaskr.cucm.v1.axltoolkit.object_cache.time.monotonic', lambda: now[0])
+    cache = AXLObjectCache(maxsize=2, ttl=60)
+    cache.set(('user', 'a'), {}, 0)
+    cache.set(('user', 'b'), {}, 0)
+    cache.get(('user', 'a'))
+    cache.set(('user', 'c'), {}, 0)
+    assert not cache.get(('user', 'b'))[0] and cache.get(('user', 'a'))[0]
+    now[0] += 60
+    assert not cache.get(('user', 'a'))[0]
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 1
+
+
+def test_ttl_zero_disables_the_cache():
+    cache = AXLObjectCache(ttl=0)
+    cache.set(('user', 'a'), {}, cache.generation())
+    assert not cache.get(('user', 'a'))[0]
+
+
+class FakeClient:
+    """
+    axltoolkit client double keeping users in memory, phones list the users owning them
+    """
+
+    def __init__(self):
+        self.last_exception = None
+        self.users = {'jdoe': {'userid': 'jdoe', 'associatedDevices': {'device': ['SEP001']}}}
+        self.calls = []
+
+    def get_user(self, userid=None):
+        self.calls.append(('get_user', userid))
+        return self.users[userid]
+
+    def update_user(self, user_data=None):
+        self.calls.append(('update_user', user_data['userid']))
+        # CUCM userids are case insensitive
+        user = self.users[user_data['userid'].lower()]
+        user.update({key: value for key, value in user_data.items() if key != 'userid'})
+        return {'return': '{uuid}'}
+
+    def update_phone(self, phone_data=None):
+        self.calls.append(('update_phone', phone_data['name']))
+        for user in self.users.values():
+            devices = user['associatedDevices']['device']
+            if phone_data['name'] in devices and 'newName' in phone_data:
+                devices[devices.index(phone_data['name'])] = phone_data['newName']
+        return {'return': '{uuid}'}
+
+
+class FakePool:
+    def __init__(self, client):
+        self.axlclient = client
+
+    @contextmanager
+    def client(self):
+        yield self.axlclient
+
+
+def fake_axl():
+    axl = AXL('cucm', 'user', 'password')
+    client = FakeClient()
+    axl.axl_pool = FakePool(client)
+    return axl, client
+
+
+def test_get_user_is_cached_case_insensitively():
+    axl, client = fake_axl()
+    assert axl.get_user(userid='jdoe') == axl.get_user(userid='jdoe')
+    assert client.calls == [('get_user', 'jdoe')]
+    axl.get_user(userid='jdoe', cached=False)
+    assert client.calls == [('get_user', 'jdoe')] * 2
+
+
+def test_update_user_invalidates_the_user():
+    axl, client = fake_axl()
+    axl.get_user(userid='jdoe')
+    axl.update_user(user_data={'userid': 'JDoe', 'firstName': 'John'})
+    assert axl.get_user(userid='jdoe')['firstName'] == 'John'
+    assert client.calls.count(('get_user', 'jdoe')) == 2
+
+
+def test_update_phone_invalidates_the_users():
+    axl, client = fake_axl()
+    axl.get_user(userid='jdoe')
+    axl.update_phone(phone_data={'name': 'SEP001', 'newName': 'SEP002'})
+    assert axl.get_user(userid='jdoe')['associatedDevices']['device'] == ['SEP002']
@@ -0,0 +1,42 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+import pytest
+from flaskr.rest.v1 import rest
+from flaskr.rest.v1.rest import REST, REST_RETRY_AFTER_MAX, RESTRetry
+
+
+@pytest.mark.parametrize('retry_after, wait', [('3600', REST_RETRY_AFTER_MAX), ('2', 2.0),
+                                               ('Fri, 31 Dec 2100 23:59:59 GMT', REST_RETRY_AFTER_MAX)])
+def test_retry_after_is_capped(retry_after, wait):
+    response = SimpleNamespace(headers={'Retry-After': retry_after})
+    assert RESTRetry(total=3).get_retry_after(response) == wait
+    assert RESTRetry(total=3).get_retry_after(SimpleNamespace(headers={})) is None
+
+
+def test_retried_request_waits_at_most_the_cap(monkeypatch):
+    monkeypatch.setattr(rest, 'REST_RETRY_AFTER_MAX', 0.2)
+    statuses = [503, 200]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(statuses.pop(0))
+            self.send_header('Retry-After', '3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = REST('127.0.0.1', 'user', 'password', port=server.server_port)
+        client.session.mount('http://', client.adapter)
+        start = time.monotonic()
+        response = client.session.get(f'http://127.0.0.1:{server.server_port}/status', timeout=5)
+        assert response.status_code == 200
+        assert time.monotonic() - start < 2
+    finally:
+        server.shutdown()
@@ -0,0 +1,153 @@
+import re
+import pytest
+from flaskr.cucm.v1.axltoolkit import sql
+from flaskr.cucm.v1.cucm import AXL
+
+SQL_RESPONSE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+    '<ns:executeSQLQueryResponse xmlns:ns="http://www.cisco.com/AXL/API/14.0"><return>{0}</return>'
+    '</ns:executeSQLQueryResponse></soapenv:Body></soapenv:Envelope>'
+)
+
+
+def sql_response(rows):
+    return SQL_RESPONSE.format(''.join(
+        f'<row><name>{name}</name><pkid>{pkid}</pkid></row>' for name, pkid in rows)).encode('utf-8')
+
+
+class TableAXL(AXL):
+    """
+    AXL answering the chunked SELECT statements from an in-memory device table
+    """
+
+    def __init__(self, rows):
+        super().__init__('cucm', 'user', 'password')
+        self.rows = rows
+        self.queries = []
+
+    def sql_query_raw(self, query=None):
+        self.queries.append(query)
+        skip, first = map(int, re.match(r'SELECT SKIP (\d+) FIRST (\d+) ', query).groups())
+        return sql_response(self.rows[skip:skip + first])
+
+
+def test_sql_chunk():
+    assert sql.sql_chunk('select name from device order by pkid', 1000, 500) == \
+        'SELECT SKIP 1000 FIRST 500 name from device order by pkid'
+    with pytest.raises(Exception, match='Only SELECT'):
+        sql.sql_chunk('update device set name = 1', 0, 10)
+    with pytest.raises(Exception, match='already has a SKIP/FIRST'):
+        sql.sql_chunk('select first 10 name from device', 0, 10)
+
+
+def test_parse_sql_query_response():
+    columns, rows = sql.parse_sql_query_response(sql_response([('SEP001', '1'), ('SEP002', '2')]))
+    assert columns == ['name', 'pkid']
+    assert rows == [['SEP001', '1'], ['SEP002', '2']]
+    assert sql.parse_sql_query_response(sql_response([])) == ([], [])
+
+
+def test_parse_sql_query_response_fault():
+    fault = (b'<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body>'
+             b'<soapenv:Fault><faultcode>soapenv:Server</faultcode><faultstring>Query request too large'
+             b'</faultstring></soapenv:Fault></soapenv:Body></soapenv:Envelope>')
+    with pytest.raises(Exception, match='Query request too large'):
+        sql.parse_sql_query_response(fault)
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_sql_query_reads_every_chunk_in_order(concurrency):
+    rows = [(f'SEP{index:012d}', str(index)) for index in range(1050)]
+    axl = TableAXL(rows)
+    result = axl.sql_query('select name, pkid from device order by pkid', chunk_size=100, concurrency=concurrency)
+    assert result['num_rows'] == 1050
+    assert result['columns']['name'] == [name for name, pkid in rows]
+    assert result['columns']['pkid'] == [pkid for name, pkid in rows]
+
+
+def test_sql_query_rows_of_an_exact_multiple_of_the_chunk_size():
+    axl = TableAXL([(f'SEP{index}', str(index)) for index in range(200)])
+    assert len(list(axl.sql_query_rows('select name, pkid from device order by pkid', chunk_size=100,
+                                       concurrency=1))) == 200
+    # The last chunk is empty, it tells that the table has been read entirely
+    assert len(axl.queries) == 3
+
+
+def test_sql_quote():
+    assert sql.sql_quote("O'Neil") == "'O''Neil'"
+    assert sql.sql_in_list(['a', "b'c"]) == "'a', 'b''c'"
+
+
+def test_sql_coalesce_respects_max_length():
+    userids = [f'user{index:04d}' for index in range(500)]
+    build = lambda chunk: sql.sql_insert_users_to_group(chunk, 'Standard CTI Enabled')  # noqa: E731
+    chunks = list(sql.sql_coalesce(userids, build, sql.sql_in_list_weight, max_length=2000))
+    assert len(chunks) > 1
+    assert [userid for chunk in chunks for userid in chunk] == userids
+    assert all(len(build(chunk)) <= 2000 for chunk in chunks)
+
+
+def test_sql_coalesce_oversized_item_gets_its_own_chunk():
+    chunks = list(sql.sql_coalesce(['a', 'b' * 100, 'c'], sql.sql_in_list, sql.sql_in_list_weight, max_length=20))
+    assert chunks == [['a'], ['b' * 100], ['c']]
+
+
+def test_sql_update_service_parameters_statement():
+    assert sql.sql_update_service_parameters([('A', '1'), ('B', "x'y")]) == \
+        "update processconfig set paramvalue = case paramname when 'A' then '1' when 'B' then 'x''y' end " \
+        "where paramname in ('A', 'B')"
+
+
+class GroupAXL(AXL):
+    """
+    AXL applying the coalesced inserts of users to a group in memory, a statement containing a bad userid fails
+    """
+
+    def __init__(self, known, members=(), bad=()):
+        super().__init__('cucm', 'user', 'password')
+        self.known = set(known)
+        self.members = set(members)
+        self.bad = set(bad)
+        self.updates = []
+
+    def sql_update(self, query=None):
+        userids = set(re.findall(r"'([^']*)'", query.split(' in (', 1)[1]))
+        self.updates.append(sorted(userids))
+        if userids & self.bad:
+            raise Exception("Syntax error")
+        self.members |= userids & self.known
+
+    def select_applied(self, chunk):
+        return set(chunk) & self.members
+
+
+def test_sql_update_batch_outcomes():
+    axl = GroupAXL(known=['u1', 'u2', 'u3', 'u4'], members=['u1'], bad=['u3'])
+    axl.axl_sql_max_statement_length = 10000
+    outcomes = axl._sql_update_batch(['u1', 'u2', 'u3', 'u4', 'u5', 'u2'],
+                                     lambda chunk: sql.sql_insert_users_to_group(chunk, 'Group'),
+                                     sql.sql_in_list_weight, axl.select_applied, concurrency=1)
+    assert outcomes == {'u1': None, 'u2': None, 'u3': 'Syntax error', 'u4': None, 'u5': 'not found'}
+    # The coalesced insert skips the existing member, then is bisected to isolate the bad userid
+    assert axl.updates[0] == ['u2', 'u3', 'u4', 'u5']
+    assert ['u3'] in axl.updates
+    assert axl.members == {'u1', 'u2', 'u4'}
+
+
+def test_sql_update_batch_coalesces_chunks():
+    userids = [f'user{index:04d}' for index in range(300)]
+    axl = GroupAXL(known=userids)
+    axl.axl_sql_max_statement_length = 1000
+    outcomes = axl._sql_update_batch(userids, lambda chunk: sql.sql_insert_users_to_group(chunk, 'Group'),
+                                     sql.sql_in_list_weight, axl.select_applied, concurrency=4)
+    assert all(outcome is None for outcome in outcomes.values()) and len(outcomes) == 300
+    assert 1 < len(axl.updates) < 300
+
+
+@pytest.mark.parametrize('rows', [0, 1, 99])
+def test_sql_query_sends_a_single_request_for_small_results(rows):
+    axl = TableAXL([(f'SEP{index}', str(index)) for index in range(rows)])
+    result = axl.sql_query('select name, pkid from device order by pkid', chunk_size=100, concurrency=4)
+    assert result['num_rows'] == rows
+    # Concurrent chunks only start once the first one came back full
+    assert len(axl.queries) == 1
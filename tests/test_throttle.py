@@ -0,0 +1,146 @@
+import threading
+import time
+import pytest
+import requests
+from flaskr.cucm.v1.axltoolkit.throttle import (AXLThrottle, RequestQuota, ThrottledService, get_request_quota,
+                                                is_throttled, is_timeout)
+
+
+def send(throttle, latency, **kwargs):
+    # The outcome of a request, without waiting for the rate limit in between
+    throttle.in_flight += 1
+    throttle.release(latency, **kwargs)
+
+
+def test_successes_raise_the_limits():
+    throttle = AXLThrottle(rate=5, concurrency=4)
+    for _ in range(20):
+        send(throttle, 0.01, operation='getPhone')
+    assert throttle.rate > 5
+    assert throttle.concurrency > 4
+
+
+def test_throttled_request_halves_the_limits_and_pauses():
+    throttle = AXLThrottle(rate=10, concurrency=8, cooldown=0.2)
+    send(throttle, 0.01, throttled=True, operation='getPhone')
+    assert throttle.rate == 5
+    assert throttle.concurrency == 4
+    assert throttle.throttled == 1
+    start = time.monotonic()
+    throttle.acquire(timeout=1)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_timeout_halves_the_limits():
+    throttle = AXLThrottle(rate=10, concurrency=8, cooldown=0)
+    send(throttle, 30, timed_out=True, operation='listPhone')
+    assert throttle.rate == 5
+    assert throttle.timeouts == 1
+
+
+def test_slow_operations_do_not_lower_the_limits_of_fast_ones():
+    throttle = AXLThrottle(rate=5, concurrency=4, max_rate=1000)
+    for _ in range(200):
+        send(throttle, 0.02, operation='getPhone')
+        send(throttle, 2.0, operation='listPhone')
+    assert throttle.rate > 5
+    assert throttle.concurrency > 4
+    assert throttle.stats()['baselines'] == {'getPhone': 0.02, 'listPhone': 2.0}
+
+
+def test_congestion_holds_the_limits():
+    throttle = AXLThrottle(rate=5, concurrency=4, latency_factor=4)
+    send(throttle, 0.1, operation='getPhone')
+    rate, concurrency = throttle.rate, throttle.concurrency
+    send(throttle, 1.0, operation='getPhone')
+    assert (throttle.rate, throttle.concurrency) == (rate, concurrency)
+
+
+def test_baseline_rises_slowly_with_lasting_latency():
+    throttle = AXLThrottle(baseline_decay=0.5)
+    send(throttle, 0.1, operation='getPhone')
+    for _ in range(20):
+        send(throttle, 1.0, operation='getPhone')
+    assert throttle.baselines['getPhone'] == pytest.approx(1.0, abs=0.01)
+
+
+def test_concurrency_limit_queues_callers():
+    throttle = AXLThrottle(rate=100, concurrency=1, max_concurrency=1)
+    throttle.acquire(timeout=1)
+    with pytest.raises(Exception, match='throttle queue wait exceeded'):
+        throttle.acquire(timeout=0.1)
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (throttle.acquire(timeout=1), acquired.set()))
+    waiter.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    throttle.release(0.01, operation='getPhone')
+    waiter.join(1)
+    assert acquired.is_set()
+
+
+def test_throttled_service_reports_operation_outcomes():
+    class Service:
+        def getPhone(self, name):
+            return name
+
+        def listPhone(self):
+            raise requests.exceptions.ReadTimeout()
+
+    throttle = AXLThrottle(cooldown=0)
+    service = ThrottledService(Service(), throttle, timeout=1)
+    assert service.getPhone('SEP001122334455') == 'SEP001122334455'
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        service.listPhone()
+    assert throttle.requests == 2
+    assert throttle.timeouts == 1
+    assert throttle.in_flight == 0
+    assert 'getPhone' in throttle.baselines
+
+
+def test_fault_classification():
+    assert is_throttled(Exception('Server raised fault: HTTP Status 503 - Service Unavailable'))
+    assert not is_throttled(Exception('Item not valid'))
+    assert is_timeout(requests.exceptions.ConnectTimeout())
+    assert not is_timeout(Exception('timeout'))
+
+
+def test_request_quota_waits_for_the_oldest_request_to_leave_the_window():
+    quota = RequestQuota(requests=3, period=0.3)
+    start = time.monotonic()
+    for _ in range(3):
+        quota.acquire()
+    assert time.monotonic() - start < 0.1
+    quota.acquire()
+    assert time.monotonic() - start >= 0.29
+    assert quota.stats()['sent'] == 4
+
+
+def test_request_quota_timeout():
+    quota = RequestQuota(requests=1, period=5)
+    quota.acquire()
+    start = time.monotonic()
+    with pytest.raises(Exception, match='quota of 1 requests per 5 seconds'):
+        quota.acquire(timeout=0.1)
+    assert time.monotonic() - start < 1
+    assert quota.stats()['queue_depth'] == 0
+
+
+def test_request_quota_stats_show_waiting_callers():
+    quota = RequestQuota(requests=1, period=0.3)
+    quota.acquire()
+    waiter = threading.Thread(target=quota.acquire)
+    waiter.start()
+    time.sleep(0.1)
+    stats = quota.stats()
+    assert stats['in_window'] == 1 and stats['queue_depth'] == 1
+    waiter.join(timeout=1)
+    stats = quota.stats()
+    assert stats['queue_depth'] == 0 and stats['sent'] == 2
+
+
+def test_get_request_quota_is_shared_per_server_service():
+    quota = get_request_quota('10.0.0.1', 'realtimeservice2')
+    assert get_request_quota('10.0.0.1', 'realtimeservice2') is quota
+    assert get_request_quota('10.0.0.2', 'realtimeservice2') is not quota
+    assert get_request_quota('10.0.0.1', 'perfmonservice2') is not quota
@@ -0,0 +1,57 @@
+import pytest
+import xmltodict
+from types import SimpleNamespace
+from flaskr.cms.v1.cms import CMS
+from flaskr.rest.v1.rest import xml_root, xml_to_dict
+from flaskr.uds.v1.uds import UDS
+
+DOCUMENTS = [
+    b'<users totalCount="1"><user uri="u"><userName>a</userName><phoneNumber/></user></users>',
+    b'<users totalCount="2"><user><userName>a</userName></user><user><userName>b</userName></user></users>',
+    b'<users totalCount="0"/>',
+    b'<coSpace id="1"><name>a</name><uri>x</uri><ownerId/></coSpace>',
+    b'<?xml version="1.0"?>\n<status>\n  <softwareVersion>3.2</softwareVersion>\n  <uptime>5</uptime>\n</status>\n',
+    b'<a x="1">text<b>c</b>tail<!-- comment --><b y="2"/></a>',
+    b'<coSpaces total="1"><coSpace id="1">t</coSpace></coSpaces>',
+    '<u totalCount="1"><n>héllo</n></u>'.encode('utf-8'),
+    # Namespaces: names keep the prefixes of the document, declarations are xmlns attributes
+    b'<ns:users xmlns:ns="urn:a" ns:total="1"><ns:user><ns:name>a</ns:name></ns:user></ns:users>',
+    b'<users xmlns="urn:a"><user><name xml:lang="en">a</name></user></users>',
+    b'<users><user xmlns:x="urn:x" x:id="1"><x:name>a</x:name></user><user><name>b</name></user></users>',
+    b'<a><b xmlns="urn:b"><c>1</c></b><b xmlns="urn:c"/></a>',
+]
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_xml_to_dict_matches_xmltodict(document):
+    assert xml_to_dict(xml_root(document)) == xmltodict.parse(document)
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_xml_to_dict_list_tags_match_force_list(document):
+    list_tags = {'user', 'b', 'ns:user', 'name'}
+    assert xml_to_dict(xml_root(document), list_tags) == xmltodict.parse(document, force_list=list_tags)
+
+
+def raw_response(content, success=True):
+    response = SimpleNamespace(content=content, headers={}, request=SimpleNamespace(url='https://server/api'))
+    return {'success': success, 'message': 'OK', 'response': response}
+
+
+def test_uds_single_child_is_a_list():
+    result = UDS._uds_parse_response(None, raw_response(DOCUMENTS[0]))
+    assert result['response'] == {'users': {'@totalCount': '1', 'user': [
+        {'@uri': 'u', 'userName': 'a', 'phoneNumber': None}]}}
+    # Only the child of the root is a list
+    result = UDS._uds_parse_response(None, raw_response(
+        b'<users totalCount="1"><user><devices><device>SEP001</device></devices></user></users>'))
+    assert result['response']['users']['user'] == [{'devices': {'device': 'SEP001'}}]
+
+
+def test_cms_single_child_is_a_list():
+    cms = SimpleNamespace(error_codes=CMS.error_codes)
+    result = CMS._cms_parse_response(cms, raw_response(
+        b'<coSpaces total="1"><coSpace id="1"><name>a</name></coSpace></coSpaces>'))
+    assert result['response'] == {'coSpaces': {'@total': '1', 'coSpace': [{'@id': '1', 'name': 'a'}]}}
+    result = CMS._cms_parse_response(cms, raw_response(DOCUMENTS[3]))
+    assert result['response'] == xmltodict.parse(DOCUMENTS[3])